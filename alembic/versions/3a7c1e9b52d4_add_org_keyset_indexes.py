@@ -0,0 +1,28 @@
+"""Add (organization_id, created_at, id) indexes for keyset pagination
+
+Revision ID: 3a7c1e9b52d4
+Revises: fe21005f620b
+Create Date: 2026-10-18 09:12:40.118302
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3a7c1e9b52d4'
+down_revision: Union[str, None] = 'fe21005f620b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_notes_org_created_id', 'notes', ['organization_id', 'created_at', 'id'], unique=False)
+    op.create_index('ix_todos_org_created_id', 'todos', ['organization_id', 'created_at', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_todos_org_created_id', table_name='todos')
+    op.drop_index('ix_notes_org_created_id', table_name='notes')
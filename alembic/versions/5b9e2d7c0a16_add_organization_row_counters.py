@@ -0,0 +1,36 @@
+"""Add per-organization note and todo counters
+
+Revision ID: 5b9e2d7c0a16
+Revises: c41e7a90d5f2
+Create Date: 2026-10-18 16:04:12.554871
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b9e2d7c0a16'
+down_revision: Union[str, None] = 'c41e7a90d5f2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('organizations', sa.Column('notes_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('organizations', sa.Column('todos_open', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('organizations', sa.Column('todos_done', sa.Integer(), server_default='0', nullable=False))
+    op.execute("""
+        UPDATE organizations SET
+            notes_count = (SELECT count(*) FROM notes WHERE notes.organization_id = organizations.id),
+            todos_open = (SELECT count(*) FROM todos WHERE todos.organization_id = organizations.id AND coalesce(todos.completed, 0) = 0),
+            todos_done = (SELECT count(*) FROM todos WHERE todos.organization_id = organizations.id AND todos.completed = 1)
+    """)
+
+
+def downgrade() -> None:
+    op.drop_column('organizations', 'todos_done')
+    op.drop_column('organizations', 'todos_open')
+    op.drop_column('organizations', 'notes_count')
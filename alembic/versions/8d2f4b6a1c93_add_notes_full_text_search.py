@@ -0,0 +1,61 @@
+"""Add full-text search to notes
+
+Revision ID: 8d2f4b6a1c93
+Revises: 3a7c1e9b52d4
+Create Date: 2026-10-18 11:03:27.554910
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8d2f4b6a1c93'
+down_revision: Union[str, None] = '3a7c1e9b52d4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        # Generated column, so Postgres keeps it current on every insert/update
+        op.execute(
+            "ALTER TABLE notes ADD COLUMN search_vector tsvector GENERATED ALWAYS AS ("
+            "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+            "setweight(to_tsvector('english', coalesce(content, '')), 'B')) STORED"
+        )
+        op.create_index('ix_notes_search_vector', 'notes', ['search_vector'], unique=False, postgresql_using='gin')
+    elif dialect == 'sqlite':
+        op.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS notes_fts USING fts5("
+            "title, content, content='notes', content_rowid='id')"
+        )
+        op.execute(
+            "CREATE TRIGGER notes_fts_ai AFTER INSERT ON notes BEGIN "
+            "INSERT INTO notes_fts(rowid, title, content) VALUES (new.id, new.title, new.content); END"
+        )
+        op.execute(
+            "CREATE TRIGGER notes_fts_ad AFTER DELETE ON notes BEGIN "
+            "INSERT INTO notes_fts(notes_fts, rowid, title, content) VALUES ('delete', old.id, old.title, old.content); END"
+        )
+        op.execute(
+            "CREATE TRIGGER notes_fts_au AFTER UPDATE OF title, content ON notes BEGIN "
+            "INSERT INTO notes_fts(notes_fts, rowid, title, content) VALUES ('delete', old.id, old.title, old.content); "
+            "INSERT INTO notes_fts(rowid, title, content) VALUES (new.id, new.title, new.content); END"
+        )
+        op.execute("INSERT INTO notes_fts(notes_fts) VALUES ('rebuild')")
+
+
+def downgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.drop_index('ix_notes_search_vector', table_name='notes')
+        op.drop_column('notes', 'search_vector')
+    elif dialect == 'sqlite':
+        op.execute("DROP TRIGGER IF EXISTS notes_fts_au")
+        op.execute("DROP TRIGGER IF EXISTS notes_fts_ad")
+        op.execute("DROP TRIGGER IF EXISTS notes_fts_ai")
+        op.execute("DROP TABLE IF EXISTS notes_fts")
@@ -0,0 +1,26 @@
+"""Add users.token_version for access token revocation
+
+Revision ID: 9e4c7d21b8a3
+Revises: 5b9e2d7c0a16
+Create Date: 2026-10-18 18:22:40.118305
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9e4c7d21b8a3'
+down_revision: Union[str, None] = '5b9e2d7c0a16'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('users', sa.Column('token_version', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade() -> None:
+    op.drop_column('users', 'token_version')
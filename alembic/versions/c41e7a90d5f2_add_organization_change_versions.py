@@ -0,0 +1,28 @@
+"""Add per-organization change versions for notes and todos
+
+Revision ID: c41e7a90d5f2
+Revises: 8d2f4b6a1c93
+Create Date: 2026-10-18 12:26:51.302117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c41e7a90d5f2'
+down_revision: Union[str, None] = '8d2f4b6a1c93'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('organizations', sa.Column('notes_version', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('organizations', sa.Column('todos_version', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade() -> None:
+    op.drop_column('organizations', 'todos_version')
+    op.drop_column('organizations', 'notes_version')
@@ -0,0 +1,46 @@
+"""Add change sequences and tombstones for the notes/todos change feeds
+
+Revision ID: d7a3f91c4e28
+Revises: 9e4c7d21b8a3
+Create Date: 2026-10-18 19:41:07.302615
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd7a3f91c4e28'
+down_revision: Union[str, None] = '9e4c7d21b8a3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Existing rows keep change_seq 0: they are all part of a client's first sync
+    op.add_column('notes', sa.Column('change_seq', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('todos', sa.Column('change_seq', sa.Integer(), server_default='0', nullable=False))
+    op.create_index('ix_notes_org_change_seq_id', 'notes', ['organization_id', 'change_seq', 'id'], unique=False)
+    op.create_index('ix_todos_org_change_seq_id', 'todos', ['organization_id', 'change_seq', 'id'], unique=False)
+    op.create_table('tombstones',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('organization_id', sa.Integer(), nullable=False),
+    sa.Column('resource', sa.String(length=20), nullable=False),
+    sa.Column('record_id', sa.Integer(), nullable=False),
+    sa.Column('change_seq', sa.Integer(), nullable=False),
+    sa.Column('deleted_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.ForeignKeyConstraint(['organization_id'], ['organizations.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_tombstones_org_resource_seq', 'tombstones', ['organization_id', 'resource', 'change_seq', 'record_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_tombstones_org_resource_seq', table_name='tombstones')
+    op.drop_table('tombstones')
+    op.drop_index('ix_todos_org_change_seq_id', table_name='todos')
+    op.drop_index('ix_notes_org_change_seq_id', table_name='notes')
+    op.drop_column('todos', 'change_seq')
+    op.drop_column('notes', 'change_seq')
@@ -0,0 +1,44 @@
+from typing import Dict, List, Set, Tuple
+
+
+def classify_by_organization(
+    ids: List[int], organizations: Dict[int, int], organization_id: int, ok_status: str
+) -> Tuple[List[dict], List[int]]:
+    """Apply the per-row organization check to a whole batch at once.
+
+    `organizations` maps existing ids to their organization (one query for the
+    batch). Returns the per-item results and the ids the caller may touch."""
+    results = []
+    allowed = []
+    for index, item_id in enumerate(ids):
+        owner = organizations.get(item_id)
+        if owner is None:
+            status = "not_found"
+        elif owner != organization_id:
+            status = "forbidden"
+        else:
+            status = ok_status
+            allowed.append(item_id)
+        results.append({"index": index, "id": item_id, "status": status})
+    return results, allowed
+
+
+def classify_new_users(users: List, usernames: Set[str], emails: Set[str]) -> Tuple[List[dict], List[int]]:
+    """Check a batch of new users against the usernames and emails already
+    taken (one query for the batch) and against each other. Returns the
+    per-item results and the indexes of the users to create."""
+    usernames, emails = set(usernames), set(emails)
+    results = []
+    accepted = []
+    for index, user in enumerate(users):
+        if user.username in usernames:
+            status = "username_taken"
+        elif user.email in emails:
+            status = "email_taken"
+        else:
+            status = "created"
+            accepted.append(index)
+            usernames.add(user.username)
+            emails.add(user.email)
+        results.append({"index": index, "id": None, "status": status})
+    return results, accepted
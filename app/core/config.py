@@ -6,6 +6,60 @@ class Settings(BaseSettings):
     secret_key: str
     algorithm: str = "HS256"
     access_token_expire_minutes: int = 30
+    # Serve the API through the AsyncEngine/AsyncSession stack instead of the
+    # sync SessionLocal. async_database_url defaults to database_url with the
+    # driver swapped (asyncpg for Postgres, aiosqlite for SQLite).
+    use_async_db: bool = False
+    async_database_url: Optional[str] = None
+    # Connection pool, per engine and per worker process. recycle=-1 disables
+    # recycling; the sizing options are ignored for SQLite.
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_pool_timeout: float = 30
+    db_pool_recycle: int = 1800
+    db_pool_pre_ping: bool = True
+    # Read replicas for the GET routes, comma-separated. After a successful
+    # write a client reads from the primary for read_your_writes_seconds.
+    read_database_url: Optional[str] = None
+    read_your_writes_seconds: int = 5
+    # Cache of serialized list/detail responses, keyed by the organization's
+    # change version. Per process by default; set response_cache_url
+    # (redis://...) to share one between workers.
+    response_cache_enabled: bool = True
+    response_cache_url: Optional[str] = None
+    response_cache_ttl_seconds: int = 60
+    response_cache_max_entries: int = 10000
+    # Push events (GET /events, /events/ws). Fan-out stays in the worker unless
+    # events_url (a libpq postgresql:// URL) is set, which uses LISTEN/NOTIFY
+    # to reach every worker. A connection whose queue overflows is sent
+    # "resync" and closed; heartbeats also re-check the token.
+    events_url: Optional[str] = None
+    events_queue_size: int = 100
+    events_heartbeat_seconds: float = 15
+    # Warm each worker up before /health/ready reports it ready: build the
+    # OpenAPI schema, open db_pool_size connections per engine and start the
+    # password hashing processes
+    startup_warmup: bool = True
+    # Shared secret for /internal endpoints (X-Internal-Token); unset disables them
+    internal_api_token: Optional[str] = None
+    # Decoded access tokens are cached (keyed by the token) for up to
+    # principal_cache_ttl_seconds so repeat requests skip the signature check
+    principal_cache_ttl_seconds: int = 60
+    principal_cache_max_size: int = 10000
+    # Token deny-list and per-user token versions. Per process by default; set
+    # revocation_url (redis://...) so a logout or role change reaches every worker.
+    revocation_url: Optional[str] = None
+    revocation_max_entries: int = 100000
+    # Password hashing; workers=0 hashes inline on the request thread
+    bcrypt_rounds: int = 12
+    password_hash_workers: int = 2
+    password_hash_max_pending: int = 32
+    # Bulk user provisioning hashes in its own pool so it can't starve sign-ins;
+    # 0 sizes it to os.cpu_count()
+    password_hash_bulk_workers: int = 0
+    bulk_max_items: int = 500
+    export_batch_size: int = 1000
+    import_batch_size: int = 1000
     
     class Config:
         env_file = ".env"
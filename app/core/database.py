@@ -1,11 +1,67 @@
+import random
+import time
+from typing import List, Optional
+from fastapi import Depends, Request
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 from .config import settings
+from .pool_stats import PoolStats, instrument_engine, pool_options, pool_stats
 
-engine = create_engine(settings.database_url)
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+def get_async_database_url(database_url: str) -> str:
+    url = make_url(database_url)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver configured for '{backend}'")
+    return url.set(drivername=ASYNC_DRIVERS[backend]).render_as_string(hide_password=False)
+
+engine = create_engine(settings.database_url, **pool_options(settings.database_url, QueuePool, pool_stats["sync"]))
+instrument_engine(engine, pool_stats["sync"])
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+def split_database_urls(value: Optional[str]) -> List[str]:
+    return [url.strip() for url in (value or "").split(",") if url.strip()]
+
+read_engines = []
+for index, read_url in enumerate(split_database_urls(settings.read_database_url)):
+    stats = pool_stats.setdefault(f"read{index}", PoolStats())
+    read_engines.append(create_engine(read_url, **pool_options(read_url, QueuePool, stats)))
+    instrument_engine(read_engines[-1], stats)
+ReadSessionLocals = [sessionmaker(autocommit=False, autoflush=False, bind=read_engine) for read_engine in read_engines]
+
+async_database_url = settings.async_database_url or get_async_database_url(settings.database_url)
+async_engine = create_async_engine(async_database_url, **pool_options(async_database_url, AsyncAdaptedQueuePool, pool_stats["async"]))
+instrument_engine(async_engine.sync_engine, pool_stats["async"])
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
+# The same replicas for the async stack
+async_read_engines = []
+for index, read_url in enumerate(split_database_urls(settings.read_database_url)):
+    async_read_url = get_async_database_url(read_url)
+    stats = pool_stats.setdefault(f"async_read{index}", PoolStats())
+    async_read_engines.append(create_async_engine(async_read_url, **pool_options(async_read_url, AsyncAdaptedQueuePool, stats)))
+    instrument_engine(async_read_engines[-1].sync_engine, stats)
+AsyncReadSessionLocals = [
+    async_sessionmaker(bind=read_engine, autoflush=False, expire_on_commit=False) for read_engine in async_read_engines
+]
+
+def dispose_engines_after_fork():
+    """Called in each worker after a fork (gunicorn.conf.py). Pooled
+    connections inherited from the parent are dropped without being closed,
+    since the parent still owns them; the worker opens its own."""
+    sync_engines = [engine, *read_engines, async_engine.sync_engine]
+    sync_engines += [read_engine.sync_engine for read_engine in async_read_engines]
+    for db_engine in sync_engines:
+        db_engine.dispose(close=False)
+
 Base = declarative_base()
 
 def get_db():
@@ -13,4 +69,39 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+# Set by ReadYourWritesMiddleware after a write; holds the unix time until
+# which the client's reads go to the primary
+READ_PRIMARY_COOKIE = "read_primary_until"
+
+def reads_from_primary(request: Request) -> bool:
+    try:
+        return float(request.cookies.get(READ_PRIMARY_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+def get_read_db(request: Request, db: Session = Depends(get_db)):
+    """Session for read-only routes: a random replica, or the primary session
+    when no replicas are configured or the client wrote recently. The primary
+    session only opens a connection if it is used."""
+    if not ReadSessionLocals or reads_from_primary(request):
+        yield db
+        return
+    replica = random.choice(ReadSessionLocals)()
+    try:
+        yield replica
+    finally:
+        replica.close()
+
+async def get_async_read_db(request: Request, db: AsyncSession = Depends(get_async_db)):
+    """get_read_db for the async stack."""
+    if not AsyncReadSessionLocals or reads_from_primary(request):
+        yield db
+        return
+    async with random.choice(AsyncReadSessionLocals)() as replica:
+        yield replica
@@ -1,34 +1,62 @@
-from fastapi import Depends, HTTPException, status
+import secrets
+import time
+from typing import Optional
+from fastapi import Depends, Header, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
 from jose import JWTError, jwt
-from .database import get_db
-from .security import verify_token
 from .config import settings
-from ..crud import crud_user
-from ..schemas.schemas import TokenData
+from .principal import Principal, principal_cache
+from .revocation import token_revocations
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    credentials_exception = HTTPException(
+def credentials_exception():
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+def _decode_token(token: str) -> Principal:
     try:
         payload = jwt.decode(token, settings.secret_key, algorithms=[settings.algorithm])
-        username: str = payload.get("sub")
-        if username is None:
-            raise credentials_exception
-        token_data = TokenData(username=username)
-    except JWTError:
-        raise credentials_exception
-    
-    user = crud_user.get_user_by_username(db, username=token_data.username)
-    if user is None:
-        raise credentials_exception
-    return user
+        return Principal.from_claims(payload)
+    except (JWTError, KeyError, TypeError, ValueError):
+        # Tokens issued before the principal claims existed land here too;
+        # their holders log in again.
+        raise credentials_exception()
+
+def get_current_user(token: str = Depends(oauth2_scheme)) -> Principal:
+    """Resolve the principal from the token alone: no database access, and
+    the signature is only verified the first time a token is seen."""
+    principal = principal_cache.get(token)
+    if principal is None:
+        principal = _decode_token(token)
+        ttl = min(principal_cache.ttl, principal.expires_at - time.time())
+        if ttl > 0:
+            principal_cache.set(token, principal, ttl=ttl)
+    elif principal.expires_at <= time.time():
+        raise credentials_exception()
+    if token_revocations.is_revoked(principal):
+        raise credentials_exception()
+    return principal
 
 def get_current_active_user(current_user = Depends(get_current_user)):
-    return current_user
\ No newline at end of file
+    return current_user
+
+async def get_current_user_async(token: str = Depends(oauth2_scheme)) -> Principal:
+    if settings.revocation_url:
+        # Revocation checks against Redis would block the event loop
+        return await run_in_threadpool(get_current_user, token)
+    return get_current_user(token)
+
+async def get_current_active_user_async(current_user = Depends(get_current_user_async)):
+    return current_user
+
+def require_internal_token(x_internal_token: Optional[str] = Header(None)):
+    # Internal endpoints are hidden (404) unless INTERNAL_API_TOKEN is set
+    if not settings.internal_api_token:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if x_internal_token is None or not secrets.compare_digest(x_internal_token, settings.internal_api_token):
+        raise HTTPException(status_code=403, detail="Invalid internal token")
@@ -0,0 +1,272 @@
+import asyncio
+import logging
+import queue
+import select
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+import orjson
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+# Queued for a subscriber that fell too far behind; the stream tells the
+# client to catch up through the change feed and closes
+RESYNC = {"type": "resync"}
+
+
+class Subscription:
+    """One open /events connection: a bounded queue fed from the broker.
+
+    A consumer that lets the queue fill up is dropped instead of slowing down
+    publishers or buffering without limit; its pending events are replaced
+    by RESYNC."""
+
+    def __init__(self, broker: "Broker", organization_id: int, maxsize: int):
+        self.broker = broker
+        self.organization_id = organization_id
+        self.loop = asyncio.get_running_loop()
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.dropped = False
+
+    def put(self, message: dict) -> None:
+        # Runs on self.loop
+        if self.dropped:
+            return
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.dropped = True
+            self.broker.unsubscribe(self)
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESYNC)
+
+    async def get(self) -> dict:
+        return await self.queue.get()
+
+    def close(self) -> None:
+        self.broker.unsubscribe(self)
+
+
+class Broker:
+    """In-process fan-out of organization events to the open connections of
+    this worker. Other workers are reached through the backend: events are
+    published to it, and everything it receives (including this worker's own
+    events) is dispatched here."""
+
+    def __init__(self, backend, queue_size: int = 100):
+        self.backend = backend
+        self.queue_size = queue_size
+        self._subscriptions: Dict[int, Set[Subscription]] = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, organization_id: int) -> Subscription:
+        subscription = Subscription(self, organization_id, self.queue_size)
+        with self._lock:
+            self._subscriptions.setdefault(organization_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.organization_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.organization_id]
+
+    def connections(self) -> int:
+        with self._lock:
+            return sum(len(subscriptions) for subscriptions in self._subscriptions.values())
+
+    def publish(self, messages: List[dict]) -> None:
+        for message in messages:
+            try:
+                self.backend.publish(orjson.dumps(message).decode())
+            except Exception:
+                # Events are best-effort; the write itself has committed
+                logger.warning("Publishing an event failed", exc_info=True)
+
+    def dispatch(self, payload: str) -> None:
+        """Deliver a payload from the backend. Safe to call from any thread."""
+        message = orjson.loads(payload)
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(message["organization_id"], ()))
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        for subscription in subscriptions:
+            if running is subscription.loop:
+                subscription.put(message)
+            else:
+                subscription.loop.call_soon_threadsafe(subscription.put, message)
+
+    def start(self) -> None:
+        self.backend.start(self.dispatch)
+
+    def stop(self) -> None:
+        self.backend.stop()
+
+
+class LocalBackend:
+    """Single-process backend: a published payload is dispatched straight
+    back to this process' broker. Enough for one worker, and the stand-in
+    for PostgresNotifyBackend in tests."""
+
+    def __init__(self):
+        self._deliver: Optional[Callable[[str], None]] = None
+
+    def start(self, deliver: Callable[[str], None]) -> None:
+        self._deliver = deliver
+
+    def publish(self, payload: str) -> None:
+        if self._deliver is not None:
+            self._deliver(payload)
+
+    def stop(self) -> None:
+        self._deliver = None
+
+
+class PostgresNotifyBackend:
+    """Cross-worker fan-out through Postgres LISTEN/NOTIFY.
+
+    Every worker LISTENs on `channel` from a daemon thread with its own
+    connection and dispatches what it receives, its own events included.
+    publish() only queues the payload: a second thread sends the NOTIFYs on
+    another dedicated connection, so a commit never waits on a round trip
+    (or blocks the event loop) and neither thread takes a connection from the
+    request pools. NOTIFY payloads are limited to 8000 bytes, so each event
+    is sent on its own and carries ids only."""
+
+    def __init__(self, dsn: str, channel: str = "organization_events", poll_seconds: float = 5.0, max_pending: int = 10000):
+        self.dsn = dsn
+        self.channel = channel
+        self.poll_seconds = poll_seconds
+        self._outbox: queue.Queue = queue.Queue(maxsize=max_pending)
+        self._thread: Optional[threading.Thread] = None
+        self._publisher: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+
+    def _connect(self):
+        import psycopg2
+
+        connection = psycopg2.connect(self.dsn)
+        connection.autocommit = True
+        return connection
+
+    def publish(self, payload: str) -> None:
+        # Raises queue.Full if the publisher can't keep up; the broker logs it
+        self._outbox.put_nowait(payload)
+
+    def _send(self) -> None:
+        connection = None
+        backoff = 1.0
+        while True:
+            payload = self._outbox.get()
+            if payload is None:
+                break
+            try:
+                if connection is None or connection.closed:
+                    connection = self._connect()
+                with connection.cursor() as cursor:
+                    cursor.execute("SELECT pg_notify(%s, %s)", (self.channel, payload))
+                backoff = 1.0
+            except Exception:
+                # Best-effort like the rest of the events: drop this one and
+                # reconnect for the next
+                logger.warning("Publishing an event failed, reconnecting in %.0fs", backoff, exc_info=True)
+                if connection is not None:
+                    connection.close()
+                connection = None
+                self._stopping.wait(backoff)
+                backoff = min(backoff * 2, 30.0)
+        if connection is not None:
+            connection.close()
+
+    def start(self, deliver: Callable[[str], None]) -> None:
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._listen, args=(deliver,), name="events-listener", daemon=True)
+        self._thread.start()
+        self._publisher = threading.Thread(target=self._send, name="events-publisher", daemon=True)
+        self._publisher.start()
+
+    def _listen(self, deliver: Callable[[str], None]) -> None:
+        backoff = 1.0
+        while not self._stopping.is_set():
+            connection = None
+            try:
+                connection = self._connect()
+                with connection.cursor() as cursor:
+                    cursor.execute(f'LISTEN "{self.channel}"')
+                backoff = 1.0
+                while not self._stopping.is_set():
+                    if select.select([connection], [], [], self.poll_seconds)[0]:
+                        connection.poll()
+                        while connection.notifies:
+                            deliver(connection.notifies.pop(0).payload)
+            except Exception:
+                # Events sent while reconnecting are lost; clients that care
+                # catch up through the change feed
+                logger.warning("Events listener failed, reconnecting in %.0fs", backoff, exc_info=True)
+                self._stopping.wait(backoff)
+                backoff = min(backoff * 2, 30.0)
+            finally:
+                if connection is not None:
+                    connection.close()
+
+    def stop(self) -> None:
+        self._stopping.set()
+        if self._publisher is not None:
+            # Queued after whatever is still pending, so that gets sent first
+            self._outbox.put(None)
+            self._publisher.join(timeout=self.poll_seconds + 1)
+            self._publisher = None
+        if self._thread is not None:
+            self._thread.join(timeout=self.poll_seconds + 1)
+            self._thread = None
+
+
+# Keeps a NOTIFY payload well under Postgres' 8000 byte limit
+MAX_IDS_PER_EVENT = 500
+
+
+def record_event(db: Session, organization_id: int, resource: str, op: str, ids: Optional[Iterable[int]], change_seq: int) -> None:
+    """Queue an event on the session; it is published when the session
+    commits and dropped if it rolls back. `ids` may be None for writes that
+    don't know them (imports): clients fetch /<resource>/changes either way."""
+    pending = db.info.setdefault("pending_events", [])
+    ids = list(ids) if ids is not None else None
+    chunks = [ids[start:start + MAX_IDS_PER_EVENT] for start in range(0, len(ids), MAX_IDS_PER_EVENT)] if ids else [ids]
+    for chunk in chunks:
+        pending.append({
+            "organization_id": organization_id,
+            "resource": resource,
+            "op": op,
+            "ids": chunk,
+            "change_seq": change_seq,
+        })
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_pending_events(session):
+    pending = session.info.pop("pending_events", None)
+    if pending:
+        broker.publish(pending)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_pending_events(session, previous_transaction):
+    session.info.pop("pending_events", None)
+
+
+def create_backend():
+    if settings.events_url:
+        return PostgresNotifyBackend(settings.events_url)
+    return LocalBackend()
+
+
+broker = Broker(create_backend(), queue_size=settings.events_queue_size)
@@ -0,0 +1,74 @@
+import csv
+import io
+import json
+from datetime import datetime
+from typing import AsyncIterator, Callable, Iterator, List, Sequence, Tuple
+
+from sqlalchemy.engine import Result
+from sqlalchemy.ext.asyncio import AsyncResult
+
+EXPORT_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def _csv_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def _partition_encoder(columns: List[str], format: str) -> Tuple[str, Callable[[Sequence], str]]:
+    """The header to send first and a function that encodes one partition
+    of rows."""
+    if format == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+
+        def encode_csv(rows: Sequence) -> str:
+            writer.writerows([_csv_value(value) for value in row] for row in rows)
+            text = buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            return text
+
+        return encode_csv([columns]), encode_csv
+
+    def encode_ndjson(rows: Sequence) -> str:
+        return "".join(json.dumps(dict(zip(columns, row)), default=_json_default) + "\n" for row in rows)
+
+    return "", encode_ndjson
+
+
+def stream_rows(result: Result, format: str) -> Iterator[str]:
+    """Serialize a streaming (yield_per) result one partition at a time, so
+    memory stays flat however many rows the result has."""
+    try:
+        header, encode = _partition_encoder(list(result.keys()), format)
+        if header:
+            yield header
+        for partition in result.partitions():
+            yield encode(partition)
+    finally:
+        result.close()
+
+
+async def stream_rows_async(result: AsyncResult, format: str) -> AsyncIterator[str]:
+    """stream_rows for an AsyncSession.stream() result."""
+    try:
+        header, encode = _partition_encoder(list(result.keys()), format)
+        if header:
+            yield header
+        async for partition in result.partitions():
+            yield encode(partition)
+    finally:
+        await result.close()
@@ -0,0 +1,25 @@
+from typing import Optional, Sequence, Tuple
+
+
+class InvalidFields(ValueError):
+    pass
+
+
+# Always selected: the (created_at, id) keyset that pages are cursored on
+KEY_FIELDS = ("id", "created_at")
+
+
+def resolve_fields(fields: Optional[str], available: Sequence[str], summary: Sequence[str]) -> Tuple[str, ...]:
+    """Turn a `fields=` parameter into the column names to select, in
+    `available` order. None or "summary" gives the resource's summary
+    fields, "all" every field, anything else a comma-separated list."""
+    if fields is None or fields == "summary":
+        requested = set(summary)
+    elif fields == "all":
+        requested = set(available)
+    else:
+        requested = {name.strip() for name in fields.split(",") if name.strip()}
+        unknown = requested - set(available)
+        if unknown:
+            raise InvalidFields(f"Unknown fields: {', '.join(sorted(unknown))}")
+    return tuple(name for name in available if name in requested or name in KEY_FIELDS)
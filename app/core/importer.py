@@ -0,0 +1,227 @@
+import csv
+import io
+import json
+from typing import Awaitable, BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple, Type
+
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel, ValidationError
+from sqlalchemy import String, Table, insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+
+class ImportReport:
+    def __init__(self, max_errors: int = 100):
+        self.max_errors = max_errors
+        self.processed = 0
+        self.inserted = 0
+        self.failed = 0
+        self.errors: List[dict] = []
+
+    def add_error(self, line: int, error: str) -> None:
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({"line": line, "error": error})
+
+    def as_dict(self) -> dict:
+        return {
+            "processed": self.processed,
+            "inserted": self.inserted,
+            "failed": self.failed,
+            "errors": self.errors,
+        }
+
+
+def import_format_for(filename: Optional[str]) -> str:
+    return "csv" if filename and filename.lower().endswith(".csv") else "ndjson"
+
+
+def _iter_lines(fileobj: BinaryIO) -> Iterator[str]:
+    """Decode a binary stream line by line, reading it in chunks. Only line
+    feeds and carriage returns end a line (newline=""); str.splitlines()
+    would also split on U+2028 and other separators that are valid inside
+    CSV fields and JSON strings."""
+    text = io.TextIOWrapper(fileobj, encoding="utf-8-sig", newline="")
+    try:
+        yield from text
+    finally:
+        # Leave the upload open; its owner closes it
+        text.detach()
+
+
+def iter_records(fileobj: BinaryIO, format: str) -> Iterator[Tuple[int, object]]:
+    """Yield (line number, record) pairs; a record that can't be parsed is
+    yielded as the error message instead of a dict."""
+    lines = _iter_lines(fileobj)
+    if format == "csv":
+        reader = csv.DictReader(lines)
+        line = 1
+        try:
+            for row in reader:
+                # DictReader files extra fields under the key None
+                yield line + 1, "Too many fields" if None in row else row
+                line = reader.line_num
+        except csv.Error as exc:
+            yield reader.line_num, f"Invalid CSV: {exc}"
+        return
+
+    for line, text in enumerate(lines, start=1):
+        if not text.strip():
+            continue
+        try:
+            record = json.loads(text)
+        except ValueError as exc:
+            yield line, f"Invalid JSON: {exc}"
+            continue
+        yield line, record if isinstance(record, dict) else "Expected a JSON object"
+
+
+# COPY's NULL marker. Every other value is quoted, and quoted values never
+# match it, so "" stays an empty string instead of becoming NULL.
+COPY_NULL = "\\N"
+
+
+def copy_csv(rows: List[dict], columns: List[str]) -> str:
+    """Rows as COPY ... (FORMAT csv, NULL '\\N') input."""
+    def field(value) -> str:
+        if value is None:
+            return COPY_NULL
+        return '"' + str(value).replace('"', '""') + '"'
+
+    return "".join(",".join(field(row[column]) for column in columns) + "\n" for row in rows)
+
+
+def insert_rows(db: Session, table: Table, rows: List[dict]) -> None:
+    """Insert plain rows as fast as the backend allows: COPY on Postgres,
+    multi-row INSERT ... VALUES elsewhere."""
+    if not rows:
+        return
+    columns = list(rows[0])
+    if db.get_bind().dialect.name == "postgresql":
+        buffer = io.StringIO(copy_csv(rows, columns))
+        cursor = db.connection().connection.cursor()
+        try:
+            cursor.copy_expert(
+                f"COPY {table.name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv, NULL '{COPY_NULL}')", buffer
+            )
+        finally:
+            cursor.close()
+        return
+
+    for chunk in _insert_chunks(rows, columns):
+        db.execute(insert(table).values(chunk))
+
+
+async def insert_rows_async(db: AsyncSession, table: Table, rows: List[dict]) -> None:
+    """insert_rows for an AsyncSession; on Postgres asyncpg's binary COPY
+    keeps None and "" apart without any quoting."""
+    if not rows:
+        return
+    columns = list(rows[0])
+    if db.get_bind().dialect.name == "postgresql":
+        raw = await (await db.connection()).get_raw_connection()
+        await raw.driver_connection.copy_records_to_table(
+            table.name, records=[tuple(row[column] for column in columns) for row in rows], columns=columns
+        )
+        return
+
+    for chunk in _insert_chunks(rows, columns):
+        await db.execute(insert(table).values(chunk))
+
+
+def _insert_chunks(rows: List[dict], columns: List[str]) -> Iterator[List[dict]]:
+    # Stay under SQLite's limit on bound parameters per statement
+    chunk_size = max(1, 30000 // len(columns))
+    for start in range(0, len(rows), chunk_size):
+        yield rows[start:start + chunk_size]
+
+
+def column_lengths(table: Table) -> Dict[str, int]:
+    """The length limits of the table's String columns."""
+    return {
+        column.name: column.type.length
+        for column in table.columns
+        if isinstance(column.type, String) and column.type.length
+    }
+
+
+def _too_long(item: dict, max_lengths: Dict[str, int]) -> List[str]:
+    return [
+        f"{name}: longer than {length} characters"
+        for name, length in max_lengths.items()
+        if isinstance(item.get(name), str) and len(item[name]) > length
+    ]
+
+
+def _iter_batches(
+    fileobj: BinaryIO, format: str, schema: Type[BaseModel], report: ImportReport, batch_size: int,
+    max_lengths: Dict[str, int],
+) -> Iterator[List[dict]]:
+    """Validated rows in batches of up to `batch_size`; rows that fail
+    validation are added to `report` with their line number and skipped.
+    Values longer than their column are rejected here, since the database
+    would fail the whole batch (and the import) over them."""
+    batch: List[dict] = []
+    for line, record in iter_records(fileobj, format):
+        report.processed += 1
+        if isinstance(record, str):
+            report.add_error(line, record)
+            continue
+        try:
+            item = schema(**record)
+        except ValidationError as exc:
+            report.add_error(line, "; ".join(
+                f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}" for error in exc.errors()
+            ))
+            continue
+        values = item.dict()
+        errors = _too_long(values, max_lengths)
+        if errors:
+            report.add_error(line, "; ".join(errors))
+            continue
+        batch.append(values)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def run_import(
+    fileobj: BinaryIO,
+    format: str,
+    schema: Type[BaseModel],
+    insert_batch: Callable[[List[dict]], None],
+    batch_size: int = 1000,
+    on_progress: Optional[Callable[[ImportReport], None]] = None,
+    max_lengths: Optional[Dict[str, int]] = None,
+) -> ImportReport:
+    """Parse, validate and insert an upload batch by batch. Only one batch of
+    rows is held in memory at a time."""
+    report = ImportReport()
+    for batch in _iter_batches(fileobj, format, schema, report, batch_size, max_lengths or {}):
+        insert_batch(batch)
+        report.inserted += len(batch)
+        if on_progress:
+            on_progress(report)
+    return report
+
+
+async def run_import_async(
+    fileobj: BinaryIO,
+    format: str,
+    schema: Type[BaseModel],
+    insert_batch: Callable[[List[dict]], Awaitable[None]],
+    batch_size: int = 1000,
+    max_lengths: Optional[Dict[str, int]] = None,
+) -> ImportReport:
+    """run_import with an async insert_batch. Reading and validating the
+    upload is blocking work, so each batch is prepared on a worker thread."""
+    report = ImportReport()
+    batches = _iter_batches(fileobj, format, schema, report, batch_size, max_lengths or {})
+    while True:
+        batch = await run_in_threadpool(next, batches, None)
+        if batch is None:
+            return report
+        await insert_batch(batch)
+        report.inserted += len(batch)
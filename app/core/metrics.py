@@ -0,0 +1,183 @@
+import bisect
+import contextvars
+import threading
+import time
+from typing import Dict, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Seconds; Prometheus' client defaults with a 2.5s step added
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0)
+QUERY_COUNT_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100)
+# Polled by load balancers and scrapers, so not a worker's "first request"
+PROBE_ROUTES = ("/health", "/health/live", "/health/ready", "/metrics")
+
+
+class Histogram:
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    @property
+    def count(self) -> int:
+        return sum(self.counts)
+
+
+class RequestDbStats:
+    __slots__ = ("queries", "seconds")
+
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+
+
+# Set by the middleware for the duration of a request. Sync endpoints run in
+# a threadpool with a copy of the context, so they see the same object.
+current_db_stats: contextvars.ContextVar[Optional[RequestDbStats]] = contextvars.ContextVar("current_db_stats", default=None)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if current_db_stats.get() is not None:
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = current_db_stats.get()
+    if stats is not None and conn.info.get("query_start"):
+        stats.queries += 1
+        stats.seconds += time.perf_counter() - conn.info["query_start"].pop()
+
+
+class MetricsRegistry:
+    """Per-route request metrics, labelled by method and route template."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Warm-up time per phase, set once by core.warmup
+        self.startup_seconds: Dict[str, float] = {}
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.latency: Dict[Tuple[str, str], Histogram] = {}
+            self.db_queries: Dict[Tuple[str, str], Histogram] = {}
+            self.db_seconds: Dict[Tuple[str, str], float] = {}
+            self.responses: Dict[Tuple[str, str, int], int] = {}
+            self.first_request: Optional[Tuple[str, str, float]] = None
+
+    def observe(self, method: str, route: str, status: int, seconds: float, db: RequestDbStats):
+        key = (method, route)
+        with self._lock:
+            if key not in self.latency:
+                self.latency[key] = Histogram(LATENCY_BUCKETS)
+                self.db_queries[key] = Histogram(QUERY_COUNT_BUCKETS)
+                self.db_seconds[key] = 0.0
+            self.latency[key].observe(seconds)
+            self.db_queries[key].observe(db.queries)
+            self.db_seconds[key] += db.seconds
+            self.responses[(method, route, status)] = self.responses.get((method, route, status), 0) + 1
+            if self.first_request is None and route not in PROBE_ROUTES:
+                self.first_request = (method, route, seconds)
+
+    def render(self) -> str:
+        """Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            _render_histograms(lines, "http_request_duration_seconds", "Request latency by route.", self.latency)
+            _render_histograms(lines, "http_request_db_queries", "SQL statements executed per request.", self.db_queries)
+            lines.append("# HELP http_request_db_seconds_total Time spent in SQL statements by route.")
+            lines.append("# TYPE http_request_db_seconds_total counter")
+            for (method, route), seconds in sorted(self.db_seconds.items()):
+                lines.append(f"http_request_db_seconds_total{{{_labels(method=method, route=route)}}} {seconds!r}")
+            lines.append("# HELP http_responses_total Responses by route and status code.")
+            lines.append("# TYPE http_responses_total counter")
+            for (method, route, status), count in sorted(self.responses.items()):
+                lines.append(f"http_responses_total{{{_labels(method=method, route=route, status=str(status))}}} {count}")
+            lines.append("# HELP app_startup_seconds Worker warm-up time by phase.")
+            lines.append("# TYPE app_startup_seconds gauge")
+            for phase, seconds in sorted(self.startup_seconds.items()):
+                lines.append(f"app_startup_seconds{{{_labels(phase=phase)}}} {seconds!r}")
+            lines.append("# HELP app_first_request_seconds Latency of the worker's first request, probes excluded.")
+            lines.append("# TYPE app_first_request_seconds gauge")
+            if self.first_request is not None:
+                method, route, seconds = self.first_request
+                lines.append(f"app_first_request_seconds{{{_labels(method=method, route=route)}}} {seconds!r}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(**labels: str) -> str:
+    escaped = (
+        (name, value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in labels.items()
+    )
+    return ",".join(f'{name}="{value}"' for name, value in escaped)
+
+
+def _render_histograms(lines, name: str, help: str, histograms: Dict[Tuple[str, str], Histogram]):
+    lines.append(f"# HELP {name} {help}")
+    lines.append(f"# TYPE {name} histogram")
+    for (method, route), histogram in sorted(histograms.items()):
+        labels = _labels(method=method, route=route)
+        cumulative = 0
+        for bound, count in zip(histogram.buckets, histogram.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {histogram.count}')
+        lines.append(f"{name}_sum{{{labels}}} {histogram.sum!r}")
+        lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+
+
+metrics = MetricsRegistry()
+
+
+class MetricsMiddleware:
+    """Plain ASGI middleware (no BaseHTTPMiddleware task/queue overhead).
+
+    Records latency, status and DB cost per route and adds a Server-Timing
+    header. The header is written when the response starts, so queries run
+    by a streaming body afterwards only show up in /metrics."""
+
+    def __init__(self, app, registry: MetricsRegistry = metrics):
+        self.app = app
+        self.registry = registry
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        db = RequestDbStats()
+        token = current_db_stats.set(db)
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                elapsed = (time.perf_counter() - start) * 1000
+                timing = f'db;dur={db.seconds * 1000:.2f};desc="{db.queries} queries", app;dur={elapsed:.2f}'
+                message["headers"] = list(message.get("headers", [])) + [(b"server-timing", timing.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_db_stats.reset(token)
+            route = scope.get("route")
+            # Unmatched paths share one label so scanners can't blow up cardinality
+            self.registry.observe(
+                scope["method"],
+                getattr(route, "path", "unmatched"),
+                status,
+                time.perf_counter() - start,
+                db,
+            )
@@ -0,0 +1,72 @@
+import base64
+import json
+from datetime import datetime
+from typing import Optional, Tuple
+
+from sqlalchemy import tuple_
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(created_at: datetime, id: int) -> str:
+    raw = json.dumps([created_at.isoformat(), id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(created_at), int(id)
+    except (ValueError, TypeError):
+        raise InvalidCursor("Invalid cursor")
+
+
+# Change feed cursors are (change_seq, kind, id). Within a change_seq,
+# upserts sort before deletes; CAUGHT_UP marks "everything up to and
+# including change_seq has been delivered".
+CHANGE_UPSERT, CHANGE_DELETE, CHANGE_CAUGHT_UP = 0, 1, 2
+
+
+def encode_change_cursor(change_seq: int, kind: int, id: int) -> str:
+    raw = json.dumps([change_seq, kind, id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_change_cursor(cursor: str) -> Tuple[int, int, int]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        change_seq, kind, id = (int(value) for value in json.loads(base64.urlsafe_b64decode(padded.encode())))
+    except (ValueError, TypeError):
+        raise InvalidCursor("Invalid cursor")
+    if kind not in (CHANGE_UPSERT, CHANGE_DELETE, CHANGE_CAUGHT_UP):
+        raise InvalidCursor("Invalid cursor")
+    return change_seq, kind, id
+
+
+def apply_keyset(query, model, cursor: Optional[str] = None, skip: int = 0):
+    """Order a Query or Select by (created_at, id) and apply either a keyset
+    cursor or the legacy offset."""
+    query = query.order_by(model.created_at, model.id)
+    if cursor:
+        created_at, id = decode_cursor(cursor)
+        query = query.where(tuple_(model.created_at, model.id) > (created_at, id))
+    elif skip:
+        query = query.offset(skip)
+    return query
+
+
+def next_cursor_for(rows, limit: int) -> Optional[str]:
+    if rows and len(rows) == limit:
+        last = rows[-1]
+        return encode_cursor(last.created_at, last.id)
+    return None
+
+
+def keyset_page(query, model, limit: int, cursor: Optional[str] = None, skip: int = 0):
+    """Fetch one page of `query`. Returns the rows and the cursor for the next
+    page, if the page came back full."""
+    rows = apply_keyset(query, model, cursor=cursor, skip=skip).limit(limit).all()
+    return rows, next_cursor_for(rows, limit)
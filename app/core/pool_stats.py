@@ -0,0 +1,132 @@
+import threading
+import time
+from typing import Dict, Optional, Type
+
+from sqlalchemy import event, exc
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.pool import Pool, QueuePool
+
+from .config import settings
+
+
+class PoolStats:
+    """Counters for one connection pool, fed by pool events and by the
+    instrumented pool class below. All times are in milliseconds."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.connects = 0
+            self.checkouts = 0
+            self.checkins = 0
+            self.invalidations = 0
+            self.soft_invalidations = 0
+            self.timeouts = 0
+            self.overflow_checkouts = 0
+            self.peak_checked_out = 0
+            self.wait_count = 0
+            self.wait_total_ms = 0.0
+            self.wait_max_ms = 0.0
+
+    def record_wait(self, seconds: float, checked_out: int, overflow: int, timed_out: bool = False):
+        ms = seconds * 1000
+        with self._lock:
+            self.wait_count += 1
+            self.wait_total_ms += ms
+            self.wait_max_ms = max(self.wait_max_ms, ms)
+            self.peak_checked_out = max(self.peak_checked_out, checked_out)
+            if overflow > 0:
+                self.overflow_checkouts += 1
+            if timed_out:
+                self.timeouts += 1
+
+    def incr(self, counter: str):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def snapshot(self, pool: Optional[Pool] = None) -> dict:
+        with self._lock:
+            data = {
+                "connects": self.connects,
+                "checkouts": self.checkouts,
+                "checkins": self.checkins,
+                "invalidations": self.invalidations,
+                "soft_invalidations": self.soft_invalidations,
+                "timeouts": self.timeouts,
+                "overflow_checkouts": self.overflow_checkouts,
+                "peak_checked_out": self.peak_checked_out,
+                "wait_ms": {
+                    "count": self.wait_count,
+                    "avg": round(self.wait_total_ms / self.wait_count, 3) if self.wait_count else 0.0,
+                    "max": round(self.wait_max_ms, 3),
+                },
+            }
+        if pool is not None:
+            data["pool"] = {"class": type(pool).__name__}
+            if isinstance(pool, QueuePool):
+                data["pool"].update(
+                    size=pool.size(),
+                    checked_in=pool.checkedin(),
+                    checked_out=pool.checkedout(),
+                    overflow=pool.overflow(),
+                    timeout=pool.timeout(),
+                )
+        return data
+
+
+def _timed_do_get(self):
+    # Time spent here is the wait for a free connection (or for a new one to
+    # be opened); pool_timeout expiry surfaces as a TimeoutError.
+    start = time.perf_counter()
+    try:
+        connection = self._base_do_get()
+    except exc.TimeoutError:
+        self._stats.record_wait(time.perf_counter() - start, self.checkedout(), self.overflow(), timed_out=True)
+        raise
+    self._stats.record_wait(time.perf_counter() - start, self.checkedout(), self.overflow())
+    return connection
+
+
+def instrumented_pool_class(base: Type[QueuePool], stats: PoolStats) -> Type[QueuePool]:
+    """Subclass of `base` that reports checkout wait time to `stats`. The
+    stats live on the class so they survive Pool.recreate() on dispose()."""
+    return type(
+        f"Instrumented{base.__name__}",
+        (base,),
+        {"_stats": stats, "_base_do_get": base._do_get, "_do_get": _timed_do_get},
+    )
+
+
+def instrument_engine(engine: Engine, stats: PoolStats):
+    """Count connects, checkouts, checkins and invalidations on `engine`'s pool."""
+    event.listen(engine, "connect", lambda *args: stats.incr("connects"))
+    event.listen(engine, "checkout", lambda *args: stats.incr("checkouts"))
+    event.listen(engine, "checkin", lambda *args: stats.incr("checkins"))
+    event.listen(engine, "invalidate", lambda *args: stats.incr("invalidations"))
+    event.listen(engine, "soft_invalidate", lambda *args: stats.incr("soft_invalidations"))
+
+
+def pool_options(database_url: str, pool_class: Type[QueuePool], stats: PoolStats) -> dict:
+    """create_engine() keyword arguments for the configured pool settings.
+
+    SQLite keeps SQLAlchemy's default pool (SingletonThreadPool/NullPool for
+    some URLs, which don't take sizing arguments); only pre-ping and recycle
+    apply there."""
+    options = {
+        "pool_pre_ping": settings.db_pool_pre_ping,
+        "pool_recycle": settings.db_pool_recycle,
+    }
+    if make_url(database_url).get_backend_name() != "sqlite":
+        options.update(
+            poolclass=instrumented_pool_class(pool_class, stats),
+            pool_size=settings.db_pool_size,
+            max_overflow=settings.db_max_overflow,
+            pool_timeout=settings.db_pool_timeout,
+        )
+    return options
+
+
+pool_stats: Dict[str, PoolStats] = {"sync": PoolStats(), "async": PoolStats()}
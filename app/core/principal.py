@@ -0,0 +1,50 @@
+from dataclasses import dataclass
+from typing import Optional
+from .cache import TTLCache
+from .config import settings
+from ..models.models import UserRole
+
+
+@dataclass(frozen=True)
+class Principal:
+    """The parts of a user that authorization decisions need, as carried by
+    an access token, plus the token's own id and version for revocation."""
+    id: int
+    username: str
+    organization_id: int
+    role: UserRole
+    token_version: int = 0
+    jti: Optional[str] = None
+    expires_at: int = 0
+
+    @classmethod
+    def from_claims(cls, payload: dict) -> "Principal":
+        """Raises KeyError/ValueError for tokens without the principal claims."""
+        return cls(
+            id=int(payload["uid"]),
+            username=payload["sub"],
+            organization_id=int(payload["org"]),
+            role=UserRole(payload["role"]),
+            token_version=int(payload.get("ver", 0)),
+            jti=payload.get("jti"),
+            expires_at=int(payload["exp"]),
+        )
+
+
+def token_claims(user) -> dict:
+    return {
+        "sub": user.username,
+        "uid": user.id,
+        "org": user.organization_id,
+        "role": user.role.value,
+        "ver": user.token_version or 0,
+    }
+
+
+# Principals decoded from access tokens, keyed by the token itself, so a
+# repeat request skips jwt.decode. Entries never outlive the token; they are
+# not trusted for revocation, which is checked on every request.
+principal_cache = TTLCache(
+    maxsize=settings.principal_cache_max_size,
+    ttl=settings.principal_cache_ttl_seconds,
+)
@@ -0,0 +1,33 @@
+import time
+
+from . import database
+from .config import settings
+
+SAFE_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+
+class ReadYourWritesMiddleware:
+    """After a successful write, set a cookie that pins the client's reads to
+    the primary for settings.read_your_writes_seconds, so get_read_db doesn't
+    serve them from a replica that hasn't caught up yet. Does nothing when no
+    replicas are configured."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] in SAFE_METHODS or not database.ReadSessionLocals:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                window = settings.read_your_writes_seconds
+                cookie = (
+                    f"{database.READ_PRIMARY_COOKIE}={time.time() + window:.3f}; "
+                    f"Max-Age={window}; Path=/; HttpOnly; SameSite=Lax"
+                )
+                message["headers"] = list(message.get("headers", [])) + [(b"set-cookie", cookie.encode())]
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
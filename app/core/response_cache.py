@@ -0,0 +1,134 @@
+import logging
+from typing import Optional
+
+import orjson
+from fastapi import Response
+from fastapi.concurrency import run_in_threadpool
+
+from .cache import TTLCache
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class InProcessBackend:
+    """Per-process LRU with TTL. The default; nothing to run."""
+
+    def __init__(self, max_entries: int, ttl: float):
+        self._cache = TTLCache(maxsize=max_entries, ttl=ttl)
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self._cache.get(key)
+
+    def set(self, key: str, value: bytes, ttl: int) -> None:
+        self._cache.set(key, value, ttl=ttl)
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+
+class RedisBackend:
+    """Any client with Redis' get/set(ex=) API (redis-py, or a fake in tests).
+    Eviction is Redis' own: configure maxmemory-policy allkeys-lru. Cache
+    errors are logged and treated as misses; they never fail a request."""
+
+    def __init__(self, client, prefix: str = "resp:"):
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            return self.client.get(self.prefix + key)
+        except Exception:
+            logger.warning("Response cache get failed", exc_info=True)
+            return None
+
+    def set(self, key: str, value: bytes, ttl: int) -> None:
+        try:
+            self.client.set(self.prefix + key, value, ex=ttl)
+        except Exception:
+            logger.warning("Response cache set failed", exc_info=True)
+
+    def clear(self) -> None:
+        try:
+            for key in self.client.scan_iter(match=self.prefix + "*"):
+                self.client.delete(key)
+        except Exception:
+            logger.warning("Response cache clear failed", exc_info=True)
+
+
+class ResponseCache:
+    """Serialized responses keyed by organization, resource, the
+    organization's change version and the query parameters.
+
+    Every write bumps the version (crud_organization.bump_version), so
+    invalidation is O(1): later reads build new keys and the old entries
+    are never read again, ageing out through TTL/LRU."""
+
+    def __init__(self, backend, ttl: int, enabled: bool = True):
+        self.backend = backend
+        self.ttl = ttl
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(organization_id: int, resource: str, version: int, *params) -> str:
+        return ":".join(str(part) for part in (organization_id, resource, version, *params))
+
+    def get(self, key: str) -> Optional[Response]:
+        if not self.enabled:
+            return None
+        value = self.backend.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        raw_headers, _, body = value.partition(b"\n")
+        headers = dict(orjson.loads(raw_headers))
+        headers["X-Cache"] = "HIT"
+        return Response(content=body, headers=headers)
+
+    def set(self, key: str, response: Response) -> None:
+        response.headers["X-Cache"] = "MISS"
+        if not self.enabled:
+            return
+        # Headers as one JSON line (orjson escapes newlines), then the body
+        headers = [
+            (name, value) for name, value in response.headers.items()
+            if name not in ("content-length", "x-cache")
+        ]
+        self.backend.set(key, orjson.dumps(headers) + b"\n" + response.body, self.ttl)
+
+    async def get_async(self, key: str) -> Optional[Response]:
+        # A Redis round trip would block the event loop
+        if isinstance(self.backend, RedisBackend):
+            return await run_in_threadpool(self.get, key)
+        return self.get(key)
+
+    async def set_async(self, key: str, response: Response) -> None:
+        if isinstance(self.backend, RedisBackend):
+            await run_in_threadpool(self.set, key, response)
+        else:
+            self.set(key, response)
+
+    def clear(self) -> None:
+        self.backend.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self) -> dict:
+        return {"backend": type(self.backend).__name__, "enabled": self.enabled, "hits": self.hits, "misses": self.misses}
+
+
+def create_backend():
+    if settings.response_cache_url:
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("RESPONSE_CACHE_URL is set but the 'redis' package is not installed")
+        return RedisBackend(redis.Redis.from_url(settings.response_cache_url))
+    return InProcessBackend(settings.response_cache_max_entries, settings.response_cache_ttl_seconds)
+
+
+response_cache = ResponseCache(create_backend(), settings.response_cache_ttl_seconds, settings.response_cache_enabled)
@@ -0,0 +1,152 @@
+import math
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+
+from .config import settings
+from .principal import Principal
+
+
+class RevocationStoreUnavailable(Exception):
+    """The revocation store can't be read or written. Revocation must fail
+    closed: the request that needed it is refused (503), never let through."""
+
+
+class InProcessStore:
+    """Per-process entries with a TTL. Nothing is ever evicted early, since
+    dropping an entry would un-revoke its token; once `max_entries` live
+    entries are stored, new ones are refused."""
+
+    def __init__(self, max_entries: int, timer=time.monotonic):
+        self.max_entries = max_entries
+        self.timer = timer
+        self._data: Dict[str, Tuple[bytes, float]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            if item[1] <= self.timer():
+                del self._data[key]
+                return None
+            return item[0]
+
+    def set(self, key: str, value: bytes, ttl: int) -> None:
+        now = self.timer()
+        with self._lock:
+            if key not in self._data and len(self._data) >= self.max_entries:
+                for expired in [k for k, (_, expires_at) in self._data.items() if expires_at <= now]:
+                    del self._data[expired]
+                if len(self._data) >= self.max_entries:
+                    raise RevocationStoreUnavailable(f"revocation store is full ({self.max_entries} entries)")
+            self._data[key] = (value, now + ttl)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+class RedisStore:
+    """Entries in Redis, shared by every worker. Unlike the response cache,
+    errors are not swallowed: they surface as RevocationStoreUnavailable."""
+
+    def __init__(self, client, prefix: str = "revoked:"):
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            return self.client.get(self.prefix + key)
+        except Exception as exc:
+            raise RevocationStoreUnavailable(f"revocation store read failed: {exc}") from exc
+
+    def set(self, key: str, value: bytes, ttl: int) -> None:
+        try:
+            self.client.set(self.prefix + key, value, ex=ttl)
+        except Exception as exc:
+            raise RevocationStoreUnavailable(f"revocation store write failed: {exc}") from exc
+
+    def clear(self) -> None:
+        for key in self.client.scan_iter(match=self.prefix + "*"):
+            self.client.delete(key)
+
+
+class TokenRevocations:
+    """Revoked access tokens, checked on every authenticated request.
+
+    Two kinds of entries, both of which only need to live as long as the
+    tokens they revoke:
+    - jti:<id>   a single token (logout), until that token expires
+    - ver:<user> the user's current token_version; tokens carrying an older
+      version (issued before a role change or a logout-everywhere) are refused
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    @staticmethod
+    def _max_token_lifetime() -> int:
+        return settings.access_token_expire_minutes * 60
+
+    def revoke_token(self, jti: str, expires_at: float) -> None:
+        ttl = math.ceil(expires_at - time.time())
+        if ttl > 0:
+            self.backend.set(f"jti:{jti}", b"1", ttl)
+
+    def revoke_user(self, user_id: int, token_version: int) -> None:
+        self.backend.set(f"ver:{user_id}", str(token_version).encode(), self._max_token_lifetime())
+
+    def is_revoked(self, principal: Principal) -> bool:
+        if principal.jti and self.backend.get(f"jti:{principal.jti}") is not None:
+            return True
+        current = self.backend.get(f"ver:{principal.id}")
+        return current is not None and principal.token_version < int(current)
+
+    # Redis round trips would block the event loop; the async variants run
+    # them on the thread pool
+    async def revoke_token_async(self, jti: str, expires_at: float) -> None:
+        await self._call(self.revoke_token, jti, expires_at)
+
+    async def revoke_user_async(self, user_id: int, token_version: int) -> None:
+        await self._call(self.revoke_user, user_id, token_version)
+
+    async def is_revoked_async(self, principal: Principal) -> bool:
+        return await self._call(self.is_revoked, principal)
+
+    async def _call(self, function, *args):
+        if isinstance(self.backend, RedisStore):
+            return await run_in_threadpool(function, *args)
+        return function(*args)
+
+    def clear(self) -> None:
+        self.backend.clear()
+
+
+def require_shared_backend(workers: int) -> None:
+    """Refuse to serve from several worker processes with per-process
+    revocations: a logout would only take effect in the worker that handled
+    it. Called by gunicorn.conf.py before the workers start."""
+    if workers > 1 and not settings.revocation_url:
+        raise RuntimeError(
+            f"{workers} workers need a shared token revocation store: set REVOCATION_URL "
+            "(redis://...) or run a single worker (WEB_CONCURRENCY=1)"
+        )
+
+
+def create_backend():
+    if settings.revocation_url:
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("REVOCATION_URL is set but the 'redis' package is not installed")
+        return RedisStore(redis.Redis.from_url(settings.revocation_url))
+    # Entries expire with the tokens, so the bound only matters under a flood
+    # of logouts; size it above the number of logouts per token lifetime.
+    return InProcessStore(settings.revocation_max_entries)
+
+
+token_revocations = TokenRevocations(create_backend())
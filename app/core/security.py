@@ -1,16 +1,131 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import List, Optional, Tuple
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from .config import settings
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.bcrypt_rounds)
 
-def verify_password(plain_password, hashed_password):
+
+class HashingPoolSaturated(Exception):
+    """Raised when too many password hashing jobs are already waiting."""
+
+
+# bcrypt is CPU bound and slow on purpose, so hashing runs in a small process
+# pool instead of on the request thread. The semaphore caps how many jobs can
+# be queued; callers over the cap get HashingPoolSaturated (HTTP 503).
+# Batches from bulk user creation go to a second pool with its own slots, so
+# a few hundred passwords never sit in front of a sign-in.
+_hashing_pool: Optional[ProcessPoolExecutor] = None
+_bulk_hashing_pool: Optional[ProcessPoolExecutor] = None
+_hashing_pool_lock = threading.Lock()
+_hashing_slots = threading.BoundedSemaphore(settings.password_hash_max_pending)
+_bulk_hashing_slots = threading.BoundedSemaphore(settings.password_hash_max_pending)
+
+def _new_pool(max_workers: int) -> ProcessPoolExecutor:
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn"))
+
+def _bulk_workers() -> int:
+    return settings.password_hash_bulk_workers or os.cpu_count() or 1
+
+def _get_hashing_pool() -> ProcessPoolExecutor:
+    global _hashing_pool
+    with _hashing_pool_lock:
+        if _hashing_pool is None:
+            _hashing_pool = _new_pool(settings.password_hash_workers)
+        return _hashing_pool
+
+def _get_bulk_hashing_pool() -> ProcessPoolExecutor:
+    global _bulk_hashing_pool
+    with _hashing_pool_lock:
+        if _bulk_hashing_pool is None:
+            _bulk_hashing_pool = _new_pool(_bulk_workers())
+        return _bulk_hashing_pool
+
+def shutdown_hashing_pool():
+    global _hashing_pool, _bulk_hashing_pool
+    with _hashing_pool_lock:
+        for pool in (_hashing_pool, _bulk_hashing_pool):
+            if pool is not None:
+                pool.shutdown(wait=False, cancel_futures=True)
+        _hashing_pool = _bulk_hashing_pool = None
+
+def _submit(fn, *args) -> Future:
+    if settings.password_hash_workers <= 0:
+        future = Future()
+        future.set_result(fn(*args))
+        return future
+    if not _hashing_slots.acquire(blocking=False):
+        raise HashingPoolSaturated()
+    try:
+        future = _get_hashing_pool().submit(fn, *args)
+    except BaseException:
+        _hashing_slots.release()
+        raise
+    future.add_done_callback(lambda _: _hashing_slots.release())
+    return future
+
+# Module-level so they can be pickled into the pool's worker processes
+def _hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+def _verify(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
+def _verify_and_update(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+def warm_hashing_pool():
+    """Start every hashing process and load bcrypt in it, so the first
+    sign-ins after a deploy don't wait for the processes to spawn."""
+    if settings.password_hash_workers <= 0:
+        _hash("warm-up")
+        return
+    # Jobs submitted while none is idle each start a process
+    pool = _get_hashing_pool()
+    for future in [pool.submit(_hash, "warm-up") for _ in range(settings.password_hash_workers)]:
+        future.result()
+
+def verify_password(plain_password, hashed_password):
+    return _submit(_verify, plain_password, hashed_password).result()
+
+def verify_and_update_password(plain_password, hashed_password) -> Tuple[bool, Optional[str]]:
+    """Verify a password and, if its hash was made with outdated settings
+    (e.g. a different bcrypt cost), return a fresh hash to store."""
+    return _submit(_verify_and_update, plain_password, hashed_password).result()
+
 def get_password_hash(password):
-    return pwd_context.hash(password)
+    return _submit(_hash, password).result()
+
+def get_password_hashes(passwords: List[str]) -> List[str]:
+    """Hash a batch spread over every worker of the bulk pool. Sign-ins use
+    the other pool, so a large batch doesn't delay them."""
+    if settings.password_hash_workers <= 0:
+        return [_hash(password) for password in passwords]
+    if not _bulk_hashing_slots.acquire(blocking=False):
+        raise HashingPoolSaturated()
+    try:
+        # A few chunks per worker, so an uneven split doesn't leave cores idle
+        chunksize = max(1, len(passwords) // (_bulk_workers() * 4))
+        return list(_get_bulk_hashing_pool().map(_hash, passwords, chunksize=chunksize))
+    finally:
+        _bulk_hashing_slots.release()
+
+async def verify_and_update_password_async(plain_password, hashed_password) -> Tuple[bool, Optional[str]]:
+    return await asyncio.wrap_future(_submit(_verify_and_update, plain_password, hashed_password))
+
+async def get_password_hash_async(password):
+    return await asyncio.wrap_future(_submit(_hash, password))
+
+async def get_password_hashes_async(passwords: List[str]) -> List[str]:
+    # pool.map blocks while it collects results, so wait for it on a thread
+    return await asyncio.to_thread(get_password_hashes, passwords)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -18,7 +133,8 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
         expire = datetime.utcnow() + expires_delta
     else:
         expire = datetime.utcnow() + timedelta(minutes=15)
-    to_encode.update({"exp": expire})
+    # A unique id lets a single token be revoked (see core.revocation)
+    to_encode.update({"exp": expire, "jti": uuid.uuid4().hex})
     encoded_jwt = jwt.encode(to_encode, settings.secret_key, algorithm=settings.algorithm)
     return encoded_jwt
 
@@ -30,4 +146,4 @@ def verify_token(token: str):
             return None
         return username
     except JWTError:
-        return None
\ No newline at end of file
+        return None
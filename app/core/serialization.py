@@ -0,0 +1,28 @@
+from typing import Mapping, Optional, Sequence
+
+import orjson
+from fastapi import Response
+from sqlalchemy.engine import Row
+
+# Write UTC offsets as "Z", the way pydantic does for response_model routes
+ORJSON_OPTIONS = orjson.OPT_UTC_Z
+
+
+def rows_to_json(rows: Sequence[Row]) -> bytes:
+    return orjson.dumps([row._asdict() for row in rows], option=ORJSON_OPTIONS)
+
+
+def rows_response(rows: Sequence[Row], headers: Optional[Mapping[str, str]] = None) -> Response:
+    """Serialize Core rows straight to JSON bytes. Returning a Response skips
+    FastAPI's response_model validation; the route's response_model still
+    documents the shape in OpenAPI."""
+    return Response(content=rows_to_json(rows), media_type="application/json", headers=headers)
+
+
+def row_response(row: Row) -> Response:
+    return Response(content=orjson.dumps(row._asdict(), option=ORJSON_OPTIONS), media_type="application/json")
+
+
+def json_response(content) -> Response:
+    """orjson-encode any structure of dicts, lists and datetimes."""
+    return Response(content=orjson.dumps(content, option=ORJSON_OPTIONS), media_type="application/json")
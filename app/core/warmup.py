@@ -0,0 +1,153 @@
+import asyncio
+import logging
+import time
+from typing import Dict, Optional
+
+from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import text
+
+from .config import settings
+from .database import async_engine, engine, read_engines
+from .metrics import metrics
+from .security import warm_hashing_pool
+
+logger = logging.getLogger(__name__)
+
+# Backoff between warm-up attempts after a failure (e.g. the database is
+# still down at boot), doubling up to the maximum
+WARMUP_RETRY_SECONDS = 1.0
+WARMUP_RETRY_MAX_SECONDS = 30.0
+
+
+class Readiness:
+    """Per-worker state behind /health/ready: not ready until the warm-up in
+    the lifespan has finished, and again once shutdown starts."""
+
+    def __init__(self):
+        self.ready = False
+        self.startup_ms: Dict[str, float] = {}
+        self.retry_task: Optional[asyncio.Task] = None
+
+
+readiness = Readiness()
+
+
+def pool_connections(db_engine) -> int:
+    # SQLite pools don't take a size (see pool_stats.pool_options)
+    return 1 if db_engine.dialect.name == "sqlite" else settings.db_pool_size
+
+
+def warm_engine(db_engine) -> None:
+    """Open a full pool's worth of connections, with a round trip on each, and
+    hand them back to the pool."""
+    connections = []
+    try:
+        for _ in range(pool_connections(db_engine)):
+            connections.append(db_engine.connect())
+            connections[-1].execute(text("SELECT 1"))
+    finally:
+        for connection in connections:
+            connection.close()
+
+
+async def warm_async_engine() -> None:
+    connections = []
+    try:
+        for _ in range(pool_connections(async_engine.sync_engine)):
+            connections.append(await async_engine.connect())
+            await connections[-1].execute(text("SELECT 1"))
+    finally:
+        for connection in connections:
+            await connection.close()
+
+
+async def warm_up(app: FastAPI) -> Dict[str, float]:
+    """Pay the first-request costs before the worker takes traffic. Returns
+    the milliseconds spent per phase."""
+    timings = {}
+
+    def timed(phase: str, started: float) -> None:
+        timings[phase] = round((time.perf_counter() - started) * 1000, 2)
+
+    started = time.perf_counter()
+    app.openapi()
+    timed("openapi", started)
+
+    phase_started = time.perf_counter()
+    if settings.use_async_db:
+        await warm_async_engine()
+    else:
+        for db_engine in (engine, *read_engines):
+            await run_in_threadpool(warm_engine, db_engine)
+    timed("database", phase_started)
+
+    phase_started = time.perf_counter()
+    await run_in_threadpool(warm_hashing_pool)
+    timed("password_hashing", phase_started)
+
+    timed("total", started)
+    return timings
+
+
+def _ping(db_engine) -> None:
+    with db_engine.connect() as connection:
+        connection.execute(text("SELECT 1"))
+
+
+async def check_database() -> Optional[str]:
+    """One round trip to the primary; returns the error, if any."""
+    try:
+        if settings.use_async_db:
+            async with async_engine.connect() as connection:
+                await connection.execute(text("SELECT 1"))
+        else:
+            await run_in_threadpool(_ping, engine)
+    except Exception as exc:
+        logger.warning("Readiness check failed", exc_info=True)
+        return type(exc).__name__
+    return None
+
+
+def _warmed_up(timings: Dict[str, float]) -> None:
+    readiness.startup_ms = timings
+    metrics.startup_seconds = {phase: ms / 1000 for phase, ms in timings.items()}
+    logger.info("Worker warmed up in %.0f ms: %s", timings["total"], timings)
+    readiness.ready = True
+
+
+async def _retry_warm_up(app: FastAPI) -> None:
+    delay = WARMUP_RETRY_SECONDS
+    while True:
+        await asyncio.sleep(delay)
+        try:
+            timings = await warm_up(app)
+        except Exception:
+            delay = min(delay * 2, WARMUP_RETRY_MAX_SECONDS)
+            logger.warning("Warm-up failed, retrying in %.0fs", delay, exc_info=True)
+            continue
+        _warmed_up(timings)
+        return
+
+
+async def start(app: FastAPI) -> None:
+    """Warm up, or keep retrying in the background if that fails. A failed
+    warm-up must not fail the lifespan: gunicorn stops the whole server when
+    a worker can't boot. /health/ready stays 503 meanwhile."""
+    if not settings.startup_warmup:
+        readiness.ready = True
+        return
+    try:
+        timings = await warm_up(app)
+    except Exception:
+        logger.warning("Warm-up failed, retrying in %.0fs", WARMUP_RETRY_SECONDS, exc_info=True)
+        readiness.retry_task = asyncio.create_task(_retry_warm_up(app))
+        return
+    _warmed_up(timings)
+
+
+def stop() -> None:
+    readiness.ready = False
+    if readiness.retry_task is not None:
+        readiness.retry_task.cancel()
+        readiness.retry_task = None
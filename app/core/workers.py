@@ -0,0 +1,21 @@
+from uvicorn.workers import UvicornWorker as BaseUvicornWorker
+
+# Seconds left between the end of draining and gunicorn's SIGKILL, for the
+# lifespan shutdown (events listener, hashing pool)
+SHUTDOWN_MARGIN = 5
+
+
+class UvicornWorker(BaseUvicornWorker):
+    """The gunicorn worker class used by gunicorn.conf.py.
+
+    Pins uvloop and httptools (both installed with uvicorn[standard]) instead
+    of falling back silently, and bounds draining: on SIGTERM in-flight
+    requests get up to graceful_timeout to finish, after which what's left
+    (typically /events streams, whose clients reconnect) is cancelled so the
+    app still shuts down cleanly."""
+
+    CONFIG_KWARGS = {"loop": "uvloop", "http": "httptools"}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.config.timeout_graceful_shutdown = max(self.cfg.graceful_timeout - SHUTDOWN_MARGIN, 1)
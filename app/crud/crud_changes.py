@@ -0,0 +1,94 @@
+from typing import Iterable, List, Optional
+from sqlalchemy import insert, select, tuple_
+from sqlalchemy.orm import Session
+from ..models.models import Tombstone
+from ..core.pagination import (
+    CHANGE_CAUGHT_UP, CHANGE_DELETE, CHANGE_UPSERT, decode_change_cursor, encode_change_cursor,
+)
+
+# Every write to a note or todo bumps the organization's version for the
+# resource (crud_organization.bump_version) and records the new value as the
+# row's change_seq, or as the change_seq of a tombstone for deletes. The
+# version UPDATE holds the organization row lock until commit, so sequence
+# numbers become visible in order: once a reader sees version v, every change
+# up to v is committed and nothing with a lower number can appear later.
+
+def tombstone_statement(resource: str, organization_id: int, ids: Iterable[int], change_seq: int):
+    return insert(Tombstone).values([
+        {"organization_id": organization_id, "resource": resource, "record_id": id, "change_seq": change_seq}
+        for id in ids
+    ])
+
+def change_statements(model, columns, resource: str, organization_id: int, version: int, since: Optional[str], limit: int):
+    """The two keyset queries behind a change feed page: rows written and
+    tombstones recorded after `since`, up to `version`, each fetching one row
+    more than the page so the merge can tell whether more remain."""
+    rows = select(*columns, model.change_seq).where(
+        model.organization_id == organization_id, model.change_seq <= version
+    )
+    tombstones = select(Tombstone.record_id, Tombstone.change_seq).where(
+        Tombstone.organization_id == organization_id,
+        Tombstone.resource == resource,
+        Tombstone.change_seq <= version,
+    )
+    if since:
+        change_seq, kind, id = decode_change_cursor(since)
+        if kind == CHANGE_UPSERT:
+            rows = rows.where(tuple_(model.change_seq, model.id) > (change_seq, id))
+            tombstones = tombstones.where(Tombstone.change_seq >= change_seq)
+        elif kind == CHANGE_DELETE:
+            rows = rows.where(model.change_seq > change_seq)
+            tombstones = tombstones.where(tuple_(Tombstone.change_seq, Tombstone.record_id) > (change_seq, id))
+        else:
+            rows = rows.where(model.change_seq > change_seq)
+            tombstones = tombstones.where(Tombstone.change_seq > change_seq)
+    rows = rows.order_by(model.change_seq, model.id).limit(limit + 1)
+    tombstones = tombstones.order_by(Tombstone.change_seq, Tombstone.record_id).limit(limit + 1)
+    return rows, tombstones
+
+def is_caught_up(version: int, since: Optional[str]) -> bool:
+    """True if `since` already covers every change up to `version`, so the
+    page is empty without querying."""
+    if not since:
+        return False
+    change_seq, kind, _ = decode_change_cursor(since)
+    return kind == CHANGE_CAUGHT_UP and change_seq >= version
+
+def merge_changes(version: int, since: Optional[str], rows: List, tombstones: List, limit: int) -> dict:
+    """Interleave both queries in (change_seq, kind, id) order and cut the
+    page. Clients apply `deletes` before `upserts`: a live row is always
+    newer than any tombstone with the same id."""
+    changes = sorted(
+        [(row.change_seq, CHANGE_UPSERT, row.id, row) for row in rows]
+        + [(tombstone.change_seq, CHANGE_DELETE, tombstone.record_id, None) for tombstone in tombstones],
+        key=lambda change: change[:3],
+    )
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+    if has_more:
+        cursor = encode_change_cursor(*changes[-1][:3])
+    elif since and decode_change_cursor(since)[0] > version:
+        # Read from a replica that is behind the one the cursor came from
+        cursor = since
+    else:
+        cursor = encode_change_cursor(version, CHANGE_CAUGHT_UP, 0)
+    upserts = []
+    for _, kind, _, row in changes:
+        if kind == CHANGE_UPSERT:
+            values = row._asdict()
+            del values["change_seq"]
+            upserts.append(values)
+    return {
+        "upserts": upserts,
+        "deletes": [id for _, kind, id, _ in changes if kind == CHANGE_DELETE],
+        "cursor": cursor,
+        "has_more": has_more,
+    }
+
+def get_changes(db: Session, model, columns, resource: str, organization_id: int, version: int, since: Optional[str] = None, limit: int = 500) -> dict:
+    """One page of the change feed for `resource` after the `since` cursor,
+    read up to the organization's `version` (as read by the caller)."""
+    if is_caught_up(version, since):
+        return merge_changes(version, since, [], [], limit)
+    rows, tombstones = change_statements(model, columns, resource, organization_id, version, since, limit)
+    return merge_changes(version, since, db.execute(rows).all(), db.execute(tombstones).all(), limit)
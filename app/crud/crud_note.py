@@ -1,37 +1,225 @@
+from typing import BinaryIO, Callable, Dict, Iterable, List, Optional, Sequence
+from sqlalchemy import and_, delete, func, insert, literal, or_, select, text, update
 from sqlalchemy.orm import Session
 from ..models.models import Note, User
+from ..core.events import record_event
+from ..core.importer import ImportReport, column_lengths, insert_rows, run_import
+from ..core.pagination import apply_keyset, keyset_page, next_cursor_for
+from . import crud_changes, crud_organization
 from ..schemas.schemas import NoteCreate, NoteUpdate
 
+# Columns of the Note response schema, for read paths that skip the ORM
+NOTE_COLUMNS = (
+    Note.id, Note.title, Note.content, Note.created_by, Note.organization_id, Note.created_at, Note.updated_at
+)
+
+# List pages leave out the content unless asked for it (?fields=)
+NOTE_FIELDS = tuple(column.key for column in NOTE_COLUMNS)
+NOTE_SUMMARY_FIELDS = tuple(name for name in NOTE_FIELDS if name != "content")
+
+def note_columns(fields: Optional[Sequence[str]] = None):
+    if fields is None:
+        return NOTE_COLUMNS
+    return tuple(column for column in NOTE_COLUMNS if column.key in fields)
+
 def get_note(db: Session, note_id: int):
     return db.query(Note).filter(Note.id == note_id).first()
 
+def get_note_row(db: Session, note_id: int):
+    return db.execute(select(*NOTE_COLUMNS).where(Note.id == note_id)).first()
+
 def get_notes_by_organization(db: Session, organization_id: int, skip: int = 0, limit: int = 100):
     return db.query(Note).filter(Note.organization_id == organization_id).offset(skip).limit(limit).all()
 
+def get_notes_page(db: Session, organization_id: int, limit: int = 100, cursor: Optional[str] = None, skip: int = 0):
+    query = db.query(Note).filter(Note.organization_id == organization_id)
+    return keyset_page(query, Note, limit=limit, cursor=cursor, skip=skip)
+
+def get_note_rows_page(
+    db: Session, organization_id: int, limit: int = 100, cursor: Optional[str] = None, skip: int = 0,
+    fields: Optional[Sequence[str]] = None,
+):
+    """Like get_notes_page but returns plain Core rows: no identity map, no
+    change tracking, nothing for pydantic to re-validate."""
+    statement = select(*note_columns(fields)).where(Note.organization_id == organization_id)
+    rows = db.execute(apply_keyset(statement, Note, cursor=cursor, skip=skip).limit(limit)).all()
+    return rows, next_cursor_for(rows, limit)
+
 def create_note(db: Session, note: NoteCreate, user_id: int, organization_id: int):
+    change_seq = crud_organization.bump_version(db, organization_id, "notes", notes_count=1)
     db_note = Note(
         **note.dict(),
         created_by=user_id,
-        organization_id=organization_id
+        organization_id=organization_id,
+        change_seq=change_seq
     )
     db.add(db_note)
+    db.flush()
+    record_event(db, organization_id, "notes", "created", [db_note.id], change_seq)
     db.commit()
     db.refresh(db_note)
     return db_note
 
-def update_note(db: Session, note_id: int, note_update: NoteUpdate):
-    db_note = db.query(Note).filter(Note.id == note_id).first()
-    if db_note:
-        for key, value in note_update.dict(exclude_unset=True).items():
-            setattr(db_note, key, value)
-        db.commit()
-        db.refresh(db_note)
-    return db_note
+def update_note(db: Session, note_id: int, organization_id: int, note_update: NoteUpdate):
+    """Update a note of `organization_id` with a single UPDATE ... RETURNING.
+    Returns the updated row, or None if the note is missing or belongs to
+    another organization."""
+    values = note_update.dict(exclude_unset=True)
+    condition = (Note.id == note_id) & (Note.organization_id == organization_id)
+    if not values:
+        return db.execute(select(*NOTE_COLUMNS).where(condition)).first()
+    # Bump first so the row is written once, change_seq included; a miss
+    # rolls the bump back
+    change_seq = crud_organization.bump_version(db, organization_id, "notes")
+    row = db.execute(
+        update(Note).where(condition).values(dict(values, change_seq=change_seq)).returning(*NOTE_COLUMNS)
+    ).first()
+    if row is None:
+        db.rollback()
+        return None
+    record_event(db, organization_id, "notes", "updated", [note_id], change_seq)
+    db.commit()
+    return row
+
+def delete_note(db: Session, note_id: int, organization_id: int):
+    """Delete a note of `organization_id` with a single DELETE ... RETURNING."""
+    deleted = db.scalar(
+        delete(Note).where(Note.id == note_id, Note.organization_id == organization_id).returning(Note.id)
+    )
+    if deleted is None:
+        db.rollback()
+        return False
+    change_seq = crud_organization.bump_version(db, organization_id, "notes", notes_count=-1)
+    db.execute(crud_changes.tombstone_statement("notes", organization_id, [deleted], change_seq))
+    record_event(db, organization_id, "notes", "deleted", [deleted], change_seq)
+    db.commit()
+    return True
 
-def delete_note(db: Session, note_id: int):
-    db_note = db.query(Note).filter(Note.id == note_id).first()
-    if db_note:
-        db.delete(db_note)
+def get_note_changes(db: Session, organization_id: int, version: int, since: Optional[str] = None, limit: int = 500) -> dict:
+    return crud_changes.get_changes(db, Note, NOTE_COLUMNS, "notes", organization_id, version, since=since, limit=limit)
+
+def export_notes(db: Session, organization_id: int, batch_size: int = 1000):
+    """Stream every note of the organization through a server-side cursor."""
+    statement = select(*NOTE_COLUMNS).where(Note.organization_id == organization_id).order_by(Note.id)
+    return db.execute(statement.execution_options(yield_per=batch_size))
+
+def import_notes(
+    db: Session,
+    fileobj: BinaryIO,
+    format: str,
+    user_id: int,
+    organization_id: int,
+    batch_size: int = 1000,
+    on_progress: Optional[Callable[[ImportReport], None]] = None,
+) -> ImportReport:
+    """Load an NDJSON/CSV stream of NoteCreate rows, committing one batch at a time."""
+    def insert_batch(rows: List[dict]):
+        change_seq = crud_organization.bump_version(db, organization_id, "notes", notes_count=len(rows))
+        insert_rows(db, Note.__table__, [
+            dict(row, created_by=user_id, organization_id=organization_id, change_seq=change_seq) for row in rows
+        ])
+        record_event(db, organization_id, "notes", "created", None, change_seq)
         db.commit()
-        return True
-    return False
\ No newline at end of file
+
+    return run_import(
+        fileobj, format, NoteCreate, insert_batch,
+        batch_size=batch_size, on_progress=on_progress, max_lengths=column_lengths(Note.__table__),
+    )
+
+def get_note_organizations(db: Session, note_ids: Iterable[int]) -> Dict[int, int]:
+    """Map each existing id in `note_ids` to its organization in one query."""
+    rows = db.execute(select(Note.id, Note.organization_id).where(Note.id.in_(set(note_ids))))
+    return dict(rows.all())
+
+def create_notes(db: Session, notes: List[NoteCreate], user_id: int, organization_id: int) -> List[int]:
+    change_seq = crud_organization.bump_version(db, organization_id, "notes", notes_count=len(notes))
+    rows = [
+        dict(note.dict(), created_by=user_id, organization_id=organization_id, change_seq=change_seq)
+        for note in notes
+    ]
+    note_ids = db.scalars(insert(Note).returning(Note.id, sort_by_parameter_order=True), rows).all()
+    record_event(db, organization_id, "notes", "created", note_ids, change_seq)
+    db.commit()
+    return note_ids
+
+def delete_notes(db: Session, note_ids: List[int], organization_id: int):
+    deleted = db.scalars(
+        delete(Note).where(Note.id.in_(note_ids), Note.organization_id == organization_id)
+        .returning(Note.id)
+        .execution_options(synchronize_session=False)
+    ).all()
+    change_seq = crud_organization.bump_version(db, organization_id, "notes", notes_count=-len(deleted))
+    if deleted:
+        db.execute(crud_changes.tombstone_statement("notes", organization_id, deleted, change_seq))
+        record_event(db, organization_id, "notes", "deleted", deleted, change_seq)
+    db.commit()
+
+POSTGRES_SEARCH_SQL = text("""
+    SELECT notes.id, notes.title,
+           ts_headline('english', notes.content, query,
+                       'StartSel=<mark>, StopSel=</mark>, MaxFragments=2, MaxWords=20, MinWords=5') AS snippet,
+           ts_rank_cd(notes.search_vector, query) AS rank
+    FROM notes, websearch_to_tsquery('english', :q) AS query
+    WHERE notes.organization_id = :organization_id AND notes.search_vector @@ query
+    ORDER BY rank DESC, notes.id
+    LIMIT :limit
+""")
+
+SQLITE_SEARCH_SQL = text("""
+    SELECT notes.id, notes.title,
+           snippet(notes_fts, 1, '<mark>', '</mark>', '...', 16) AS snippet,
+           -bm25(notes_fts, 2.0, 1.0) AS rank
+    FROM notes_fts JOIN notes ON notes.id = notes_fts.rowid
+    WHERE notes_fts MATCH :q AND notes.organization_id = :organization_id
+    ORDER BY rank DESC, notes.id
+    LIMIT :limit
+""")
+
+def _fts5_query(q: str) -> str:
+    # Quote every term so user input can't use (or break) FTS5 query syntax
+    return " ".join('"{}"'.format(term.replace('"', '""')) for term in q.split())
+
+SEARCH_FALLBACK_SNIPPET_LENGTH = 200
+
+def ilike_search_statement(organization_id: int, q: str, limit: int):
+    # No full-text index on this dialect: every term must appear in the title
+    # or content, newest first, with the start of the content as the snippet
+    terms = q.split()
+    if not terms:
+        return None
+    return (
+        select(
+            Note.id,
+            Note.title,
+            func.substr(Note.content, 1, SEARCH_FALLBACK_SNIPPET_LENGTH).label("snippet"),
+            literal(0.0).label("rank"),
+        )
+        .where(
+            Note.organization_id == organization_id,
+            and_(*(
+                or_(Note.title.icontains(term, autoescape=True), Note.content.icontains(term, autoescape=True))
+                for term in terms
+            )),
+        )
+        .order_by(Note.id.desc())
+        .limit(limit)
+    )
+
+def search_statement(dialect: str, organization_id: int, q: str, limit: int):
+    """The search query for `dialect`, or None when `q` has nothing to search for."""
+    if dialect == "postgresql":
+        statement = POSTGRES_SEARCH_SQL
+    elif dialect == "sqlite":
+        statement, q = SQLITE_SEARCH_SQL, _fts5_query(q)
+    else:
+        return ilike_search_statement(organization_id, q, limit)
+    if not q:
+        return None
+    return statement.bindparams(q=q, organization_id=organization_id, limit=limit)
+
+def search_notes(db: Session, organization_id: int, q: str, limit: int = 20):
+    """Ranked full-text search with highlighted snippets; higher rank is better."""
+    statement = search_statement(db.get_bind().dialect.name, organization_id, q, limit)
+    if statement is None:
+        return []
+    return db.execute(statement).mappings().all()
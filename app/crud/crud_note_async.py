@@ -0,0 +1,120 @@
+from typing import BinaryIO, Dict, Iterable, List, Optional, Sequence
+from sqlalchemy import delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..models.models import Note
+from ..core.events import record_event
+from ..core.importer import ImportReport, column_lengths, insert_rows_async, run_import_async
+from ..core.pagination import apply_keyset, next_cursor_for
+from .crud_changes import change_statements, is_caught_up, merge_changes, tombstone_statement
+from .crud_organization import version_bump_statement
+from . import crud_note
+from .crud_note import NOTE_COLUMNS, note_columns, search_statement
+from ..schemas.schemas import NoteCreate, NoteUpdate
+
+async def get_note(db: AsyncSession, note_id: int):
+    return await db.scalar(select(Note).where(Note.id == note_id))
+
+async def get_note_row(db: AsyncSession, note_id: int):
+    return (await db.execute(select(*NOTE_COLUMNS).where(Note.id == note_id))).first()
+
+async def get_notes_page(db: AsyncSession, organization_id: int, limit: int = 100, cursor: Optional[str] = None, skip: int = 0):
+    stmt = select(Note).where(Note.organization_id == organization_id)
+    stmt = apply_keyset(stmt, Note, cursor=cursor, skip=skip).limit(limit)
+    notes = (await db.scalars(stmt)).all()
+    return notes, next_cursor_for(notes, limit)
+
+async def get_note_rows_page(
+    db: AsyncSession, organization_id: int, limit: int = 100, cursor: Optional[str] = None, skip: int = 0,
+    fields: Optional[Sequence[str]] = None,
+):
+    statement = select(*note_columns(fields)).where(Note.organization_id == organization_id)
+    rows = (await db.execute(apply_keyset(statement, Note, cursor=cursor, skip=skip).limit(limit))).all()
+    return rows, next_cursor_for(rows, limit)
+
+async def get_note_changes(db: AsyncSession, organization_id: int, version: int, since: Optional[str] = None, limit: int = 500) -> dict:
+    if is_caught_up(version, since):
+        return merge_changes(version, since, [], [], limit)
+    rows, tombstones = change_statements(Note, NOTE_COLUMNS, "notes", organization_id, version, since, limit)
+    return merge_changes(version, since, (await db.execute(rows)).all(), (await db.execute(tombstones)).all(), limit)
+
+async def export_notes(db: AsyncSession, organization_id: int, batch_size: int = 1000):
+    statement = select(*NOTE_COLUMNS).where(Note.organization_id == organization_id).order_by(Note.id)
+    return await db.stream(statement.execution_options(yield_per=batch_size))
+
+async def import_notes(
+    db: AsyncSession, fileobj: BinaryIO, format: str, user_id: int, organization_id: int, batch_size: int = 1000
+) -> ImportReport:
+    async def insert_batch(rows: List[dict]):
+        change_seq = await db.scalar(version_bump_statement(organization_id, "notes", notes_count=len(rows)))
+        await insert_rows_async(db, Note.__table__, [
+            dict(row, created_by=user_id, organization_id=organization_id, change_seq=change_seq) for row in rows
+        ])
+        record_event(db, organization_id, "notes", "created", None, change_seq)
+        await db.commit()
+
+    return await run_import_async(
+        fileobj, format, NoteCreate, insert_batch, batch_size=batch_size, max_lengths=column_lengths(Note.__table__)
+    )
+
+async def create_note(db: AsyncSession, note: NoteCreate, user_id: int, organization_id: int):
+    change_seq = await db.scalar(version_bump_statement(organization_id, "notes", notes_count=1))
+    db_note = Note(
+        **note.dict(),
+        created_by=user_id,
+        organization_id=organization_id,
+        change_seq=change_seq
+    )
+    db.add(db_note)
+    await db.flush()
+    record_event(db, organization_id, "notes", "created", [db_note.id], change_seq)
+    await db.commit()
+    await db.refresh(db_note)
+    return db_note
+
+async def update_note(db: AsyncSession, note_id: int, organization_id: int, note_update: NoteUpdate):
+    values = note_update.dict(exclude_unset=True)
+    condition = (Note.id == note_id) & (Note.organization_id == organization_id)
+    if not values:
+        return (await db.execute(select(*NOTE_COLUMNS).where(condition))).first()
+    change_seq = await db.scalar(version_bump_statement(organization_id, "notes"))
+    row = (await db.execute(
+        update(Note).where(condition).values(dict(values, change_seq=change_seq)).returning(*NOTE_COLUMNS)
+    )).first()
+    if row is None:
+        await db.rollback()
+        return None
+    record_event(db, organization_id, "notes", "updated", [note_id], change_seq)
+    await db.commit()
+    return row
+
+async def delete_note(db: AsyncSession, note_id: int, organization_id: int):
+    deleted = await db.scalar(
+        delete(Note).where(Note.id == note_id, Note.organization_id == organization_id).returning(Note.id)
+    )
+    if deleted is None:
+        await db.rollback()
+        return False
+    change_seq = await db.scalar(version_bump_statement(organization_id, "notes", notes_count=-1))
+    await db.execute(tombstone_statement("notes", organization_id, [deleted], change_seq))
+    record_event(db, organization_id, "notes", "deleted", [deleted], change_seq)
+    await db.commit()
+    return True
+
+async def get_note_organization(db: AsyncSession, note_id: int) -> Optional[int]:
+    return await db.scalar(select(Note.organization_id).where(Note.id == note_id))
+
+async def search_notes(db: AsyncSession, organization_id: int, q: str, limit: int = 20):
+    statement = search_statement(db.get_bind().dialect.name, organization_id, q, limit)
+    if statement is None:
+        return []
+    return (await db.execute(statement)).mappings().all()
+
+# The bulk writes reuse the sync statements on the session's sync facade
+async def get_note_organizations(db: AsyncSession, note_ids: Iterable[int]) -> Dict[int, int]:
+    return await db.run_sync(crud_note.get_note_organizations, note_ids)
+
+async def create_notes(db: AsyncSession, notes: List[NoteCreate], user_id: int, organization_id: int) -> List[int]:
+    return await db.run_sync(crud_note.create_notes, notes, user_id, organization_id)
+
+async def delete_notes(db: AsyncSession, note_ids: List[int], organization_id: int):
+    await db.run_sync(crud_note.delete_notes, note_ids, organization_id)
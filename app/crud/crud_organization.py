@@ -0,0 +1,126 @@
+from typing import List, Optional, Tuple
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import Session
+from ..models.models import Note, Organization, Todo
+
+VERSION_COLUMNS = {
+    "notes": Organization.notes_version,
+    "todos": Organization.todos_version,
+}
+
+# Counter columns each resource's writes may adjust
+COUNTER_COLUMNS = {
+    "notes": ("notes_count",),
+    "todos": ("todos_open", "todos_done"),
+}
+
+TOTAL_COLUMNS = {
+    "notes": Organization.notes_count,
+    "todos": Organization.todos_open + Organization.todos_done,
+}
+
+def _counter_values(resource: str, deltas: dict) -> dict:
+    values = {}
+    for name, delta in deltas.items():
+        if name not in COUNTER_COLUMNS[resource]:
+            raise ValueError(f"{name} is not a {resource} counter")
+        if delta:
+            counter = getattr(Organization, name)
+            values[counter] = counter + delta
+    return values
+
+def version_bump_statement(organization_id: int, resource: str, **deltas: int):
+    column = VERSION_COLUMNS[resource]
+    values = {column: column + 1, **_counter_values(resource, deltas)}
+    return (
+        update(Organization)
+        .where(Organization.id == organization_id)
+        .values(values)
+        .returning(column)
+        .execution_options(synchronize_session=False)
+    )
+
+def counter_statement(organization_id: int, resource: str, **deltas: int):
+    """Adjust counters after the version was bumped, for writes that only
+    learn what changed from the row UPDATE itself (a todo flipping state)."""
+    return (
+        update(Organization)
+        .where(Organization.id == organization_id)
+        .values(_counter_values(resource, deltas))
+        .execution_options(synchronize_session=False)
+    )
+
+def bump_version(db: Session, organization_id: int, resource: str, **deltas: int) -> int:
+    """Bump the organization's change version for `resource` ("notes" or
+    "todos") inside the caller's transaction and return the new value.
+    Keyword arguments adjust the row counters in the same UPDATE, e.g.
+    bump_version(db, org_id, "todos", todos_open=-1, todos_done=1)."""
+    return db.scalar(version_bump_statement(organization_id, resource, **deltas))
+
+def version_statement(organization_id: int, resource: str):
+    return select(VERSION_COLUMNS[resource]).where(Organization.id == organization_id)
+
+def get_version(db: Session, organization_id: int, resource: str) -> int:
+    return db.scalar(version_statement(organization_id, resource)) or 0
+
+def version_and_total_statement(organization_id: int, resource: str):
+    return select(VERSION_COLUMNS[resource], TOTAL_COLUMNS[resource]).where(Organization.id == organization_id)
+
+def get_version_and_total(db: Session, organization_id: int, resource: str) -> Tuple[int, int]:
+    """The change version and the row count for `resource`, in one query."""
+    row = db.execute(version_and_total_statement(organization_id, resource)).first()
+    return (row[0], row[1]) if row else (0, 0)
+
+def todo_stats_statement(organization_id: int):
+    return (
+        select(Organization.todos_version, Organization.todos_open, Organization.todos_done)
+        .where(Organization.id == organization_id)
+    )
+
+def get_todo_stats(db: Session, organization_id: int):
+    return db.execute(todo_stats_statement(organization_id)).first()
+
+def count_statement(model, *conditions):
+    return (
+        select(func.count())
+        .select_from(model)
+        .where(model.organization_id == Organization.id, *conditions)
+        .scalar_subquery()
+    )
+
+def reconcile_stats(db: Session, organization_id: Optional[int] = None) -> List[dict]:
+    """Recount notes and todos per organization and fix counters that have
+    drifted. Returns the organizations that were changed, with the stored
+    and the recounted values."""
+    # Lock the rows first, in a statement of their own. In READ COMMITTED a
+    # statement that waits on a lock re-reads the locked row but keeps its
+    # old snapshot for everything else, so counting in the locking statement
+    # would compare new counters with stale counts. The counts below start
+    # after the locks are held and see every write committed before them.
+    locking = select(Organization.id).order_by(Organization.id).with_for_update()
+    if organization_id is not None:
+        locking = locking.where(Organization.id == organization_id)
+    db.execute(locking).all()
+
+    statement = select(
+        Organization.id,
+        Organization.notes_count,
+        Organization.todos_open,
+        Organization.todos_done,
+        count_statement(Note).label("actual_notes_count"),
+        count_statement(Todo, func.coalesce(Todo.completed, 0) == 0).label("actual_todos_open"),
+        count_statement(Todo, Todo.completed == 1).label("actual_todos_done"),
+    ).order_by(Organization.id)
+    if organization_id is not None:
+        statement = statement.where(Organization.id == organization_id)
+
+    drifted = []
+    for row in db.execute(statement):
+        stored = {name: getattr(row, name) for name in ("notes_count", "todos_open", "todos_done")}
+        actual = {name: getattr(row, f"actual_{name}") for name in stored}
+        if stored != actual:
+            drifted.append({"organization_id": row.id, "stored": stored, "actual": actual})
+    if drifted:
+        db.execute(update(Organization), [{"id": item["organization_id"], **item["actual"]} for item in drifted])
+    db.commit()
+    return drifted
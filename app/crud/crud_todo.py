@@ -1,41 +1,204 @@
+from typing import BinaryIO, Callable, Dict, Iterable, List, Optional, Sequence
+from sqlalchemy import Boolean, cast, delete, func, insert, select, update
 from sqlalchemy.orm import Session
 from ..models.models import Todo
-from ..schemas.schemas import TodoCreate, TodoUpdate
+from ..core.events import record_event
+from ..core.importer import ImportReport, column_lengths, insert_rows, run_import
+from ..core.pagination import apply_keyset, keyset_page, next_cursor_for
+from . import crud_changes, crud_organization
+from ..schemas.schemas import TodoCreate, TodoUpdate, TodoBulkUpdateItem
+
+# Columns of the Todo response schema, for read paths that skip the ORM
+TODO_COLUMNS = (
+    Todo.id, Todo.title, Todo.description, cast(Todo.completed, Boolean).label("completed"),
+    Todo.created_by, Todo.organization_id, Todo.created_at, Todo.updated_at
+)
+
+# List pages leave out the description unless asked for it (?fields=)
+TODO_FIELDS = tuple(column.key for column in TODO_COLUMNS)
+TODO_SUMMARY_FIELDS = tuple(name for name in TODO_FIELDS if name != "description")
+
+def todo_columns(fields: Optional[Sequence[str]] = None):
+    if fields is None:
+        return TODO_COLUMNS
+    return tuple(column for column in TODO_COLUMNS if column.key in fields)
 
 def get_todo(db: Session, todo_id: int):
     return db.query(Todo).filter(Todo.id == todo_id).first()
 
+def get_todo_row(db: Session, todo_id: int):
+    return db.execute(select(*TODO_COLUMNS).where(Todo.id == todo_id)).first()
+
 def get_todos_by_organization(db: Session, organization_id: int, skip: int = 0, limit: int = 100):
     return db.query(Todo).filter(Todo.organization_id == organization_id).offset(skip).limit(limit).all()
 
+def get_todos_page(db: Session, organization_id: int, limit: int = 100, cursor: Optional[str] = None, skip: int = 0):
+    query = db.query(Todo).filter(Todo.organization_id == organization_id)
+    return keyset_page(query, Todo, limit=limit, cursor=cursor, skip=skip)
+
+def get_todo_rows_page(
+    db: Session, organization_id: int, limit: int = 100, cursor: Optional[str] = None, skip: int = 0,
+    fields: Optional[Sequence[str]] = None,
+):
+    """Like get_todos_page but returns plain Core rows: no identity map, no
+    change tracking, nothing for pydantic to re-validate."""
+    statement = select(*todo_columns(fields)).where(Todo.organization_id == organization_id)
+    rows = db.execute(apply_keyset(statement, Todo, cursor=cursor, skip=skip).limit(limit)).all()
+    return rows, next_cursor_for(rows, limit)
+
+def completion_deltas(completed: int, count: int) -> Dict[str, int]:
+    """Counter changes for `count` todos flipping to `completed`."""
+    return {"todos_open": -count, "todos_done": count} if completed else {"todos_open": count, "todos_done": -count}
+
+def removal_deltas(completed: Optional[int]) -> Dict[str, int]:
+    return {"todos_done": -1} if completed == 1 else {"todos_open": -1}
+
 def create_todo(db: Session, todo: TodoCreate, user_id: int, organization_id: int):
+    change_seq = crud_organization.bump_version(db, organization_id, "todos", todos_open=1)
     db_todo = Todo(
         **todo.dict(),
         created_by=user_id,
-        organization_id=organization_id
+        organization_id=organization_id,
+        change_seq=change_seq
     )
     db.add(db_todo)
+    db.flush()
+    record_event(db, organization_id, "todos", "created", [db_todo.id], change_seq)
     db.commit()
     db.refresh(db_todo)
     return db_todo
 
-def update_todo(db: Session, todo_id: int, todo_update: TodoUpdate):
-    db_todo = db.query(Todo).filter(Todo.id == todo_id).first()
-    if db_todo:
-        update_data = todo_update.dict(exclude_unset=True)
+def update_todo(db: Session, todo_id: int, organization_id: int, todo_update: TodoUpdate):
+    """Update a todo of `organization_id` with a single UPDATE ... RETURNING.
+    Returns the updated row, or None if the todo is missing or belongs to
+    another organization."""
+    update_data = todo_update.dict(exclude_unset=True)
+    if 'completed' in update_data:
+        update_data['completed'] = 1 if update_data['completed'] else 0
+
+    condition = (Todo.id == todo_id) & (Todo.organization_id == organization_id)
+    if not update_data:
+        return db.execute(select(*TODO_COLUMNS).where(condition)).first()
+    # Bump first so the row is written once, change_seq included; a miss
+    # rolls the bump back
+    change_seq = crud_organization.bump_version(db, organization_id, "todos")
+    update_data['change_seq'] = change_seq
+    row = None
+    if 'completed' in update_data:
+        # Only a todo whose state actually flips moves the counters. The guard
+        # is checked under the row lock, so concurrent toggles can't double count.
+        flipped = condition & (func.coalesce(Todo.completed, 0) != update_data['completed'])
+        row = db.execute(update(Todo).where(flipped).values(update_data).returning(*TODO_COLUMNS)).first()
+        if row is not None:
+            db.execute(crud_organization.counter_statement(
+                organization_id, "todos", **completion_deltas(update_data['completed'], 1)
+            ))
+    if row is None:
+        row = db.execute(update(Todo).where(condition).values(update_data).returning(*TODO_COLUMNS)).first()
+    if row is None:
+        db.rollback()
+        return None
+    record_event(db, organization_id, "todos", "updated", [todo_id], change_seq)
+    db.commit()
+    return row
+
+def delete_todo(db: Session, todo_id: int, organization_id: int):
+    """Delete a todo of `organization_id` with a single DELETE ... RETURNING."""
+    deleted = db.execute(
+        delete(Todo).where(Todo.id == todo_id, Todo.organization_id == organization_id).returning(Todo.id, Todo.completed)
+    ).first()
+    if deleted is None:
+        db.rollback()
+        return False
+    change_seq = crud_organization.bump_version(db, organization_id, "todos", **removal_deltas(deleted.completed))
+    db.execute(crud_changes.tombstone_statement("todos", organization_id, [deleted.id], change_seq))
+    record_event(db, organization_id, "todos", "deleted", [deleted.id], change_seq)
+    db.commit()
+    return True
+
+def get_todo_changes(db: Session, organization_id: int, version: int, since: Optional[str] = None, limit: int = 500) -> dict:
+    return crud_changes.get_changes(db, Todo, TODO_COLUMNS, "todos", organization_id, version, since=since, limit=limit)
+
+def export_todos(db: Session, organization_id: int, batch_size: int = 1000):
+    """Stream every todo of the organization through a server-side cursor."""
+    statement = select(*TODO_COLUMNS).where(Todo.organization_id == organization_id).order_by(Todo.id)
+    return db.execute(statement.execution_options(yield_per=batch_size))
+
+def import_todos(
+    db: Session,
+    fileobj: BinaryIO,
+    format: str,
+    user_id: int,
+    organization_id: int,
+    batch_size: int = 1000,
+    on_progress: Optional[Callable[[ImportReport], None]] = None,
+) -> ImportReport:
+    """Load an NDJSON/CSV stream of TodoCreate rows, committing one batch at a time."""
+    def insert_batch(rows: List[dict]):
+        change_seq = crud_organization.bump_version(db, organization_id, "todos", todos_open=len(rows))
+        insert_rows(db, Todo.__table__, [
+            dict(row, created_by=user_id, organization_id=organization_id, completed=0, change_seq=change_seq)
+            for row in rows
+        ])
+        record_event(db, organization_id, "todos", "created", None, change_seq)
+        db.commit()
+
+    return run_import(
+        fileobj, format, TodoCreate, insert_batch,
+        batch_size=batch_size, on_progress=on_progress, max_lengths=column_lengths(Todo.__table__),
+    )
+
+def get_todo_organizations(db: Session, todo_ids: Iterable[int]) -> Dict[int, int]:
+    """Map each existing id in `todo_ids` to its organization in one query."""
+    rows = db.execute(select(Todo.id, Todo.organization_id).where(Todo.id.in_(set(todo_ids))))
+    return dict(rows.all())
+
+def create_todos(db: Session, todos: List[TodoCreate], user_id: int, organization_id: int) -> List[int]:
+    change_seq = crud_organization.bump_version(db, organization_id, "todos", todos_open=len(todos))
+    rows = [
+        dict(todo.dict(), created_by=user_id, organization_id=organization_id, change_seq=change_seq)
+        for todo in todos
+    ]
+    todo_ids = db.scalars(insert(Todo).returning(Todo.id, sort_by_parameter_order=True), rows).all()
+    record_event(db, organization_id, "todos", "created", todo_ids, change_seq)
+    db.commit()
+    return todo_ids
+
+def update_todos(db: Session, items: List[TodoBulkUpdateItem], organization_id: int):
+    rows = []
+    targets = {0: [], 1: []}
+    for item in items:
+        update_data = item.dict(exclude_unset=True)
         if 'completed' in update_data:
             update_data['completed'] = 1 if update_data['completed'] else 0
-        
-        for key, value in update_data.items():
-            setattr(db_todo, key, value)
+            targets[update_data.pop('completed')].append(item.id)
+        if len(update_data) > 1:
+            rows.append(update_data)
+    if not (rows or targets[0] or targets[1]):
         db.commit()
-        db.refresh(db_todo)
-    return db_todo
+        return
 
-def delete_todo(db: Session, todo_id: int):
-    db_todo = db.query(Todo).filter(Todo.id == todo_id).first()
-    if db_todo:
-        db.delete(db_todo)
-        db.commit()
-        return True
-    return False
\ No newline at end of file
+    # Bump first so each row is written with its change_seq in one go; a todo
+    # whose state already matched and that has nothing else to set is not
+    # written at all
+    change_seq = crud_organization.bump_version(db, organization_id, "todos")
+    # Set `completed` with one guarded UPDATE per target state so the row
+    # counts tell exactly how many todos flipped
+    deltas = {"todos_open": 0, "todos_done": 0}
+    for completed, todo_ids in targets.items():
+        if todo_ids:
+            flipped = db.execute(
+                update(Todo)
+                .where(Todo.id.in_(todo_ids), Todo.organization_id == organization_id, func.coalesce(Todo.completed, 0) != completed)
+                .values(completed=completed, change_seq=change_seq)
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            for name, delta in completion_deltas(completed, flipped).items():
+                deltas[name] += delta
+    if rows:
+        # ORM bulk UPDATE by primary key, sent as executemany
+        db.execute(update(Todo), [dict(row, change_seq=change_seq) for row in rows])
+    if any(deltas.values()):
+        db.execute(crud_organization.counter_statement(organization_id, "todos", **deltas))
+    record_event(db, organization_id, "todos", "updated", [item.id for item in items], change_seq)
+    db.commit()
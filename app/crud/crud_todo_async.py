@@ -0,0 +1,123 @@
+from typing import BinaryIO, Dict, Iterable, List, Optional, Sequence
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..models.models import Todo
+from ..core.events import record_event
+from ..core.importer import ImportReport, column_lengths, insert_rows_async, run_import_async
+from ..core.pagination import apply_keyset, next_cursor_for
+from .crud_changes import change_statements, is_caught_up, merge_changes, tombstone_statement
+from .crud_organization import counter_statement, version_bump_statement
+from . import crud_todo
+from .crud_todo import TODO_COLUMNS, todo_columns, completion_deltas, removal_deltas
+from ..schemas.schemas import TodoCreate, TodoUpdate, TodoBulkUpdateItem
+
+async def get_todo(db: AsyncSession, todo_id: int):
+    return await db.scalar(select(Todo).where(Todo.id == todo_id))
+
+async def get_todo_row(db: AsyncSession, todo_id: int):
+    return (await db.execute(select(*TODO_COLUMNS).where(Todo.id == todo_id))).first()
+
+async def get_todos_page(db: AsyncSession, organization_id: int, limit: int = 100, cursor: Optional[str] = None, skip: int = 0):
+    stmt = select(Todo).where(Todo.organization_id == organization_id)
+    stmt = apply_keyset(stmt, Todo, cursor=cursor, skip=skip).limit(limit)
+    todos = (await db.scalars(stmt)).all()
+    return todos, next_cursor_for(todos, limit)
+
+async def get_todo_rows_page(
+    db: AsyncSession, organization_id: int, limit: int = 100, cursor: Optional[str] = None, skip: int = 0,
+    fields: Optional[Sequence[str]] = None,
+):
+    statement = select(*todo_columns(fields)).where(Todo.organization_id == organization_id)
+    rows = (await db.execute(apply_keyset(statement, Todo, cursor=cursor, skip=skip).limit(limit))).all()
+    return rows, next_cursor_for(rows, limit)
+
+async def get_todo_changes(db: AsyncSession, organization_id: int, version: int, since: Optional[str] = None, limit: int = 500) -> dict:
+    if is_caught_up(version, since):
+        return merge_changes(version, since, [], [], limit)
+    rows, tombstones = change_statements(Todo, TODO_COLUMNS, "todos", organization_id, version, since, limit)
+    return merge_changes(version, since, (await db.execute(rows)).all(), (await db.execute(tombstones)).all(), limit)
+
+async def export_todos(db: AsyncSession, organization_id: int, batch_size: int = 1000):
+    statement = select(*TODO_COLUMNS).where(Todo.organization_id == organization_id).order_by(Todo.id)
+    return await db.stream(statement.execution_options(yield_per=batch_size))
+
+async def import_todos(
+    db: AsyncSession, fileobj: BinaryIO, format: str, user_id: int, organization_id: int, batch_size: int = 1000
+) -> ImportReport:
+    async def insert_batch(rows: List[dict]):
+        change_seq = await db.scalar(version_bump_statement(organization_id, "todos", todos_open=len(rows)))
+        await insert_rows_async(db, Todo.__table__, [
+            dict(row, created_by=user_id, organization_id=organization_id, completed=0, change_seq=change_seq) for row in rows
+        ])
+        record_event(db, organization_id, "todos", "created", None, change_seq)
+        await db.commit()
+
+    return await run_import_async(
+        fileobj, format, TodoCreate, insert_batch, batch_size=batch_size, max_lengths=column_lengths(Todo.__table__)
+    )
+
+async def create_todo(db: AsyncSession, todo: TodoCreate, user_id: int, organization_id: int):
+    change_seq = await db.scalar(version_bump_statement(organization_id, "todos", todos_open=1))
+    db_todo = Todo(
+        **todo.dict(),
+        created_by=user_id,
+        organization_id=organization_id,
+        change_seq=change_seq
+    )
+    db.add(db_todo)
+    await db.flush()
+    record_event(db, organization_id, "todos", "created", [db_todo.id], change_seq)
+    await db.commit()
+    await db.refresh(db_todo)
+    return db_todo
+
+async def update_todo(db: AsyncSession, todo_id: int, organization_id: int, todo_update: TodoUpdate):
+    values = todo_update.dict(exclude_unset=True)
+    if 'completed' in values:
+        values['completed'] = 1 if values['completed'] else 0
+    condition = (Todo.id == todo_id) & (Todo.organization_id == organization_id)
+    if not values:
+        return (await db.execute(select(*TODO_COLUMNS).where(condition))).first()
+    change_seq = await db.scalar(version_bump_statement(organization_id, "todos"))
+    values['change_seq'] = change_seq
+    row = None
+    if 'completed' in values:
+        # Only a todo whose state actually flips moves the counters
+        flipped = condition & (func.coalesce(Todo.completed, 0) != values['completed'])
+        row = (await db.execute(update(Todo).where(flipped).values(values).returning(*TODO_COLUMNS))).first()
+        if row is not None:
+            await db.execute(counter_statement(organization_id, "todos", **completion_deltas(values['completed'], 1)))
+    if row is None:
+        row = (await db.execute(update(Todo).where(condition).values(values).returning(*TODO_COLUMNS))).first()
+    if row is None:
+        await db.rollback()
+        return None
+    record_event(db, organization_id, "todos", "updated", [todo_id], change_seq)
+    await db.commit()
+    return row
+
+async def delete_todo(db: AsyncSession, todo_id: int, organization_id: int):
+    deleted = (await db.execute(
+        delete(Todo).where(Todo.id == todo_id, Todo.organization_id == organization_id).returning(Todo.id, Todo.completed)
+    )).first()
+    if deleted is None:
+        await db.rollback()
+        return False
+    change_seq = await db.scalar(version_bump_statement(organization_id, "todos", **removal_deltas(deleted.completed)))
+    await db.execute(tombstone_statement("todos", organization_id, [deleted.id], change_seq))
+    record_event(db, organization_id, "todos", "deleted", [deleted.id], change_seq)
+    await db.commit()
+    return True
+
+async def get_todo_organization(db: AsyncSession, todo_id: int) -> Optional[int]:
+    return await db.scalar(select(Todo.organization_id).where(Todo.id == todo_id))
+
+# The bulk writes reuse the sync statements on the session's sync facade
+async def get_todo_organizations(db: AsyncSession, todo_ids: Iterable[int]) -> Dict[int, int]:
+    return await db.run_sync(crud_todo.get_todo_organizations, todo_ids)
+
+async def create_todos(db: AsyncSession, todos: List[TodoCreate], user_id: int, organization_id: int) -> List[int]:
+    return await db.run_sync(crud_todo.create_todos, todos, user_id, organization_id)
+
+async def update_todos(db: AsyncSession, items: List[TodoBulkUpdateItem], organization_id: int):
+    await db.run_sync(crud_todo.update_todos, items, organization_id)
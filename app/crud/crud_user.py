@@ -1,7 +1,11 @@
+from typing import List
+from sqlalchemy import insert, or_, select, update
 from sqlalchemy.orm import Session
 from ..models.models import User, Organization
-from ..schemas.schemas import UserCreate, UserSignup
-from ..core.security import get_password_hash
+from ..schemas.schemas import UserCreate, UserSignup, UserUpdate
+from ..core.bulk import classify_new_users
+from ..core.security import get_password_hash, get_password_hashes
+from ..core.revocation import token_revocations
 
 def get_user(db: Session, user_id: int):
     return db.query(User).filter(User.id == user_id).first()
@@ -15,21 +19,82 @@ def get_user_by_username(db: Session, username: str):
 def get_users(db: Session, skip: int = 0, limit: int = 100):
     return db.query(User).offset(skip).limit(limit).all()
 
+def user_row(user: UserCreate, hashed_password: str) -> dict:
+    return {
+        "email": user.email,
+        "username": user.username,
+        "hashed_password": hashed_password,
+        "role": user.role,
+        "organization_id": user.organization_id,
+    }
+
+def taken_statement(users: List[UserCreate]):
+    """Usernames and emails of a batch that are already registered."""
+    return select(User.username, User.email).where(or_(
+        User.username.in_({user.username for user in users}),
+        User.email.in_({user.email for user in users}),
+    ))
+
 def create_user(db: Session, user: UserCreate):
     hashed_password = get_password_hash(user.password)
-    db_user = User(
-        email=user.email,
-        username=user.username,
-        hashed_password=hashed_password,
-        role=user.role,
-        organization_id=user.organization_id
-    )
+    db_user = User(**user_row(user, hashed_password))
     db.add(db_user)
     db.commit()
     db.refresh(db_user)
     return db_user
 
+def create_users(db: Session, users: List[UserCreate]) -> List[dict]:
+    """create_user for a batch, in one transaction: a single query checks
+    every username and email, and the passwords are hashed in parallel.
+    Returns a result per user, in order; taken names are skipped."""
+    taken = db.execute(taken_statement(users)).all()
+    results, accepted = classify_new_users(users, {row.username for row in taken}, {row.email for row in taken})
+    if accepted:
+        hashed_passwords = get_password_hashes([users[index].password for index in accepted])
+        rows = [user_row(users[index], hashed) for index, hashed in zip(accepted, hashed_passwords)]
+        user_ids = db.scalars(insert(User).returning(User.id, sort_by_parameter_order=True), rows).all()
+        db.commit()
+        for index, user_id in zip(accepted, user_ids):
+            results[index]["id"] = user_id
+    return results
+
+def update_user(db: Session, user_id: int, user_update: UserUpdate):
+    db_user = db.query(User).filter(User.id == user_id).first()
+    if db_user:
+        changes = user_update.dict(exclude_unset=True)
+        for key, value in changes.items():
+            setattr(db_user, key, value)
+        # Role and organization are baked into issued tokens, which are
+        # revoked by moving the user to a new token version
+        revoke = bool(changes.keys() & {"role", "organization_id"})
+        if revoke:
+            db_user.token_version = User.token_version + 1
+        db.commit()
+        db.refresh(db_user)
+        if revoke:
+            token_revocations.revoke_user(db_user.id, db_user.token_version)
+    return db_user
+
+def revoke_user_tokens(db: Session, user_id: int) -> int:
+    """Invalidate every access token issued to the user so far."""
+    token_version = db.execute(
+        update(User).where(User.id == user_id)
+        .values(token_version=User.token_version + 1)
+        .returning(User.token_version)
+    ).scalar_one()
+    db.commit()
+    token_revocations.revoke_user(user_id, token_version)
+    return token_version
+
+def update_password_hash(db: Session, user: User, hashed_password: str):
+    user.hashed_password = hashed_password
+    db.commit()
+    return user
+
 def create_user_with_organization(db: Session, user: UserSignup):
+    # Hash first so a busy hashing pool doesn't leave an orphaned organization
+    hashed_password = get_password_hash(user.password)
+
     # Check if organization already exists
     db_org = db.query(Organization).filter(Organization.name == user.organization_name).first()
     
@@ -41,7 +106,6 @@ def create_user_with_organization(db: Session, user: UserSignup):
         db.refresh(db_org)
     
     # Create user
-    hashed_password = get_password_hash(user.password)
     db_user = User(
         email=user.email,
         username=user.username,
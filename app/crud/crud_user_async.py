@@ -0,0 +1,67 @@
+from typing import List
+from sqlalchemy import insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..models.models import User, Organization
+from ..schemas.schemas import UserCreate, UserSignup
+from ..core.bulk import classify_new_users
+from ..core.security import get_password_hash_async, get_password_hashes_async
+from ..core.revocation import token_revocations
+from .crud_user import taken_statement, user_row
+
+async def get_user(db: AsyncSession, user_id: int):
+    return await db.scalar(select(User).where(User.id == user_id))
+
+async def get_user_by_email(db: AsyncSession, email: str):
+    return await db.scalar(select(User).where(User.email == email))
+
+async def get_user_by_username(db: AsyncSession, username: str):
+    return await db.scalar(select(User).where(User.username == username))
+
+async def update_password_hash(db: AsyncSession, user: User, hashed_password: str):
+    user.hashed_password = hashed_password
+    await db.commit()
+    return user
+
+async def revoke_user_tokens(db: AsyncSession, user_id: int) -> int:
+    token_version = (await db.execute(
+        update(User).where(User.id == user_id)
+        .values(token_version=User.token_version + 1)
+        .returning(User.token_version)
+    )).scalar_one()
+    await db.commit()
+    await token_revocations.revoke_user_async(user_id, token_version)
+    return token_version
+
+async def create_users(db: AsyncSession, users: List[UserCreate]) -> List[dict]:
+    taken = (await db.execute(taken_statement(users))).all()
+    results, accepted = classify_new_users(users, {row.username for row in taken}, {row.email for row in taken})
+    if accepted:
+        hashed_passwords = await get_password_hashes_async([users[index].password for index in accepted])
+        rows = [user_row(users[index], hashed) for index, hashed in zip(accepted, hashed_passwords)]
+        user_ids = (await db.scalars(insert(User).returning(User.id, sort_by_parameter_order=True), rows)).all()
+        await db.commit()
+        for index, user_id in zip(accepted, user_ids):
+            results[index]["id"] = user_id
+    return results
+
+async def create_user_with_organization(db: AsyncSession, user: UserSignup):
+    # Check if organization already exists
+    db_org = await db.scalar(select(Organization).where(Organization.name == user.organization_name))
+
+    if not db_org:
+        # Create new organization; flush to get its id without a separate commit
+        db_org = Organization(name=user.organization_name)
+        db.add(db_org)
+        await db.flush()
+
+    hashed_password = await get_password_hash_async(user.password)
+    db_user = User(
+        email=user.email,
+        username=user.username,
+        hashed_password=hashed_password,
+        organization_id=db_org.id
+    )
+    db.add(db_user)
+    await db.commit()
+    await db.refresh(db_user)
+    return db_user
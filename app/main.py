@@ -1,11 +1,31 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from .routers import auth, notes, todos
+from fastapi.responses import JSONResponse, PlainTextResponse
+from .core.config import settings
+from .core.events import broker
+from .core.metrics import MetricsMiddleware, metrics
+from .core.read_routing import ReadYourWritesMiddleware
+from .core.revocation import RevocationStoreUnavailable
+from .core.security import HashingPoolSaturated, shutdown_hashing_pool
+from .core import warmup
+from .routers import auth, notes, todos, auth_async, notes_async, todos_async, events, health, internal
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    broker.start()
+    # /health/ready stays 503 until the worker is warmed up
+    await warmup.start(app)
+    yield
+    warmup.stop()
+    broker.stop()
+    shutdown_hashing_pool()
 
 app = FastAPI(
     title="Notes & Todos API",
     description="A FastAPI application with JWT auth, RBAC, and organization-based data sharing",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
 )
 
 # CORS middleware
@@ -15,17 +35,50 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Total-Count", "ETag", "Server-Timing"],
 )
 
-# Include routers
-app.include_router(auth.router, prefix="/auth", tags=["auth"])
-app.include_router(notes.router, prefix="/notes", tags=["notes"])
-app.include_router(todos.router, prefix="/todos", tags=["todos"])
+# Pin a client's reads to the primary for a few seconds after it writes
+app.add_middleware(ReadYourWritesMiddleware)
+
+# Per-route latency/status/DB metrics and Server-Timing; outermost so it
+# also times CORS handling
+app.add_middleware(MetricsMiddleware)
+
+# Include routers; USE_ASYNC_DB switches between the sync and async database stacks
+if settings.use_async_db:
+    auth_router, notes_router, todos_router = auth_async.router, notes_async.router, todos_async.router
+else:
+    auth_router, notes_router, todos_router = auth.router, notes.router, todos.router
+
+app.include_router(auth_router, prefix="/auth", tags=["auth"])
+app.include_router(notes_router, prefix="/notes", tags=["notes"])
+app.include_router(todos_router, prefix="/todos", tags=["todos"])
+app.include_router(events.router, prefix="/events", tags=["events"])
+app.include_router(health.router, prefix="/health", tags=["health"])
+app.include_router(internal.router, prefix="/internal", tags=["internal"], include_in_schema=False)
+
+@app.exception_handler(HashingPoolSaturated)
+async def hashing_pool_saturated_handler(request: Request, exc: HashingPoolSaturated):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Too many concurrent sign-ins, please retry"},
+        headers={"Retry-After": "1"},
+    )
+
+@app.exception_handler(RevocationStoreUnavailable)
+async def revocation_store_unavailable_handler(request: Request, exc: RevocationStoreUnavailable):
+    # Neither a logout nor a token check may silently succeed without the store
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Token revocation is unavailable, please retry"},
+        headers={"Retry-After": "1"},
+    )
+
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
 
 @app.get("/")
 async def root():
-    return {"message": "Welcome to Notes & Todos API"}
-
-@app.get("/health")
-async def health_check():
-    return {"status": "healthy"}
\ No newline at end of file
+    return {"message": "Welcome to Notes & Todos API"}
\ No newline at end of file
@@ -1,9 +1,17 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey, Enum
+from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey, Enum, Index, DDL, event
+from sqlalchemy.dialects import sqlite
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 import enum
 from app.core.database import Base
 
+# SQLite's CURRENT_TIMESTAMP has second resolution; bind parameters are rendered
+# the same way so keyset comparisons on created_at line up with stored values.
+Timestamp = DateTime(timezone=True).with_variant(
+    sqlite.DATETIME(storage_format="%(year)04d-%(month)02d-%(day)02d %(hour)02d:%(minute)02d:%(second)02d"),
+    "sqlite",
+)
+
 class UserRole(enum.Enum):
     ADMIN = "admin"
     MEMBER = "member"
@@ -15,6 +23,15 @@ class Organization(Base):
     name = Column(String(100), nullable=False)
     description = Column(Text, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Bumped in the same transaction as every write to the organization's
+    # notes/todos; list ETags are derived from them.
+    notes_version = Column(Integer, nullable=False, default=0, server_default="0")
+    todos_version = Column(Integer, nullable=False, default=0, server_default="0")
+    # Row counters, adjusted by the same UPDATE that bumps the versions;
+    # `python manage.py reconcile-stats` rebuilds them from the tables.
+    notes_count = Column(Integer, nullable=False, default=0, server_default="0")
+    todos_open = Column(Integer, nullable=False, default=0, server_default="0")
+    todos_done = Column(Integer, nullable=False, default=0, server_default="0")
     
     users = relationship("User", back_populates="organization")
     notes = relationship("Note", back_populates="organization")
@@ -29,6 +46,8 @@ class User(Base):
     hashed_password = Column(String(100), nullable=False)
     role = Column(Enum(UserRole), default=UserRole.MEMBER)
     organization_id = Column(Integer, ForeignKey("organizations.id"), nullable=False)
+    # Carried in access tokens; bumping it revokes every token issued before
+    token_version = Column(Integer, nullable=False, default=0, server_default="0")
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
     organization = relationship("Organization", back_populates="users")
@@ -41,12 +60,48 @@ class Note(Base):
     content = Column(Text, nullable=False)
     created_by = Column(Integer, ForeignKey("users.id"), nullable=False)
     organization_id = Column(Integer, ForeignKey("organizations.id"), nullable=False)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    created_at = Column(Timestamp, server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    # The organization's notes_version after the last write to this row,
+    # for the change feed (GET /notes/changes)
+    change_seq = Column(Integer, nullable=False, default=0, server_default="0")
     
     organization = relationship("Organization", back_populates="notes")
     creator = relationship("User")
 
+    __table_args__ = (
+        Index("ix_notes_org_created_id", "organization_id", "created_at", "id"),
+        Index("ix_notes_org_change_seq_id", "organization_id", "change_seq", "id"),
+    )
+
+# Full-text search over notes. Postgres maintains a generated tsvector column
+# with a GIN index; SQLite keeps an external-content FTS5 table in sync with
+# triggers. Neither is mapped on Note, see crud_note.search_notes.
+NOTES_SEARCH_DDL = {
+    "postgresql": [
+        "ALTER TABLE notes ADD COLUMN search_vector tsvector GENERATED ALWAYS AS ("
+        "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+        "setweight(to_tsvector('english', coalesce(content, '')), 'B')) STORED",
+        "CREATE INDEX ix_notes_search_vector ON notes USING GIN (search_vector)",
+    ],
+    "sqlite": [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS notes_fts USING fts5("
+        "title, content, content='notes', content_rowid='id')",
+        "CREATE TRIGGER notes_fts_ai AFTER INSERT ON notes BEGIN "
+        "INSERT INTO notes_fts(rowid, title, content) VALUES (new.id, new.title, new.content); END",
+        "CREATE TRIGGER notes_fts_ad AFTER DELETE ON notes BEGIN "
+        "INSERT INTO notes_fts(notes_fts, rowid, title, content) VALUES ('delete', old.id, old.title, old.content); END",
+        "CREATE TRIGGER notes_fts_au AFTER UPDATE OF title, content ON notes BEGIN "
+        "INSERT INTO notes_fts(notes_fts, rowid, title, content) VALUES ('delete', old.id, old.title, old.content); "
+        "INSERT INTO notes_fts(rowid, title, content) VALUES (new.id, new.title, new.content); END",
+    ],
+}
+
+for dialect, statements in NOTES_SEARCH_DDL.items():
+    for statement in statements:
+        event.listen(Note.__table__, "after_create", DDL(statement).execute_if(dialect=dialect))
+event.listen(Note.__table__, "after_drop", DDL("DROP TABLE IF EXISTS notes_fts").execute_if(dialect="sqlite"))
+
 class Todo(Base):
     __tablename__ = "todos"
     
@@ -56,8 +111,31 @@ class Todo(Base):
     completed = Column(Integer, default=0)  # 0 = false, 1 = true
     created_by = Column(Integer, ForeignKey("users.id"), nullable=False)
     organization_id = Column(Integer, ForeignKey("organizations.id"), nullable=False)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    created_at = Column(Timestamp, server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    # The organization's todos_version after the last write to this row,
+    # for the change feed (GET /todos/changes)
+    change_seq = Column(Integer, nullable=False, default=0, server_default="0")
     
     organization = relationship("Organization", back_populates="todos")
-    creator = relationship("User")
\ No newline at end of file
+    creator = relationship("User")
+
+    __table_args__ = (
+        Index("ix_todos_org_created_id", "organization_id", "created_at", "id"),
+        Index("ix_todos_org_change_seq_id", "organization_id", "change_seq", "id"),
+    )
+
+class Tombstone(Base):
+    """A deleted note or todo, so the change feeds can report deletes."""
+    __tablename__ = "tombstones"
+
+    id = Column(Integer, primary_key=True)
+    organization_id = Column(Integer, ForeignKey("organizations.id"), nullable=False)
+    resource = Column(String(20), nullable=False)  # "notes" or "todos"
+    record_id = Column(Integer, nullable=False)
+    change_seq = Column(Integer, nullable=False)
+    deleted_at = Column(Timestamp, server_default=func.now())
+
+    __table_args__ = (
+        Index("ix_tombstones_org_resource_seq", "organization_id", "resource", "change_seq", "record_id"),
+    )
@@ -1,13 +1,18 @@
 from datetime import timedelta
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
 from fastapi.security import OAuth2PasswordRequestForm
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from ..core.database import get_db
-from ..core.security import verify_password, create_access_token
+from ..core.security import verify_and_update_password, create_access_token
 from ..core.config import settings
-from ..schemas.schemas import Token, UserSignup, User
+from ..models.models import UserRole
+from ..schemas.schemas import BulkResult, Token, UserBulkCreate, UserCreate, UserSignup, User
 from ..crud import crud_user
-from ..core.deps import get_current_active_user
+from ..core.deps import credentials_exception, get_current_active_user
+from ..core.etag import etag_matches, make_etag, not_modified, set_etag
+from ..core.principal import Principal, token_claims
+from ..core.revocation import token_revocations
 
 router = APIRouter()
 
@@ -31,18 +36,66 @@ def signup(user: UserSignup, db: Session = Depends(get_db)):
 @router.post("/login", response_model=Token)
 def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
     user = crud_user.get_user_by_username(db, username=form_data.username)
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    verified, new_hash = verify_and_update_password(form_data.password, user.hashed_password) if user else (False, None)
+    if not verified:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    if new_hash:
+        # Stored hash predates the current bcrypt settings
+        crud_user.update_password_hash(db, user=user, hashed_password=new_hash)
     access_token_expires = timedelta(minutes=settings.access_token_expire_minutes)
     access_token = create_access_token(
-        data={"sub": user.username}, expires_delta=access_token_expires
+        data=token_claims(user), expires_delta=access_token_expires
     )
     return {"access_token": access_token, "token_type": "bearer"}
 
+@router.post("/logout")
+def logout(current_user: Principal = Depends(get_current_active_user)):
+    """Revoke the token this request was made with."""
+    token_revocations.revoke_token(current_user.jti, current_user.expires_at)
+    return {"message": "Logged out"}
+
+@router.post("/logout-all")
+def logout_everywhere(current_user: Principal = Depends(get_current_active_user), db: Session = Depends(get_db)):
+    """Revoke every token issued to the user, on all devices."""
+    crud_user.revoke_user_tokens(db, user_id=current_user.id)
+    return {"message": "Logged out everywhere"}
+
+@router.post("/users/bulk", response_model=BulkResult)
+def create_users_bulk(
+    payload: UserBulkCreate,
+    current_user: Principal = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Provision users into the admin's organization in one transaction.
+    Taken usernames and emails are reported per item, not as an error."""
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(status_code=403, detail="Only admin can provision users")
+    users = [UserCreate(**item.dict(), organization_id=current_user.organization_id) for item in payload.items]
+    try:
+        results = crud_user.create_users(db, users)
+    except IntegrityError:
+        # Someone registered one of the names since the batch was checked
+        db.rollback()
+        raise HTTPException(status_code=409, detail="A username or email was registered concurrently; retry the batch")
+    return {"results": results}
+
 @router.get("/me", response_model=User)
-def get_current_user_info(current_user: User = Depends(get_current_active_user)):
-    return current_user
\ No newline at end of file
+def get_current_user_info(
+    request: Request,
+    response: Response,
+    current_user: Principal = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    user = crud_user.get_user(db, user_id=current_user.id)
+    if user is None:
+        # Deleted since the token was issued
+        raise credentials_exception()
+    etag = make_etag("me", user.id, user.username, user.email, user.role, user.organization_id, user.created_at)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    set_etag(response, etag)
+    return user
\ No newline at end of file
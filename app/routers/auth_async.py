@@ -0,0 +1,98 @@
+from datetime import timedelta
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from fastapi.security import OAuth2PasswordRequestForm
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..core.database import get_async_db
+from ..core.security import verify_and_update_password_async, create_access_token
+from ..core.config import settings
+from ..models.models import UserRole
+from ..schemas.schemas import BulkResult, Token, UserBulkCreate, UserCreate, UserSignup, User
+from ..crud import crud_user_async
+from ..core.deps import credentials_exception, get_current_active_user_async
+from ..core.etag import etag_matches, make_etag, not_modified, set_etag
+from ..core.principal import Principal, token_claims
+from ..core.revocation import token_revocations
+
+router = APIRouter()
+
+@router.post("/signup", response_model=User)
+async def signup(user: UserSignup, db: AsyncSession = Depends(get_async_db)):
+    db_user = await crud_user_async.get_user_by_email(db, email=user.email)
+    if db_user:
+        raise HTTPException(
+            status_code=400,
+            detail="Email already registered"
+        )
+    db_user = await crud_user_async.get_user_by_username(db, username=user.username)
+    if db_user:
+        raise HTTPException(
+            status_code=400,
+            detail="Username already registered"
+        )
+    
+    return await crud_user_async.create_user_with_organization(db=db, user=user)
+
+@router.post("/login", response_model=Token)
+async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_async_db)):
+    user = await crud_user_async.get_user_by_username(db, username=form_data.username)
+    verified, new_hash = await verify_and_update_password_async(form_data.password, user.hashed_password) if user else (False, None)
+    if not verified:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Incorrect username or password",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    if new_hash:
+        # Stored hash predates the current bcrypt settings
+        await crud_user_async.update_password_hash(db, user=user, hashed_password=new_hash)
+    access_token_expires = timedelta(minutes=settings.access_token_expire_minutes)
+    access_token = create_access_token(
+        data=token_claims(user), expires_delta=access_token_expires
+    )
+    return {"access_token": access_token, "token_type": "bearer"}
+
+@router.post("/logout")
+async def logout(current_user: Principal = Depends(get_current_active_user_async)):
+    """Revoke the token this request was made with."""
+    await token_revocations.revoke_token_async(current_user.jti, current_user.expires_at)
+    return {"message": "Logged out"}
+
+@router.post("/logout-all")
+async def logout_everywhere(current_user: Principal = Depends(get_current_active_user_async), db: AsyncSession = Depends(get_async_db)):
+    """Revoke every token issued to the user, on all devices."""
+    await crud_user_async.revoke_user_tokens(db, user_id=current_user.id)
+    return {"message": "Logged out everywhere"}
+
+@router.post("/users/bulk", response_model=BulkResult)
+async def create_users_bulk(
+    payload: UserBulkCreate,
+    current_user: Principal = Depends(get_current_active_user_async),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Provision users into the admin's organization in one transaction."""
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(status_code=403, detail="Only admin can provision users")
+    users = [UserCreate(**item.dict(), organization_id=current_user.organization_id) for item in payload.items]
+    try:
+        results = await crud_user_async.create_users(db, users)
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(status_code=409, detail="A username or email was registered concurrently; retry the batch")
+    return {"results": results}
+
+@router.get("/me", response_model=User)
+async def get_current_user_info(
+    request: Request,
+    response: Response,
+    current_user: Principal = Depends(get_current_active_user_async),
+    db: AsyncSession = Depends(get_async_db)
+):
+    user = await crud_user_async.get_user(db, user_id=current_user.id)
+    if user is None:
+        raise credentials_exception()
+    etag = make_etag("me", user.id, user.username, user.email, user.role, user.organization_id, user.created_at)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    set_etag(response, etag)
+    return user
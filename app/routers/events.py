@@ -0,0 +1,137 @@
+import asyncio
+import time
+from typing import AsyncIterator, Optional
+
+import orjson
+from fastapi import APIRouter, Depends, HTTPException, Query, WebSocket, WebSocketDisconnect, status
+from fastapi.responses import StreamingResponse
+from fastapi.security import OAuth2PasswordBearer
+
+from ..core.config import settings
+from ..core.deps import get_current_user, get_current_user_async
+from ..core.events import RESYNC, Subscription, broker
+from ..core.principal import Principal
+from ..core.revocation import RevocationStoreUnavailable, token_revocations
+
+router = APIRouter()
+
+# EventSource and browser WebSockets can't send an Authorization header, so
+# the token may also come as ?access_token=
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login", auto_error=False)
+
+
+def get_stream_user(
+    header_token: Optional[str] = Depends(optional_oauth2_scheme),
+    access_token: Optional[str] = Query(None),
+) -> Principal:
+    token = header_token or access_token
+    if not token:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return get_current_user(token)
+
+
+async def still_authorized(principal: Principal) -> bool:
+    # Checked on every heartbeat, so long-lived streams end with the token.
+    # A revocation store that can't answer ends the stream too.
+    if principal.expires_at <= time.time():
+        return False
+    try:
+        return not await token_revocations.is_revoked_async(principal)
+    except RevocationStoreUnavailable:
+        return False
+
+
+def format_sse(message: dict) -> bytes:
+    if message is RESYNC:
+        return b"event: resync\ndata: {}\n\n"
+    return b"id: %d\nevent: %s\ndata: %s\n\n" % (
+        message["change_seq"], message["resource"].encode(), orjson.dumps(message),
+    )
+
+
+async def next_message(subscription: Subscription) -> Optional[dict]:
+    """The next event, or None when a heartbeat is due."""
+    try:
+        return await asyncio.wait_for(subscription.get(), timeout=settings.events_heartbeat_seconds)
+    except asyncio.TimeoutError:
+        return None
+
+
+async def sse_stream(subscription: Subscription, principal: Principal) -> AsyncIterator[bytes]:
+    # StreamingResponse cancels this generator when the client disconnects
+    try:
+        # Tell proxies and the client the stream is open before the first event
+        yield b"retry: 5000\n\n"
+        while True:
+            message = await next_message(subscription)
+            if message is None:
+                if not await still_authorized(principal):
+                    return
+                yield b": ping\n\n"
+                continue
+            yield format_sse(message)
+            if message is RESYNC:
+                return
+    finally:
+        subscription.close()
+
+
+@router.get("")
+async def stream_events(current_user: Principal = Depends(get_stream_user)):
+    """Server-sent events for every note/todo write in the caller's
+    organization. Events carry ids and the change_seq; fetch the rows through
+    /notes/changes or /todos/changes. A `resync` event means events were
+    dropped: catch up through the change feeds and reconnect."""
+    subscription = broker.subscribe(current_user.organization_id)
+    return StreamingResponse(
+        sse_stream(subscription, current_user),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.websocket("/ws")
+async def websocket_events(websocket: WebSocket, access_token: Optional[str] = Query(None)):
+    """The same events over a WebSocket, as JSON text frames."""
+    try:
+        current_user = await get_current_user_async(access_token or "")
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    except RevocationStoreUnavailable:
+        await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER)
+        return
+    await websocket.accept()
+    subscription = broker.subscribe(current_user.organization_id)
+    # Clients don't send anything; reading is only to notice them leave
+    disconnected = asyncio.ensure_future(websocket.receive())
+    try:
+        while True:
+            getter = asyncio.ensure_future(next_message(subscription))
+            await asyncio.wait({getter, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+            if disconnected.done():
+                if disconnected.result()["type"] == "websocket.disconnect":
+                    getter.cancel()
+                    return
+                disconnected = asyncio.ensure_future(websocket.receive())
+            if not getter.done():
+                await getter
+            message = getter.result()
+            if message is None:
+                if not await still_authorized(current_user):
+                    await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+                    return
+                continue
+            await websocket.send_text(orjson.dumps(message).decode())
+            if message is RESYNC:
+                await websocket.close()
+                return
+    except WebSocketDisconnect:
+        pass
+    finally:
+        disconnected.cancel()
+        subscription.close()
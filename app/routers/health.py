@@ -0,0 +1,33 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from ..core.metrics import metrics
+from ..core.warmup import check_database, readiness
+
+router = APIRouter()
+
+@router.get("")
+async def health_check():
+    """Kept for existing checks; the same as /health/live."""
+    return {"status": "healthy"}
+
+@router.get("/live")
+async def liveness():
+    """The process is up and its event loop answers. Never touches the
+    database, so a database outage doesn't get workers restarted."""
+    return {"status": "alive"}
+
+@router.get("/ready")
+async def readiness_check():
+    """Whether this worker should get traffic: warmed up, not shutting down,
+    and the database answers."""
+    if not readiness.ready:
+        return JSONResponse(status_code=503, content={"status": "starting"})
+    error = await check_database()
+    if error:
+        return JSONResponse(status_code=503, content={"status": "unavailable", "database": error})
+    first_request = metrics.first_request
+    return {
+        "status": "ready",
+        "startup_ms": readiness.startup_ms,
+        "first_request_ms": round(first_request[2] * 1000, 2) if first_request else None,
+    }
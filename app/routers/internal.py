@@ -0,0 +1,25 @@
+import os
+from fastapi import APIRouter, Depends
+from ..core.database import async_engine, async_read_engines, engine, read_engines
+from ..core.deps import require_internal_token
+from ..core.events import broker
+from ..core.pool_stats import pool_stats
+from ..core.response_cache import response_cache
+
+router = APIRouter(dependencies=[Depends(require_internal_token)])
+
+@router.get("/db-pool")
+def db_pool_stats():
+    # Stats are per worker process; the pid tells workers apart
+    pools = {"sync": engine.pool, "async": async_engine.pool}
+    pools.update((f"read{index}", read_engine.pool) for index, read_engine in enumerate(read_engines))
+    pools.update((f"async_read{index}", read_engine.pool) for index, read_engine in enumerate(async_read_engines))
+    return {"pid": os.getpid(), **{name: pool_stats[name].snapshot(pool) for name, pool in pools.items()}}
+
+@router.get("/response-cache")
+def response_cache_stats():
+    return {"pid": os.getpid(), **response_cache.stats()}
+
+@router.get("/events")
+def events_stats():
+    return {"pid": os.getpid(), "backend": type(broker.backend).__name__, "connections": broker.connections()}
@@ -1,77 +1,232 @@
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status
+from typing import List, Literal, Optional
+from fastapi import APIRouter, Depends, File, HTTPException, Query, Request, Response, UploadFile, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from ..core.database import get_db
+from ..core.config import settings
+from ..core.database import get_db, get_read_db
+from ..core.bulk import classify_by_organization
 from ..core.deps import get_current_active_user
-from ..models.models import User, UserRole
-from ..schemas.schemas import Note, NoteCreate, NoteUpdate
-from ..crud import crud_note
+from ..core.export import EXPORT_MEDIA_TYPES, stream_rows
+from ..core.importer import import_format_for
+from ..core.etag import etag_matches, make_etag, not_modified, set_etag
+from ..core.fieldsets import InvalidFields, resolve_fields
+from ..core.pagination import InvalidCursor
+from ..core.principal import Principal
+from ..core.response_cache import response_cache
+from ..core.serialization import json_response, row_response, rows_response
+from ..models.models import UserRole
+from ..schemas.schemas import Note, NoteListItem, NoteChanges, NoteCreate, NoteUpdate, NoteBulkCreate, NoteSearchHit, BulkDelete, BulkResult, ImportResult
+from ..crud import crud_note, crud_organization
 
 router = APIRouter()
 
-@router.get("/", response_model=List[Note])
+@router.get("/", response_model=List[NoteListItem])
 def read_notes(
+    request: Request,
     skip: int = 0,
     limit: int = 100,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    current_user: Principal = Depends(get_current_active_user),
+    db: Session = Depends(get_read_db)
 ):
-    notes = crud_note.get_notes_by_organization(db, organization_id=current_user.organization_id, skip=skip, limit=limit)
-    return notes
+    # Sparse fieldsets: the content is only loaded for ?fields=all or when listed
+    try:
+        selected = resolve_fields(fields, crud_note.NOTE_FIELDS, crud_note.NOTE_SUMMARY_FIELDS)
+    except InvalidFields as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+    # Answer polls from the organization's change version before loading anything
+    version, total = crud_organization.get_version_and_total(db, current_user.organization_id, "notes")
+    etag = make_etag("notes", current_user.organization_id, version, skip, limit, cursor, ",".join(selected))
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
+    # The page is shared by every member of the organization until the next write
+    cache_key = response_cache.key(current_user.organization_id, "notes", version, skip, limit, cursor, ",".join(selected))
+    response = response_cache.get(cache_key)
+    if response is not None:
+        return response
+
+    # `cursor` switches to keyset pagination; `skip` is kept for existing clients.
+    try:
+        rows, next_cursor = crud_note.get_note_rows_page(
+            db, organization_id=current_user.organization_id, limit=limit, cursor=cursor, skip=skip, fields=selected
+        )
+    except InvalidCursor:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    response = rows_response(rows)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    response.headers["X-Total-Count"] = str(total)
+    set_etag(response, etag)
+    response_cache.set(cache_key, response)
+    return response
 
 @router.post("/", response_model=Note)
 def create_note(
     note: NoteCreate,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
     return crud_note.create_note(db=db, note=note, user_id=current_user.id, organization_id=current_user.organization_id)
 
+@router.post("/bulk", response_model=BulkResult)
+def create_notes_bulk(
+    payload: NoteBulkCreate,
+    current_user: Principal = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    note_ids = crud_note.create_notes(db=db, notes=payload.items, user_id=current_user.id, organization_id=current_user.organization_id)
+    return {"results": [{"index": index, "id": note_id, "status": "created"} for index, note_id in enumerate(note_ids)]}
+
+@router.delete("/bulk", response_model=BulkResult)
+def delete_notes_bulk(
+    payload: BulkDelete,
+    current_user: Principal = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    # Only ADMIN can delete notes
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(status_code=403, detail="Only admin can delete notes")
+
+    organizations = crud_note.get_note_organizations(db, payload.ids)
+    results, allowed = classify_by_organization(payload.ids, organizations, current_user.organization_id, "deleted")
+    if allowed:
+        crud_note.delete_notes(db=db, note_ids=allowed, organization_id=current_user.organization_id)
+    return {"results": results}
+
+@router.get("/search", response_model=List[NoteSearchHit])
+def search_notes(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=100),
+    current_user: Principal = Depends(get_current_active_user),
+    db: Session = Depends(get_read_db)
+):
+    return crud_note.search_notes(db, organization_id=current_user.organization_id, q=q, limit=limit)
+
+@router.get("/export")
+def export_notes(
+    format: Literal["ndjson", "csv"] = "ndjson",
+    current_user: Principal = Depends(get_current_active_user),
+    db: Session = Depends(get_read_db)
+):
+    # The session stays open until the response has been sent, so the result
+    # can keep reading from its server-side cursor while the client downloads.
+    result = crud_note.export_notes(db, organization_id=current_user.organization_id, batch_size=settings.export_batch_size)
+    return StreamingResponse(
+        stream_rows(result, format),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="notes.{format}"'},
+    )
+
+@router.post("/import", response_model=ImportResult)
+def import_notes(
+    file: UploadFile = File(...),
+    format: Optional[Literal["ndjson", "csv"]] = None,
+    current_user: Principal = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    # The upload is spooled to disk by the multipart parser and read back in chunks
+    report = crud_note.import_notes(
+        db,
+        fileobj=file.file,
+        format=format or import_format_for(file.filename),
+        user_id=current_user.id,
+        organization_id=current_user.organization_id,
+        batch_size=settings.import_batch_size,
+    )
+    return report.as_dict()
+
+@router.get("/changes", response_model=NoteChanges)
+def read_note_changes(
+    request: Request,
+    since: Optional[str] = None,
+    limit: int = Query(500, ge=1, le=1000),
+    current_user: Principal = Depends(get_current_active_user),
+    db: Session = Depends(get_read_db)
+):
+    """Notes created, updated or deleted after the `since` cursor (all notes
+    on the first sync). Pass the returned `cursor` back as `since`; keep
+    going while `has_more` is true."""
+    version = crud_organization.get_version(db, current_user.organization_id, "notes")
+    etag = make_etag("notes-changes", current_user.organization_id, version, since, limit)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
+    cache_key = response_cache.key(current_user.organization_id, "notes-changes", version, since, limit)
+    response = response_cache.get(cache_key)
+    if response is not None:
+        return response
+
+    try:
+        changes = crud_note.get_note_changes(
+            db, organization_id=current_user.organization_id, version=version, since=since, limit=limit
+        )
+    except InvalidCursor:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    response = json_response(changes)
+    set_etag(response, etag)
+    response_cache.set(cache_key, response)
+    return response
+
 @router.get("/{note_id}", response_model=Note)
 def read_note(
     note_id: int,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    request: Request,
+    current_user: Principal = Depends(get_current_active_user),
+    db: Session = Depends(get_read_db)
 ):
-    db_note = crud_note.get_note(db, note_id=note_id)
-    if not db_note:
-        raise HTTPException(status_code=404, detail="Note not found")
-    if db_note.organization_id != current_user.organization_id:
-        raise HTTPException(status_code=403, detail="Not enough permissions")
-    return db_note
+    version = crud_organization.get_version(db, current_user.organization_id, "notes")
+    cache_key = response_cache.key(current_user.organization_id, "note", version, note_id)
+    response = response_cache.get(cache_key)
+    if response is None:
+        row = crud_note.get_note_row(db, note_id=note_id)
+        if row is None:
+            raise HTTPException(status_code=404, detail="Note not found")
+        if row.organization_id != current_user.organization_id:
+            raise HTTPException(status_code=403, detail="Not enough permissions")
+        response = row_response(row)
+        set_etag(response, make_etag("note", *row))
+        response_cache.set(cache_key, response)
+    if etag_matches(request, response.headers["ETag"]):
+        return not_modified(response.headers["ETag"])
+    return response
 
 @router.put("/{note_id}", response_model=Note)
 def update_note(
     note_id: int,
     note: NoteUpdate,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
-    db_note = crud_note.get_note(db, note_id=note_id)
-    if not db_note:
-        raise HTTPException(status_code=404, detail="Note not found")
-    if db_note.organization_id != current_user.organization_id:
-        raise HTTPException(status_code=403, detail="Not enough permissions")
-    
-    return crud_note.update_note(db=db, note_id=note_id, note_update=note)
+    # The organization check is part of the UPDATE; the note is only looked
+    # up again to tell "missing" from "forbidden" when nothing matched.
+    row = crud_note.update_note(db=db, note_id=note_id, organization_id=current_user.organization_id, note_update=note)
+    if row is None:
+        raise note_access_error(db, note_id, current_user.organization_id) or HTTPException(status_code=404, detail="Note not found")
+    return row._asdict()
 
 @router.delete("/{note_id}")
 def delete_note(
     note_id: int,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
-    db_note = crud_note.get_note(db, note_id=note_id)
-    if not db_note:
-        raise HTTPException(status_code=404, detail="Note not found")
-    if db_note.organization_id != current_user.organization_id:
-        raise HTTPException(status_code=403, detail="Not enough permissions")
-    
-    # Only ADMIN can delete notes
-    if current_user.role != UserRole.ADMIN:
-        raise HTTPException(status_code=403, detail="Only admin can delete notes")
-    
-    success = crud_note.delete_note(db=db, note_id=note_id)
-    if not success:
-        raise HTTPException(status_code=404, detail="Note not found")
-    return {"message": "Note deleted successfully"}
\ No newline at end of file
+    # Only ADMIN can delete notes. The role comes from the principal, so
+    # members never reach the DELETE.
+    if current_user.role == UserRole.ADMIN:
+        if crud_note.delete_note(db=db, note_id=note_id, organization_id=current_user.organization_id):
+            return {"message": "Note deleted successfully"}
+        raise note_access_error(db, note_id, current_user.organization_id) or HTTPException(status_code=404, detail="Note not found")
+    raise note_access_error(db, note_id, current_user.organization_id) or HTTPException(status_code=403, detail="Only admin can delete notes")
+
+def note_access_error(db: Session, note_id: int, organization_id: int) -> Optional[HTTPException]:
+    """Failure path of the single-statement writes: 404 if the note doesn't
+    exist, 403 if it belongs to another organization."""
+    owner = crud_note.get_note_organizations(db, [note_id]).get(note_id)
+    if owner is None:
+        return HTTPException(status_code=404, detail="Note not found")
+    if owner != organization_id:
+        return HTTPException(status_code=403, detail="Not enough permissions")
+    return None
@@ -1,77 +1,235 @@
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status
+from typing import List, Literal, Optional
+from fastapi import APIRouter, Depends, File, HTTPException, Query, Request, Response, UploadFile, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from ..core.database import get_db
+from ..core.config import settings
+from ..core.database import get_db, get_read_db
+from ..core.bulk import classify_by_organization
 from ..core.deps import get_current_active_user
-from ..models.models import User, UserRole
-from ..schemas.schemas import Todo, TodoCreate, TodoUpdate
-from ..crud import crud_todo
+from ..core.export import EXPORT_MEDIA_TYPES, stream_rows
+from ..core.importer import import_format_for
+from ..core.etag import etag_matches, make_etag, not_modified, set_etag
+from ..core.fieldsets import InvalidFields, resolve_fields
+from ..core.pagination import InvalidCursor
+from ..core.principal import Principal
+from ..core.response_cache import response_cache
+from ..core.serialization import json_response, row_response, rows_response
+from ..models.models import UserRole
+from ..schemas.schemas import Todo, TodoListItem, TodoChanges, TodoCreate, TodoUpdate, TodoBulkCreate, TodoBulkUpdate, TodoStats, BulkResult, ImportResult
+from ..crud import crud_todo, crud_organization
 
 router = APIRouter()
 
-@router.get("/", response_model=List[Todo])
+@router.get("/", response_model=List[TodoListItem])
 def read_todos(
+    request: Request,
     skip: int = 0,
     limit: int = 100,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    current_user: Principal = Depends(get_current_active_user),
+    db: Session = Depends(get_read_db)
 ):
-    todos = crud_todo.get_todos_by_organization(db, organization_id=current_user.organization_id, skip=skip, limit=limit)
-    return todos
+    # Sparse fieldsets: the description is only loaded for ?fields=all or when listed
+    try:
+        selected = resolve_fields(fields, crud_todo.TODO_FIELDS, crud_todo.TODO_SUMMARY_FIELDS)
+    except InvalidFields as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+    # Answer polls from the organization's change version before loading anything
+    version, total = crud_organization.get_version_and_total(db, current_user.organization_id, "todos")
+    etag = make_etag("todos", current_user.organization_id, version, skip, limit, cursor, ",".join(selected))
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
+    # The page is shared by every member of the organization until the next write
+    cache_key = response_cache.key(current_user.organization_id, "todos", version, skip, limit, cursor, ",".join(selected))
+    response = response_cache.get(cache_key)
+    if response is not None:
+        return response
+
+    # `cursor` switches to keyset pagination; `skip` is kept for existing clients.
+    try:
+        rows, next_cursor = crud_todo.get_todo_rows_page(
+            db, organization_id=current_user.organization_id, limit=limit, cursor=cursor, skip=skip, fields=selected
+        )
+    except InvalidCursor:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    response = rows_response(rows)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    response.headers["X-Total-Count"] = str(total)
+    set_etag(response, etag)
+    response_cache.set(cache_key, response)
+    return response
 
 @router.post("/", response_model=Todo)
 def create_todo(
     todo: TodoCreate,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
     return crud_todo.create_todo(db=db, todo=todo, user_id=current_user.id, organization_id=current_user.organization_id)
 
+@router.post("/bulk", response_model=BulkResult)
+def create_todos_bulk(
+    payload: TodoBulkCreate,
+    current_user: Principal = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    todo_ids = crud_todo.create_todos(db=db, todos=payload.items, user_id=current_user.id, organization_id=current_user.organization_id)
+    return {"results": [{"index": index, "id": todo_id, "status": "created"} for index, todo_id in enumerate(todo_ids)]}
+
+@router.patch("/bulk", response_model=BulkResult)
+def update_todos_bulk(
+    payload: TodoBulkUpdate,
+    current_user: Principal = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    todo_ids = [item.id for item in payload.items]
+    organizations = crud_todo.get_todo_organizations(db, todo_ids)
+    results, allowed = classify_by_organization(todo_ids, organizations, current_user.organization_id, "updated")
+    allowed = set(allowed)
+    crud_todo.update_todos(db=db, items=[item for item in payload.items if item.id in allowed], organization_id=current_user.organization_id)
+    return {"results": results}
+
+@router.get("/export")
+def export_todos(
+    format: Literal["ndjson", "csv"] = "ndjson",
+    current_user: Principal = Depends(get_current_active_user),
+    db: Session = Depends(get_read_db)
+):
+    # The session stays open until the response has been sent, so the result
+    # can keep reading from its server-side cursor while the client downloads.
+    result = crud_todo.export_todos(db, organization_id=current_user.organization_id, batch_size=settings.export_batch_size)
+    return StreamingResponse(
+        stream_rows(result, format),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="todos.{format}"'},
+    )
+
+@router.post("/import", response_model=ImportResult)
+def import_todos(
+    file: UploadFile = File(...),
+    format: Optional[Literal["ndjson", "csv"]] = None,
+    current_user: Principal = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    # The upload is spooled to disk by the multipart parser and read back in chunks
+    report = crud_todo.import_todos(
+        db,
+        fileobj=file.file,
+        format=format or import_format_for(file.filename),
+        user_id=current_user.id,
+        organization_id=current_user.organization_id,
+        batch_size=settings.import_batch_size,
+    )
+    return report.as_dict()
+
+@router.get("/stats", response_model=TodoStats)
+def read_todo_stats(
+    request: Request,
+    response: Response,
+    current_user: Principal = Depends(get_current_active_user),
+    db: Session = Depends(get_read_db)
+):
+    # Served from the organization's counters, whatever its size
+    version, open_count, done_count = crud_organization.get_todo_stats(db, current_user.organization_id)
+    etag = make_etag("todo-stats", current_user.organization_id, version)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    set_etag(response, etag)
+    return {"open": open_count, "done": done_count, "total": open_count + done_count}
+
+@router.get("/changes", response_model=TodoChanges)
+def read_todo_changes(
+    request: Request,
+    since: Optional[str] = None,
+    limit: int = Query(500, ge=1, le=1000),
+    current_user: Principal = Depends(get_current_active_user),
+    db: Session = Depends(get_read_db)
+):
+    """Todos created, updated or deleted after the `since` cursor (all todos
+    on the first sync). Pass the returned `cursor` back as `since`; keep
+    going while `has_more` is true."""
+    version = crud_organization.get_version(db, current_user.organization_id, "todos")
+    etag = make_etag("todos-changes", current_user.organization_id, version, since, limit)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
+    cache_key = response_cache.key(current_user.organization_id, "todos-changes", version, since, limit)
+    response = response_cache.get(cache_key)
+    if response is not None:
+        return response
+
+    try:
+        changes = crud_todo.get_todo_changes(
+            db, organization_id=current_user.organization_id, version=version, since=since, limit=limit
+        )
+    except InvalidCursor:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    response = json_response(changes)
+    set_etag(response, etag)
+    response_cache.set(cache_key, response)
+    return response
+
 @router.get("/{todo_id}", response_model=Todo)
 def read_todo(
     todo_id: int,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    request: Request,
+    current_user: Principal = Depends(get_current_active_user),
+    db: Session = Depends(get_read_db)
 ):
-    db_todo = crud_todo.get_todo(db, todo_id=todo_id)
-    if not db_todo:
-        raise HTTPException(status_code=404, detail="Todo not found")
-    if db_todo.organization_id != current_user.organization_id:
-        raise HTTPException(status_code=403, detail="Not enough permissions")
-    return db_todo
+    version = crud_organization.get_version(db, current_user.organization_id, "todos")
+    cache_key = response_cache.key(current_user.organization_id, "todo", version, todo_id)
+    response = response_cache.get(cache_key)
+    if response is None:
+        row = crud_todo.get_todo_row(db, todo_id=todo_id)
+        if row is None:
+            raise HTTPException(status_code=404, detail="Todo not found")
+        if row.organization_id != current_user.organization_id:
+            raise HTTPException(status_code=403, detail="Not enough permissions")
+        response = row_response(row)
+        set_etag(response, make_etag("todo", *row))
+        response_cache.set(cache_key, response)
+    if etag_matches(request, response.headers["ETag"]):
+        return not_modified(response.headers["ETag"])
+    return response
 
 @router.put("/{todo_id}", response_model=Todo)
 def update_todo(
     todo_id: int,
     todo: TodoUpdate,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
-    db_todo = crud_todo.get_todo(db, todo_id=todo_id)
-    if not db_todo:
-        raise HTTPException(status_code=404, detail="Todo not found")
-    if db_todo.organization_id != current_user.organization_id:
-        raise HTTPException(status_code=403, detail="Not enough permissions")
-    
-    return crud_todo.update_todo(db=db, todo_id=todo_id, todo_update=todo)
+    # The organization check is part of the UPDATE; the todo is only looked
+    # up again to tell "missing" from "forbidden" when nothing matched.
+    row = crud_todo.update_todo(db=db, todo_id=todo_id, organization_id=current_user.organization_id, todo_update=todo)
+    if row is None:
+        raise todo_access_error(db, todo_id, current_user.organization_id) or HTTPException(status_code=404, detail="Todo not found")
+    return row._asdict()
 
 @router.delete("/{todo_id}")
 def delete_todo(
     todo_id: int,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
-    db_todo = crud_todo.get_todo(db, todo_id=todo_id)
-    if not db_todo:
-        raise HTTPException(status_code=404, detail="Todo not found")
-    if db_todo.organization_id != current_user.organization_id:
-        raise HTTPException(status_code=403, detail="Not enough permissions")
-    
-    # Only ADMIN can delete todos
-    if current_user.role != UserRole.ADMIN:
-        raise HTTPException(status_code=403, detail="Only admin can delete todos")
-    
-    success = crud_todo.delete_todo(db=db, todo_id=todo_id)
-    if not success:
-        raise HTTPException(status_code=404, detail="Todo not found")
-    return {"message": "Todo deleted successfully"}
\ No newline at end of file
+    # Only ADMIN can delete todos. The role comes from the principal, so
+    # members never reach the DELETE.
+    if current_user.role == UserRole.ADMIN:
+        if crud_todo.delete_todo(db=db, todo_id=todo_id, organization_id=current_user.organization_id):
+            return {"message": "Todo deleted successfully"}
+        raise todo_access_error(db, todo_id, current_user.organization_id) or HTTPException(status_code=404, detail="Todo not found")
+    raise todo_access_error(db, todo_id, current_user.organization_id) or HTTPException(status_code=403, detail="Only admin can delete todos")
+
+def todo_access_error(db: Session, todo_id: int, organization_id: int) -> Optional[HTTPException]:
+    """Failure path of the single-statement writes: 404 if the todo doesn't
+    exist, 403 if it belongs to another organization."""
+    owner = crud_todo.get_todo_organizations(db, [todo_id]).get(todo_id)
+    if owner is None:
+        return HTTPException(status_code=404, detail="Todo not found")
+    if owner != organization_id:
+        return HTTPException(status_code=403, detail="Not enough permissions")
+    return None
@@ -1,6 +1,7 @@
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field
 from typing import Optional, List
 from datetime import datetime
+from app.core.config import settings
 from app.models.models import UserRole
 
 class OrganizationBase(BaseModel):
@@ -32,6 +33,16 @@ class UserSignup(BaseModel):
     password: str
     organization_name: str
 
+class UserBulkCreateItem(UserBase):
+    password: str
+
+class UserBulkCreate(BaseModel):
+    items: List[UserBulkCreateItem] = Field(..., min_length=1, max_length=settings.bulk_max_items)
+
+class UserUpdate(BaseModel):
+    role: Optional[UserRole] = None
+    organization_id: Optional[int] = None
+
 class User(UserBase):
     id: int
     organization_id: int
@@ -72,6 +83,22 @@ class Note(NoteBase):
     class Config:
         from_attributes = True
 
+class NoteListItem(BaseModel):
+    # GET /notes/ returns the fields picked by `fields=`; id and created_at always
+    id: int
+    created_at: datetime
+    title: Optional[str] = None
+    content: Optional[str] = None
+    created_by: Optional[int] = None
+    organization_id: Optional[int] = None
+    updated_at: Optional[datetime] = None
+
+class NoteSearchHit(BaseModel):
+    id: int
+    title: str
+    snippet: str
+    rank: float
+
 class TodoBase(BaseModel):
     title: str
     description: Optional[str] = None
@@ -84,6 +111,11 @@ class TodoUpdate(BaseModel):
     description: Optional[str] = None
     completed: Optional[bool] = None
 
+class TodoStats(BaseModel):
+    open: int
+    done: int
+    total: int
+
 class Todo(TodoBase):
     id: int
     completed: bool
@@ -100,4 +132,61 @@ class Todo(TodoBase):
         return super().from_orm(obj)
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class TodoListItem(BaseModel):
+    # GET /todos/ returns the fields picked by `fields=`; id and created_at always
+    id: int
+    created_at: datetime
+    title: Optional[str] = None
+    description: Optional[str] = None
+    completed: Optional[bool] = None
+    created_by: Optional[int] = None
+    organization_id: Optional[int] = None
+    updated_at: Optional[datetime] = None
+
+class NoteBulkCreate(BaseModel):
+    items: List[NoteCreate] = Field(..., min_length=1, max_length=settings.bulk_max_items)
+
+class TodoBulkCreate(BaseModel):
+    items: List[TodoCreate] = Field(..., min_length=1, max_length=settings.bulk_max_items)
+
+class TodoBulkUpdateItem(TodoUpdate):
+    id: int
+
+class TodoBulkUpdate(BaseModel):
+    items: List[TodoBulkUpdateItem] = Field(..., min_length=1, max_length=settings.bulk_max_items)
+
+class BulkDelete(BaseModel):
+    ids: List[int] = Field(..., min_length=1, max_length=settings.bulk_max_items)
+
+class BulkItemResult(BaseModel):
+    index: int
+    id: Optional[int] = None
+    status: str  # created, updated, deleted, not_found, forbidden, username_taken or email_taken
+
+class BulkResult(BaseModel):
+    results: List[BulkItemResult]
+
+
+class ImportRowError(BaseModel):
+    line: int
+    error: str
+
+class ImportResult(BaseModel):
+    processed: int
+    inserted: int
+    failed: int
+    errors: List[ImportRowError]
+
+class NoteChanges(BaseModel):
+    upserts: List[Note]
+    deletes: List[int]  # apply before upserts
+    cursor: str  # pass back as `since`
+    has_more: bool
+
+class TodoChanges(BaseModel):
+    upserts: List[Todo]
+    deletes: List[int]
+    cursor: str
+    has_more: bool
@@ -0,0 +1,43 @@
+from contextlib import contextmanager
+from typing import List
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+class QueryCounter:
+    def __init__(self):
+        self.statements: List[str] = []
+
+    def __len__(self):
+        return len(self.statements)
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+
+@contextmanager
+def count_queries():
+    """Count the SQL statements sent by any engine inside the block,
+    including those run by the app while TestClient handles a request."""
+    counter = QueryCounter()
+    event.listen(Engine, "after_cursor_execute", counter._record)
+    try:
+        yield counter
+    finally:
+        event.remove(Engine, "after_cursor_execute", counter._record)
+
+
+@pytest.fixture
+def assert_max_queries():
+    """`with assert_max_queries(3): client.get(...)` fails the test if the
+    block issues more than 3 statements, listing the ones it ran."""
+    @contextmanager
+    def check(budget: int):
+        with count_queries() as counter:
+            yield counter
+        if len(counter) > budget:
+            listing = "\n".join(f"  {i}. {statement}" for i, statement in enumerate(counter.statements, 1))
+            pytest.fail(f"{len(counter)} queries issued, budget is {budget}:\n{listing}", pytrace=False)
+    return check
@@ -0,0 +1,309 @@
+import csv
+import io
+import json
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, update
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.pool import NullPool
+from ..core.config import settings
+from ..core import database
+from ..core.database import get_async_db, get_async_database_url, Base
+from ..core.principal import principal_cache
+from ..core.response_cache import RedisBackend, response_cache
+from ..core.revocation import token_revocations
+from ..models.models import User, UserRole
+from ..routers import auth_async, notes_async, todos_async
+
+# Test database; NullPool because TestClient may run each request on a new event loop
+SQLALCHEMY_DATABASE_URL = "sqlite:///./test_async.db"
+engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+async_engine = create_async_engine(get_async_database_url(SQLALCHEMY_DATABASE_URL), poolclass=NullPool)
+TestingAsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
+async def override_get_async_db():
+    async with TestingAsyncSessionLocal() as db:
+        yield db
+
+app = FastAPI()
+app.include_router(auth_async.router, prefix="/auth")
+app.include_router(notes_async.router, prefix="/notes")
+app.include_router(todos_async.router, prefix="/todos")
+app.dependency_overrides[get_async_db] = override_get_async_db
+
+@pytest.fixture
+def setup_database():
+    Base.metadata.create_all(bind=engine)
+    principal_cache.clear()
+    response_cache.clear()
+    token_revocations.clear()
+    yield
+    Base.metadata.drop_all(bind=engine)
+
+@pytest.fixture
+def client(setup_database):
+    return TestClient(app)
+
+@pytest.fixture
+def auth_headers(client):
+    client.post(
+        "/auth/signup",
+        json={
+            "username": "asyncuser",
+            "email": "async@example.com",
+            "password": "testpassword",
+            "organization_name": "Async Org"
+        },
+    )
+
+    response = client.post(
+        "/auth/login",
+        data={"username": "asyncuser", "password": "testpassword"},
+    )
+    token = response.json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+def test_async_database_url():
+    assert get_async_database_url("postgresql://u:p@db:5432/app") == "postgresql+asyncpg://u:p@db:5432/app"
+    assert get_async_database_url("sqlite:///./app.db") == "sqlite+aiosqlite:///./app.db"
+
+def test_async_note_crud(client, auth_headers):
+    response = client.post(
+        "/notes/",
+        json={"title": "Async Note", "content": "Created through AsyncSession"},
+        headers=auth_headers,
+    )
+    assert response.status_code == 200
+    note_id = response.json()["id"]
+
+    response = client.put(f"/notes/{note_id}", json={"title": "Renamed"}, headers=auth_headers)
+    assert response.status_code == 200
+    assert response.json()["title"] == "Renamed"
+
+    response = client.get("/notes/", headers=auth_headers)
+    assert [note["title"] for note in response.json()] == ["Renamed"]
+    assert "content" not in response.json()[0]
+    assert response.headers["X-Total-Count"] == "1"
+    response = client.get("/notes/", params={"fields": "content"}, headers=auth_headers)
+    assert set(response.json()[0]) == {"id", "created_at", "content"}
+
+def test_async_todo_crud(client, auth_headers):
+    response = client.post("/todos/", json={"title": "Async Todo"}, headers=auth_headers)
+    assert response.status_code == 200
+    todo_id = response.json()["id"]
+
+    response = client.put(f"/todos/{todo_id}", json={"completed": True}, headers=auth_headers)
+    assert response.status_code == 200
+    assert response.json()["completed"] is True
+    assert client.get("/todos/", headers=auth_headers).headers["X-Total-Count"] == "1"
+
+    assert client.put("/todos/9999", json={"completed": True}, headers=auth_headers).status_code == 404
+    response = client.delete(f"/todos/{todo_id}", headers=auth_headers)
+    assert response.json()["detail"] == "Only admin can delete todos"
+
+def test_async_me(client, auth_headers):
+    response = client.get("/auth/me", headers=auth_headers)
+    assert response.status_code == 200
+    assert response.json()["username"] == "asyncuser"
+
+def test_async_bulk_users(client, auth_headers):
+    users = [
+        {"username": "employee1", "email": "employee1@example.com", "password": "password1"},
+        {"username": "asyncuser", "email": "employee2@example.com", "password": "password2"},
+    ]
+    assert client.post("/auth/users/bulk", json={"items": users}, headers=auth_headers).status_code == 403
+
+    with engine.begin() as connection:
+        connection.execute(update(User).where(User.username == "asyncuser").values(role=UserRole.ADMIN))
+    response = client.post("/auth/login", data={"username": "asyncuser", "password": "testpassword"})
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    results = client.post("/auth/users/bulk", json={"items": users}, headers=headers).json()["results"]
+    assert [result["status"] for result in results] == ["created", "username_taken"]
+    assert client.post("/auth/login", data={"username": "employee1", "password": "password1"}).status_code == 200
+
+def test_async_logout(client, auth_headers):
+    response = client.post("/auth/login", data={"username": "asyncuser", "password": "testpassword"})
+    other_headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    assert client.post("/auth/logout", headers=auth_headers).status_code == 200
+    assert client.get("/auth/me", headers=auth_headers).status_code == 401
+    assert client.get("/auth/me", headers=other_headers).status_code == 200
+
+    assert client.post("/auth/logout-all", headers=other_headers).status_code == 200
+    assert client.get("/auth/me", headers=other_headers).status_code == 401
+
+def test_async_changes(client, auth_headers):
+    note_id = client.post("/notes/", json={"title": "Async", "content": "Body"}, headers=auth_headers).json()["id"]
+    todo_id = client.post("/todos/", json={"title": "Async"}, headers=auth_headers).json()["id"]
+    notes = client.get("/notes/changes", headers=auth_headers).json()
+    todos = client.get("/todos/changes", headers=auth_headers).json()
+    assert [note["id"] for note in notes["upserts"]] == [note_id]
+    assert [todo["id"] for todo in todos["upserts"]] == [todo_id]
+
+    client.put(f"/todos/{todo_id}", json={"completed": True}, headers=auth_headers)
+    changes = client.get("/todos/changes", params={"since": todos["cursor"]}, headers=auth_headers).json()
+    assert [(todo["id"], todo["completed"]) for todo in changes["upserts"]] == [(todo_id, True)]
+    assert client.get("/notes/changes", params={"since": notes["cursor"]}, headers=auth_headers).json()["upserts"] == []
+
+def test_async_search_notes(client, auth_headers):
+    client.post("/notes/", json={"title": "Planning", "content": "Budget review"}, headers=auth_headers)
+    client.post("/notes/", json={"title": "Groceries", "content": "Milk"}, headers=auth_headers)
+
+    response = client.get("/notes/search", params={"q": "budget"}, headers=auth_headers)
+    assert response.status_code == 200
+    assert [hit["title"] for hit in response.json()] == ["Planning"]
+    assert "<mark>Budget</mark>" in response.json()[0]["snippet"]
+
+def test_async_etags(client, auth_headers):
+    note_id = client.post("/notes/", json={"title": "Polled", "content": "c"}, headers=auth_headers).json()["id"]
+    for path in ("/notes/", f"/notes/{note_id}", "/notes/changes", "/todos/", "/todos/changes", "/auth/me"):
+        response = client.get(path, headers=auth_headers)
+        assert response.status_code == 200
+        etag = response.headers["ETag"]
+        response = client.get(path, headers={**auth_headers, "If-None-Match": etag})
+        assert response.status_code == 304, path
+
+    # A write changes the tags of the organization's pages
+    etag = client.get("/notes/", headers=auth_headers).headers["ETag"]
+    client.put(f"/notes/{note_id}", json={"title": "Renamed"}, headers=auth_headers)
+    response = client.get("/notes/", headers={**auth_headers, "If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()[0]["title"] == "Renamed"
+
+def test_async_export(client, auth_headers, monkeypatch):
+    monkeypatch.setattr(settings, "export_batch_size", 2)
+    for i in range(3):
+        client.post("/notes/", json={"title": f"Export {i}", "content": "line one\nline, two"}, headers=auth_headers)
+        client.post("/todos/", json={"title": f"Export {i}"}, headers=auth_headers)
+
+    response = client.get("/notes/export", headers=auth_headers)
+    assert response.status_code == 200
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [row["title"] for row in rows] == ["Export 0", "Export 1", "Export 2"]
+    assert rows[0]["content"] == "line one\nline, two"
+
+    response = client.get("/todos/export", params={"format": "csv"}, headers=auth_headers)
+    assert 'filename="todos.csv"' in response.headers["content-disposition"]
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert [row["title"] for row in rows] == ["Export 0", "Export 1", "Export 2"]
+
+def test_async_import(client, auth_headers, monkeypatch):
+    monkeypatch.setattr(settings, "import_batch_size", 2)
+    lines = [json.dumps({"title": f"Imported {i}", "content": "body"}) for i in range(3)]
+    lines.insert(1, "{not json")
+    response = client.post(
+        "/notes/import",
+        files={"file": ("notes.ndjson", ("\n".join(lines) + "\n").encode())},
+        headers=auth_headers,
+    )
+    assert response.status_code == 200
+    report = response.json()
+    assert (report["processed"], report["inserted"], report["failed"]) == (4, 3, 1)
+    assert report["errors"][0]["line"] == 2
+    assert client.get("/notes/", headers=auth_headers).headers["X-Total-Count"] == "3"
+
+    response = client.post(
+        "/todos/import",
+        files={"file": ("todos.csv", b"title,description\nFirst,\nSecond,from a file\n")},
+        headers=auth_headers,
+    )
+    assert response.json()["inserted"] == 2
+    todos = client.get("/todos/", params={"fields": "all"}, headers=auth_headers).json()
+    assert [(todo["title"], todo["description"], todo["completed"]) for todo in todos] == [
+        ("First", "", False), ("Second", "from a file", False)
+    ]
+
+def test_async_todo_stats(client, auth_headers):
+    todo_id = client.post("/todos/", json={"title": "One"}, headers=auth_headers).json()["id"]
+    client.post("/todos/", json={"title": "Two"}, headers=auth_headers)
+    client.put(f"/todos/{todo_id}", json={"completed": True}, headers=auth_headers)
+
+    response = client.get("/todos/stats", headers=auth_headers)
+    assert response.json() == {"open": 1, "done": 1, "total": 2}
+    response = client.get("/todos/stats", headers={**auth_headers, "If-None-Match": response.headers["ETag"]})
+    assert response.status_code == 304
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None):
+        self.data[key] = bytes(value)
+
+def test_async_response_cache(client, auth_headers):
+    note_id = client.post("/notes/", json={"title": "First", "content": "c"}, headers=auth_headers).json()["id"]
+    for path in ("/notes/", f"/notes/{note_id}", "/notes/changes"):
+        first = client.get(path, headers=auth_headers)
+        assert first.headers["X-Cache"] == "MISS"
+        second = client.get(path, headers=auth_headers)
+        assert second.headers["X-Cache"] == "HIT"
+        assert second.json() == first.json()
+        assert second.headers["ETag"] == first.headers["ETag"]
+
+    # A write bumps the version, so the pages are rebuilt
+    client.put(f"/notes/{note_id}", json={"title": "Edited"}, headers=auth_headers)
+    response = client.get("/notes/", headers=auth_headers)
+    assert response.headers["X-Cache"] == "MISS"
+    assert response.json()[0]["title"] == "Edited"
+
+def test_async_response_cache_redis_backend(client, auth_headers, monkeypatch):
+    fake = FakeRedis()
+    monkeypatch.setattr(response_cache, "backend", RedisBackend(fake))
+    todo_id = client.post("/todos/", json={"title": "In redis"}, headers=auth_headers).json()["id"]
+
+    assert client.get(f"/todos/{todo_id}", headers=auth_headers).headers["X-Cache"] == "MISS"
+    assert len(fake.data) == 1
+    response = client.get(f"/todos/{todo_id}", headers=auth_headers)
+    assert response.headers["X-Cache"] == "HIT"
+    assert response.json()["title"] == "In redis"
+
+def test_async_bulk_routes(client, auth_headers):
+    response = client.post("/notes/bulk", json={"items": [{"title": "A", "content": "a"}, {"title": "B", "content": "b"}]}, headers=auth_headers)
+    assert response.status_code == 200
+    note_ids = [result["id"] for result in response.json()["results"]]
+    assert client.get("/notes/", headers=auth_headers).headers["X-Total-Count"] == "2"
+
+    # Only admins may delete
+    assert client.request("DELETE", "/notes/bulk", json={"ids": note_ids}, headers=auth_headers).status_code == 403
+    with engine.begin() as connection:
+        connection.execute(update(User).where(User.username == "asyncuser").values(role=UserRole.ADMIN))
+    response = client.post("/auth/login", data={"username": "asyncuser", "password": "testpassword"})
+    auth_headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    response = client.request("DELETE", "/notes/bulk", json={"ids": [note_ids[0], 9999]}, headers=auth_headers)
+    assert response.status_code == 200
+    assert [result["status"] for result in response.json()["results"]] == ["deleted", "not_found"]
+    assert [note["id"] for note in client.get("/notes/", headers=auth_headers).json()] == note_ids[1:]
+
+    response = client.post("/todos/bulk", json={"items": [{"title": "One"}, {"title": "Two"}]}, headers=auth_headers)
+    todo_ids = [result["id"] for result in response.json()["results"]]
+    response = client.patch(
+        "/todos/bulk",
+        json={"items": [{"id": todo_ids[0], "completed": True}, {"id": todo_ids[1], "title": "Renamed"}]},
+        headers=auth_headers,
+    )
+    assert [result["status"] for result in response.json()["results"]] == ["updated", "updated"]
+    todos = client.get("/todos/", headers=auth_headers).json()
+    assert [(todo["title"], todo["completed"]) for todo in todos] == [("One", True), ("Renamed", False)]
+    assert client.get("/todos/stats", headers=auth_headers).json() == {"open": 1, "done": 1, "total": 2}
+
+def test_async_reads_go_to_replica(client, auth_headers, monkeypatch):
+    # A replica that hasn't replicated anything yet
+    replica_url = "sqlite:///./test_async_replica.db"
+    replica_engine = create_engine(replica_url)
+    Base.metadata.create_all(bind=replica_engine)
+    replica_async_engine = create_async_engine(get_async_database_url(replica_url), poolclass=NullPool)
+    monkeypatch.setattr(database, "AsyncReadSessionLocals", [
+        async_sessionmaker(bind=replica_async_engine, autoflush=False, expire_on_commit=False)
+    ])
+    try:
+        client.post("/notes/", json={"title": "Fresh", "content": "c"}, headers=auth_headers)
+        assert client.get("/notes/", headers=auth_headers).headers["X-Total-Count"] == "0"
+        # Clients that just wrote keep reading from the primary
+        response = client.get("/notes/", headers=auth_headers, cookies={database.READ_PRIMARY_COOKIE: "9999999999"})
+        assert response.headers["X-Total-Count"] == "1"
+    finally:
+        Base.metadata.drop_all(bind=replica_engine)
@@ -1,9 +1,21 @@
+import threading
 import pytest
+from passlib.context import CryptContext
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from ..main import app
 from ..core.database import get_db, Base
+from ..core.principal import principal_cache
+from ..core.response_cache import response_cache
+from ..core.config import settings
+from ..core.revocation import InProcessStore, RedisStore, RevocationStoreUnavailable, require_shared_backend, token_revocations
+from ..core import security
+from ..core.deps import get_current_user
+from ..core.security import pwd_context
+from ..crud import crud_user
+from ..models.models import UserRole
+from ..schemas.schemas import UserUpdate
 
 # Test database
 SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
@@ -22,6 +34,9 @@ app.dependency_overrides[get_db] = override_get_db
 @pytest.fixture
 def setup_database():
     Base.metadata.create_all(bind=engine)
+    principal_cache.clear()
+    response_cache.clear()
+    token_revocations.clear()
     yield
     Base.metadata.drop_all(bind=engine)
 
@@ -84,4 +99,247 @@ def test_login_wrong_password(client):
         "/auth/login",
         data={"username": "testuser3", "password": "wrongpassword"},
     )
-    assert response.status_code == 401
\ No newline at end of file
+    assert response.status_code == 401
+
+def signup_and_login(client, username):
+    client.post(
+        "/auth/signup",
+        json={
+            "username": username,
+            "email": f"{username}@example.com",
+            "password": "testpassword",
+            "organization_name": f"{username} Org"
+        },
+    )
+    response = client.post("/auth/login", data={"username": username, "password": "testpassword"})
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+def test_token_carries_the_principal(client, assert_max_queries):
+    headers = signup_and_login(client, "testuser4")
+    token = headers["Authorization"].split()[1]
+    with assert_max_queries(0):
+        principal = get_current_user(token)
+    assert (principal.username, principal.role, principal.token_version) == ("testuser4", UserRole.MEMBER, 0)
+    assert principal.jti
+
+    # The decoded principal is cached by token
+    principal_cache.clear()
+    assert client.get("/auth/me", headers=headers).status_code == 200
+    assert client.get("/auth/me", headers=headers).status_code == 200
+    assert principal_cache.misses == 1
+    assert principal_cache.hits == 1
+
+def test_tokens_without_principal_claims_are_rejected(client):
+    signup_and_login(client, "testuser4")
+    token = security.create_access_token({"sub": "testuser4"})
+    assert client.get("/auth/me", headers={"Authorization": f"Bearer {token}"}).status_code == 401
+
+def test_role_change_revokes_tokens(client):
+    headers = signup_and_login(client, "testuser4")
+    assert client.get("/auth/me", headers=headers).json()["role"] == "member"
+
+    db = TestingSessionLocal()
+    try:
+        user = crud_user.get_user_by_username(db, username="testuser4")
+        crud_user.update_user(db, user_id=user.id, user_update=UserUpdate(role=UserRole.ADMIN))
+    finally:
+        db.close()
+    # Even though the principal is still cached
+    assert client.get("/auth/me", headers=headers).status_code == 401
+
+    response = client.post("/auth/login", data={"username": "testuser4", "password": "testpassword"})
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    assert client.get("/auth/me", headers=headers).json()["role"] == "admin"
+
+def test_me_of_deleted_user_is_unauthorized(client):
+    headers = signup_and_login(client, "testuser4")
+    db = TestingSessionLocal()
+    try:
+        db.delete(crud_user.get_user_by_username(db, username="testuser4"))
+        db.commit()
+    finally:
+        db.close()
+    assert client.get("/auth/me", headers=headers).status_code == 401
+
+def test_logout_revokes_only_that_token(client):
+    headers = signup_and_login(client, "testuser4")
+    response = client.post("/auth/login", data={"username": "testuser4", "password": "testpassword"})
+    other_headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    assert client.post("/auth/logout", headers=headers).status_code == 200
+    assert client.get("/auth/me", headers=headers).status_code == 401
+    assert client.get("/auth/me", headers=other_headers).status_code == 200
+
+def test_logout_all_revokes_every_token(client):
+    headers = signup_and_login(client, "testuser4")
+    response = client.post("/auth/login", data={"username": "testuser4", "password": "testpassword"})
+    other_headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    assert client.post("/auth/logout-all", headers=headers).status_code == 200
+    assert client.get("/auth/me", headers=headers).status_code == 401
+    assert client.get("/auth/me", headers=other_headers).status_code == 401
+
+    # Tokens issued afterwards carry the new version
+    response = client.post("/auth/login", data={"username": "testuser4", "password": "testpassword"})
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    assert client.get("/auth/me", headers=headers).status_code == 200
+
+def test_bulk_user_provisioning(client):
+    headers = signup_and_login(client, "testuser4")
+    signup_and_login(client, "outsider")
+    users = [
+        {"username": "employee1", "email": "employee1@example.com", "password": "password1"},
+        {"username": "outsider", "email": "new@example.com", "password": "password2"},
+        {"username": "employee2", "email": "outsider@example.com", "password": "password3"},
+        {"username": "employee3", "email": "employee3@example.com", "password": "password4", "role": "admin"},
+        {"username": "employee1", "email": "again@example.com", "password": "password5"},
+    ]
+    # Only admins may provision users
+    assert client.post("/auth/users/bulk", json={"items": users}, headers=headers).status_code == 403
+
+    db = TestingSessionLocal()
+    try:
+        admin = crud_user.get_user_by_username(db, username="testuser4")
+        crud_user.update_user(db, user_id=admin.id, user_update=UserUpdate(role=UserRole.ADMIN))
+    finally:
+        db.close()
+    response = client.post("/auth/login", data={"username": "testuser4", "password": "testpassword"})
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    response = client.post("/auth/users/bulk", json={"items": users}, headers=headers)
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [result["status"] for result in results] == ["created", "username_taken", "email_taken", "created", "username_taken"]
+    assert results[0]["id"] and results[3]["id"] and results[1]["id"] is None
+
+    # Provisioned users join the admin's organization and can log in
+    response = client.post("/auth/login", data={"username": "employee3", "password": "password4"})
+    me = client.get("/auth/me", headers={"Authorization": f"Bearer {response.json()['access_token']}"}).json()
+    assert (me["id"], me["role"], me["organization_id"]) == (results[3]["id"], "admin", admin.organization_id)
+
+def test_password_hashes_spread_over_the_pool(monkeypatch):
+    monkeypatch.setattr(security.settings, "password_hash_workers", 2)
+    monkeypatch.setattr(security.settings, "password_hash_bulk_workers", 2)
+    # Sign-ins keep every slot of their own pool while a batch runs
+    monkeypatch.setattr(security, "_hashing_slots", threading.BoundedSemaphore(1))
+    monkeypatch.setattr(security, "_get_hashing_pool", lambda: pytest.fail("batch used the sign-in pool"))
+    hashes = security.get_password_hashes(["one", "two", "three"])
+    assert [pwd_context.verify(password, hashed) for password, hashed in zip(["one", "two", "three"], hashes)] == [True] * 3
+    # The batch released its pending slot
+    assert security._bulk_hashing_slots._value == security.settings.password_hash_max_pending
+
+def test_several_workers_require_shared_revocations(monkeypatch):
+    monkeypatch.setattr(settings, "revocation_url", None)
+    require_shared_backend(1)
+    with pytest.raises(RuntimeError, match="REVOCATION_URL"):
+        require_shared_backend(4)
+    monkeypatch.setattr(settings, "revocation_url", "redis://localhost:6379/1")
+    require_shared_backend(4)
+
+class BrokenRedis:
+    def get(self, key):
+        raise ConnectionError("redis is down")
+
+    def set(self, key, value, ex=None):
+        raise ConnectionError("redis is down")
+
+def test_revocation_store_errors_fail_closed(client, monkeypatch):
+    headers = signup_and_login(client, "testuser4")
+    monkeypatch.setattr(token_revocations, "backend", RedisStore(BrokenRedis()))
+    # Neither the logout nor the token check may pretend to have worked
+    assert client.post("/auth/logout", headers=headers).status_code == 503
+    assert client.post("/auth/logout-all", headers=headers).status_code == 503
+    assert client.get("/auth/me", headers=headers).status_code == 503
+
+def test_full_revocation_store_refuses_new_entries():
+    now = [0.0]
+    store = InProcessStore(max_entries=2, timer=lambda: now[0])
+    store.set("ver:1", b"2", ttl=10)
+    store.set("jti:a", b"1", ttl=100)
+    with pytest.raises(RevocationStoreUnavailable):
+        store.set("jti:b", b"1", ttl=100)
+    # Nothing was evicted to make room; existing keys can still be updated
+    assert store.get("ver:1") == b"2"
+    store.set("ver:1", b"3", ttl=10)
+    # Expired entries free their slot
+    now[0] = 50.0
+    store.set("jti:b", b"1", ttl=100)
+    assert (store.get("ver:1"), store.get("jti:a"), store.get("jti:b")) == (None, b"1", b"1")
+
+def test_login_rehashes_outdated_password_hash(client):
+    client.post(
+        "/auth/signup",
+        json={
+            "username": "testuser5",
+            "email": "test5@example.com",
+            "password": "testpassword",
+            "organization_name": "Test Org 5"
+        },
+    )
+    # Simulate a hash created before the bcrypt cost factor was changed
+    old_hash = CryptContext(schemes=["bcrypt"], bcrypt__rounds=4).hash("testpassword")
+    db = TestingSessionLocal()
+    try:
+        user = crud_user.get_user_by_username(db, username="testuser5")
+        crud_user.update_password_hash(db, user=user, hashed_password=old_hash)
+    finally:
+        db.close()
+
+    response = client.post(
+        "/auth/login",
+        data={"username": "testuser5", "password": "testpassword"},
+    )
+    assert response.status_code == 200
+
+    db = TestingSessionLocal()
+    try:
+        user = crud_user.get_user_by_username(db, username="testuser5")
+        assert user.hashed_password != old_hash
+        assert not pwd_context.needs_update(user.hashed_password)
+    finally:
+        db.close()
+
+def test_login_returns_503_when_hashing_pool_saturated(client, monkeypatch):
+    slots = threading.BoundedSemaphore(1)
+    slots.acquire()
+    monkeypatch.setattr(security, "_hashing_slots", slots)
+    monkeypatch.setattr(security.settings, "password_hash_workers", 1)
+
+    response = client.post(
+        "/auth/login",
+        data={"username": "testuser", "password": "testpassword"},
+    )
+    # No such user, so no hashing: still a plain 401
+    assert response.status_code == 401
+
+    response = client.post(
+        "/auth/signup",
+        json={
+            "username": "testuser6",
+            "email": "test6@example.com",
+            "password": "testpassword",
+            "organization_name": "Test Org 6"
+        },
+    )
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+
+def test_me_etag(client):
+    client.post(
+        "/auth/signup",
+        json={
+            "username": "testuser7",
+            "email": "test7@example.com",
+            "password": "testpassword",
+            "organization_name": "Test Org 7"
+        },
+    )
+    response = client.post(
+        "/auth/login",
+        data={"username": "testuser7", "password": "testpassword"},
+    )
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    etag = client.get("/auth/me", headers=headers).headers["ETag"]
+    response = client.get("/auth/me", headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 304
@@ -0,0 +1,205 @@
+import asyncio
+import time
+import pytest
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+from ..main import app
+from ..core.config import settings
+from ..core.database import get_db, Base
+from ..core.events import Broker, LocalBackend, PostgresNotifyBackend, broker, record_event
+from ..core.principal import Principal, principal_cache
+from ..core.response_cache import response_cache
+from ..core.revocation import token_revocations
+from ..models.models import UserRole
+from ..routers.events import sse_stream
+
+# Test database
+SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
+engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+def override_get_db():
+    try:
+        db = TestingSessionLocal()
+        yield db
+    finally:
+        db.close()
+
+app.dependency_overrides[get_db] = override_get_db
+
+@pytest.fixture
+def setup_database():
+    Base.metadata.create_all(bind=engine)
+    principal_cache.clear()
+    response_cache.clear()
+    token_revocations.clear()
+    yield
+    Base.metadata.drop_all(bind=engine)
+
+@pytest.fixture
+def client(setup_database):
+    # As a context manager so the startup handler connects the broker
+    with TestClient(app) as client:
+        yield client
+
+def signup_and_login(client, username, organization_name):
+    client.post(
+        "/auth/signup",
+        json={
+            "username": username,
+            "email": f"{username}@example.com",
+            "password": "testpassword",
+            "organization_name": organization_name
+        },
+    )
+    response = client.post("/auth/login", data={"username": username, "password": "testpassword"})
+    return response.json()["access_token"]
+
+class CapturingBackend:
+    def __init__(self):
+        self.payloads = []
+
+    def publish(self, payload):
+        self.payloads.append(payload)
+
+class FakeNotifyConnection:
+    closed = False
+
+    def __init__(self, sent):
+        self.sent = sent
+
+    def cursor(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def execute(self, statement, params):
+        self.sent.append(params)
+
+    def close(self):
+        self.closed = True
+
+def principal(expires_in=3600):
+    return Principal(id=1, username="u", organization_id=1, role=UserRole.MEMBER, expires_at=int(time.time() + expires_in))
+
+def test_websocket_receives_organization_events(client):
+    token = signup_and_login(client, "alice", "Org A")
+    other_token = signup_and_login(client, "mallory", "Org B")
+    headers = {"Authorization": f"Bearer {token}"}
+
+    with client.websocket_connect(f"/events/ws?access_token={token}") as websocket:
+        client.post("/todos/", json={"title": "Elsewhere"}, headers={"Authorization": f"Bearer {other_token}"})
+        # A failed write rolls back and publishes nothing
+        assert client.put("/notes/999", json={"title": "Missing"}, headers=headers).status_code == 404
+        note_id = client.post("/notes/", json={"title": "Pushed", "content": "Body"}, headers=headers).json()["id"]
+        event = websocket.receive_json()
+        assert event == {"organization_id": event["organization_id"], "resource": "notes", "op": "created", "ids": [note_id], "change_seq": 1}
+
+        client.put(f"/notes/{note_id}", json={"title": "Edited"}, headers=headers)
+        event = websocket.receive_json()
+        assert (event["op"], event["ids"], event["change_seq"]) == ("updated", [note_id], 2)
+
+        response = client.post("/todos/bulk", json={"items": [{"title": "A"}, {"title": "B"}]}, headers=headers)
+        event = websocket.receive_json()
+        assert (event["resource"], event["op"]) == ("todos", "created")
+        assert event["ids"] == [result["id"] for result in response.json()["results"]]
+
+        # The pushed change_seq is a valid point to catch up from
+        changes = client.get("/notes/changes", headers=headers).json()
+        assert [note["title"] for note in changes["upserts"]] == ["Edited"]
+
+def test_websocket_rejects_invalid_tokens(client):
+    with pytest.raises(WebSocketDisconnect):
+        with client.websocket_connect("/events/ws?access_token=invalid") as websocket:
+            websocket.receive_json()
+
+def test_sse_requires_a_token(client):
+    assert client.get("/events").status_code == 401
+
+def test_events_are_published_on_commit_only(setup_database, monkeypatch):
+    backend = CapturingBackend()
+    monkeypatch.setattr(broker, "backend", backend)
+    db = TestingSessionLocal()
+    try:
+        db.execute(text("SELECT 1"))
+        record_event(db, 1, "notes", "deleted", [1], 3)
+        db.rollback()
+        db.commit()
+        assert backend.payloads == []
+
+        record_event(db, 1, "notes", "deleted", list(range(1200)), 4)
+        db.commit()
+    finally:
+        db.close()
+    # Split to keep each NOTIFY payload small
+    assert len(backend.payloads) == 3
+
+def test_sse_stream():
+    async def scenario():
+        local = Broker(LocalBackend(), queue_size=10)
+        local.start()
+        subscription = local.subscribe(1)
+        stream = sse_stream(subscription, principal())
+        assert await stream.__anext__() == b"retry: 5000\n\n"
+        local.publish([
+            {"organization_id": 2, "resource": "notes", "op": "created", "ids": [7], "change_seq": 1},
+            {"organization_id": 1, "resource": "todos", "op": "deleted", "ids": [3], "change_seq": 5},
+        ])
+        chunk = await stream.__anext__()
+        assert chunk.startswith(b"id: 5\nevent: todos\ndata: ")
+        assert b'"op":"deleted"' in chunk
+        await stream.aclose()
+        assert local.connections() == 0
+
+    asyncio.run(scenario())
+
+def test_slow_consumers_are_dropped_with_resync():
+    async def scenario():
+        local = Broker(LocalBackend(), queue_size=2)
+        local.start()
+        slow = local.subscribe(1)
+        fast = local.subscribe(1)
+        for seq in range(1, 4):
+            local.publish([{"organization_id": 1, "resource": "notes", "op": "updated", "ids": [1], "change_seq": seq}])
+            if seq < 3:
+                assert (await fast.get())["change_seq"] == seq
+        assert (await fast.get())["change_seq"] == 3
+        assert slow.dropped and local.connections() == 1
+
+        # The backlog is replaced by a single resync, which ends the stream
+        chunks = [chunk async for chunk in sse_stream(slow, principal())]
+        assert chunks == [b"retry: 5000\n\n", b"event: resync\ndata: {}\n\n"]
+
+    asyncio.run(scenario())
+
+def test_sse_stream_ends_with_the_token(monkeypatch):
+    monkeypatch.setattr(settings, "events_heartbeat_seconds", 0.01)
+
+    async def scenario():
+        local = Broker(LocalBackend())
+        local.start()
+        chunks = [chunk async for chunk in sse_stream(local.subscribe(1), principal(expires_in=-1))]
+        assert chunks == [b"retry: 5000\n\n"]
+        assert local.connections() == 0
+
+    asyncio.run(scenario())
+
+def test_postgres_notify_publish_does_not_block_the_caller():
+    sent, connects = [], []
+    backend = PostgresNotifyBackend("postgresql://unused")
+    backend._connect = lambda: connects.append(1) or FakeNotifyConnection(sent)
+    backend._listen = lambda deliver: None
+    backend.publish('{"organization_id": 1}')
+    # Queued only: nothing is sent from the committing thread
+    assert (connects, sent) == ([], [])
+    backend.start(lambda payload: None)
+    backend.publish('{"organization_id": 2}')
+    backend.stop()
+    assert sent == [("organization_events", '{"organization_id": 1}'), ("organization_events", '{"organization_id": 2}')]
+    assert connects == [1]
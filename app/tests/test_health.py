@@ -0,0 +1,88 @@
+import time
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from ..main import app
+from ..core import warmup
+from ..core.database import get_db, Base
+from ..core.metrics import metrics
+from ..core.principal import principal_cache
+from ..core.response_cache import response_cache
+from ..core.revocation import token_revocations
+
+# Test database
+SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
+engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+def override_get_db():
+    try:
+        db = TestingSessionLocal()
+        yield db
+    finally:
+        db.close()
+
+app.dependency_overrides[get_db] = override_get_db
+
+@pytest.fixture
+def setup_database():
+    Base.metadata.create_all(bind=engine)
+    principal_cache.clear()
+    response_cache.clear()
+    token_revocations.clear()
+    metrics.reset()
+    yield
+    Base.metadata.drop_all(bind=engine)
+
+def test_ready_only_after_warmup(setup_database):
+    # Without the lifespan the worker never warmed up
+    client = TestClient(app)
+    assert client.get("/health/live").status_code == 200
+    assert client.get("/health").json() == {"status": "healthy"}
+    response = client.get("/health/ready")
+    assert (response.status_code, response.json()) == (503, {"status": "starting"})
+
+    with TestClient(app) as client:
+        response = client.get("/health/ready")
+        assert response.status_code == 200
+        body = response.json()
+        assert set(body["startup_ms"]) == {"openapi", "database", "password_hashing", "total"}
+        # Probes don't count as the worker's first request
+        assert body["first_request_ms"] is None
+
+        client.get("/notes/")
+        assert client.get("/health/ready").json()["first_request_ms"] > 0
+        rendered = client.get("/metrics").text
+        assert 'app_startup_seconds{phase="total"}' in rendered
+        assert 'app_first_request_seconds{method="GET",route="/notes/"}' in rendered
+    assert not warmup.readiness.ready
+
+def test_ready_fails_without_database(setup_database, monkeypatch):
+    monkeypatch.setattr(warmup.settings, "startup_warmup", False)
+    with TestClient(app) as client:
+        assert client.get("/health/ready").status_code == 200
+        monkeypatch.setattr(warmup, "engine", create_engine("sqlite:////nonexistent/dir/app.db"))
+        response = client.get("/health/ready")
+        assert (response.status_code, response.json()["status"]) == (503, "unavailable")
+        # Liveness doesn't depend on the database
+        assert client.get("/health/live").status_code == 200
+
+def test_failed_warmup_is_retried(setup_database, monkeypatch):
+    attempts = []
+
+    def flaky_warm_engine(db_engine):
+        attempts.append(db_engine)
+        if len(attempts) < 3:
+            raise ConnectionError("database is starting")
+
+    monkeypatch.setattr(warmup, "warm_engine", flaky_warm_engine)
+    monkeypatch.setattr(warmup, "WARMUP_RETRY_SECONDS", 0.01)
+    # The worker still boots, and becomes ready once a retry succeeds
+    with TestClient(app) as client:
+        for _ in range(100):
+            if client.get("/health/ready").status_code == 200:
+                break
+            time.sleep(0.05)
+        assert client.get("/health/ready").status_code == 200
+    assert len(attempts) == 3
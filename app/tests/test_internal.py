@@ -0,0 +1,121 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, exc, text
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
+from ..main import app
+from ..core import database
+from ..core.database import get_db, Base
+from ..core.principal import principal_cache
+from ..core.response_cache import response_cache
+from ..core.revocation import token_revocations
+from ..core.config import settings
+from ..core.metrics import metrics
+from ..core.pool_stats import PoolStats, instrument_engine, instrumented_pool_class
+
+# Test database
+SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
+engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+def override_get_db():
+    try:
+        db = TestingSessionLocal()
+        yield db
+    finally:
+        db.close()
+
+app.dependency_overrides[get_db] = override_get_db
+
+@pytest.fixture
+def setup_database():
+    Base.metadata.create_all(bind=engine)
+    principal_cache.clear()
+    response_cache.clear()
+    token_revocations.clear()
+    yield
+    Base.metadata.drop_all(bind=engine)
+
+@pytest.fixture
+def client(setup_database):
+    return TestClient(app)
+
+def test_pool_stats_track_checkouts_and_timeouts(tmp_path):
+    stats = PoolStats()
+    pool_engine = create_engine(
+        f"sqlite:///{tmp_path / 'pool.db'}",
+        poolclass=instrumented_pool_class(QueuePool, stats),
+        pool_size=1,
+        max_overflow=0,
+        pool_timeout=0.05,
+    )
+    instrument_engine(pool_engine, stats)
+
+    with pool_engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+        with pytest.raises(exc.TimeoutError):
+            pool_engine.connect()
+        conn.invalidate()
+
+    snapshot = stats.snapshot(pool_engine.pool)
+    assert snapshot["connects"] == 1
+    assert snapshot["checkouts"] == 1
+    assert snapshot["timeouts"] == 1
+    assert snapshot["invalidations"] == 1
+    assert snapshot["peak_checked_out"] == 1
+    assert snapshot["wait_ms"]["count"] == 2
+    assert snapshot["wait_ms"]["max"] >= 50
+    assert snapshot["pool"]["size"] == 1
+    assert snapshot["pool"]["checked_out"] == 0
+
+    # Stats are kept on the class, so they survive dispose()/recreate()
+    pool_engine.dispose()
+    with pool_engine.connect():
+        pass
+    assert stats.snapshot()["connects"] == 2
+    pool_engine.dispose()
+
+def test_dispose_engines_after_fork_replaces_pools():
+    pools = (database.engine.pool, database.async_engine.sync_engine.pool)
+    with database.engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+    database.dispose_engines_after_fork()
+    assert database.engine.pool is not pools[0]
+    assert database.async_engine.sync_engine.pool is not pools[1]
+    # The engines keep working with the fresh pools
+    with database.engine.connect() as conn:
+        assert conn.execute(text("SELECT 1")).scalar() == 1
+
+def test_db_pool_endpoint_requires_token(client, monkeypatch):
+    assert client.get("/internal/db-pool").status_code == 404
+
+    monkeypatch.setattr(settings, "internal_api_token", "s3cret")
+    assert client.get("/internal/db-pool", headers={"X-Internal-Token": "wrong"}).status_code == 403
+
+    response = client.get("/internal/db-pool", headers={"X-Internal-Token": "s3cret"})
+    assert response.status_code == 200
+    body = response.json()
+    assert set(body) == {"pid", "sync", "async"}
+    assert "checkouts" in body["sync"]
+    assert body["sync"]["pool"]["class"]
+
+def test_server_timing_and_metrics(client):
+    metrics.reset()
+    signup = {
+        "username": "metricsuser",
+        "email": "metrics@example.com",
+        "password": "testpassword",
+        "organization_name": "Metrics Org",
+    }
+    response = client.post("/auth/signup", json=signup)
+    timing = response.headers["Server-Timing"]
+    assert timing.startswith("db;dur=")
+    queries = int(timing.split('desc="')[1].split(" ")[0])
+    assert queries > 0
+    client.get("/does-not-exist")
+
+    body = client.get("/metrics").text
+    assert 'http_request_duration_seconds_count{method="POST",route="/auth/signup"} 1' in body
+    assert f'http_request_db_queries_sum{{method="POST",route="/auth/signup"}} {float(queries)!r}' in body
+    assert 'http_responses_total{method="POST",route="/auth/signup",status="200"} 1' in body
+    assert 'http_responses_total{method="GET",route="unmatched",status="404"} 1' in body
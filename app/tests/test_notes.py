@@ -1,9 +1,22 @@
+import csv
+import io
+import json
+from datetime import datetime, timezone
 import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from ..main import app
 from ..core.database import get_db, Base
+from ..core.config import settings
+from ..core.importer import copy_csv
+from ..core.principal import principal_cache
+from ..core.response_cache import response_cache
+from ..core.serialization import json_response
+from ..core.revocation import token_revocations
+from ..crud import crud_note, crud_user
+from ..models.models import UserRole
+from ..schemas.schemas import Note as NoteSchema, UserUpdate
 
 # Test database
 SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
@@ -22,6 +35,9 @@ app.dependency_overrides[get_db] = override_get_db
 @pytest.fixture
 def setup_database():
     Base.metadata.create_all(bind=engine)
+    principal_cache.clear()
+    response_cache.clear()
+    token_revocations.clear()
     yield
     Base.metadata.drop_all(bind=engine)
 
@@ -76,4 +92,419 @@ def test_read_notes(client, auth_headers):
 
 def test_unauthorized_access(client):
     response = client.get("/notes/")
-    assert response.status_code == 401
\ No newline at end of file
+    assert response.status_code == 401
+
+def test_read_notes_cursor_pagination(client, auth_headers):
+    for i in range(5):
+        client.post(
+            "/notes/",
+            json={"title": f"Note {i}", "content": "content"},
+            headers=auth_headers,
+        )
+
+    titles = []
+    cursor = None
+    while True:
+        params = {"limit": 2}
+        if cursor:
+            params["cursor"] = cursor
+        response = client.get("/notes/", params=params, headers=auth_headers)
+        assert response.status_code == 200
+        titles.extend(note["title"] for note in response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+
+    assert titles == [f"Note {i}" for i in range(5)]
+
+    # Offset pagination keeps working for existing clients
+    response = client.get("/notes/", params={"skip": 3, "limit": 2}, headers=auth_headers)
+    assert [note["title"] for note in response.json()] == ["Note 3", "Note 4"]
+
+def test_read_notes_invalid_cursor(client, auth_headers):
+    response = client.get("/notes/", params={"cursor": "not-a-cursor"}, headers=auth_headers)
+    assert response.status_code == 400
+
+def make_admin(client, username):
+    """Promote the user and return headers for a new token; the promotion
+    revokes the tokens issued before it."""
+    db = TestingSessionLocal()
+    try:
+        user = crud_user.get_user_by_username(db, username=username)
+        crud_user.update_user(db, user_id=user.id, user_update=UserUpdate(role=UserRole.ADMIN))
+    finally:
+        db.close()
+    response = client.post("/auth/login", data={"username": username, "password": "testpassword"})
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+def other_org_note_id(client):
+    client.post(
+        "/auth/signup",
+        json={
+            "username": "otheruser",
+            "email": "other@example.com",
+            "password": "testpassword",
+            "organization_name": "Other Org"
+        },
+    )
+    response = client.post(
+        "/auth/login",
+        data={"username": "otheruser", "password": "testpassword"},
+    )
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    response = client.post("/notes/", json={"title": "Other", "content": "Other org"}, headers=headers)
+    return response.json()["id"]
+
+def test_bulk_create_notes(client, auth_headers):
+    response = client.post(
+        "/notes/bulk",
+        json={"items": [{"title": f"Bulk {i}", "content": "content"} for i in range(3)]},
+        headers=auth_headers,
+    )
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [result["status"] for result in results] == ["created"] * 3
+    assert [result["index"] for result in results] == [0, 1, 2]
+
+    response = client.get("/notes/", headers=auth_headers)
+    assert [note["id"] for note in response.json()] == [result["id"] for result in results]
+
+def test_bulk_delete_notes(client, auth_headers):
+    response = client.post(
+        "/notes/bulk",
+        json={"items": [{"title": "Keep", "content": "c"}, {"title": "Drop", "content": "c"}]},
+        headers=auth_headers,
+    )
+    keep_id, drop_id = [result["id"] for result in response.json()["results"]]
+    foreign_id = other_org_note_id(client)
+
+    # Members cannot delete
+    response = client.request("DELETE", "/notes/bulk", json={"ids": [drop_id]}, headers=auth_headers)
+    assert response.status_code == 403
+
+    auth_headers = make_admin(client, "testuser")
+    response = client.request(
+        "DELETE", "/notes/bulk", json={"ids": [drop_id, foreign_id, 9999]}, headers=auth_headers
+    )
+    assert response.status_code == 200
+    assert [result["status"] for result in response.json()["results"]] == ["deleted", "forbidden", "not_found"]
+
+    response = client.get("/notes/", headers=auth_headers)
+    assert [note["id"] for note in response.json()] == [keep_id]
+
+def test_bulk_create_notes_limit(client, auth_headers):
+    response = client.post(
+        "/notes/bulk",
+        json={"items": [{"title": "t", "content": "c"}] * (settings.bulk_max_items + 1)},
+        headers=auth_headers,
+    )
+    assert response.status_code == 422
+
+def test_search_notes(client, auth_headers):
+    client.post(
+        "/notes/bulk",
+        json={"items": [
+            {"title": "Quarterly planning", "content": "Budget review and hiring plan for the next quarter"},
+            {"title": "Groceries", "content": "Milk, eggs, bread"},
+            {"title": "Retro", "content": "The budget discussion ran long"},
+        ]},
+        headers=auth_headers,
+    )
+    other_org_note_id(client)
+
+    response = client.get("/notes/search", params={"q": "budget"}, headers=auth_headers)
+    assert response.status_code == 200
+    hits = response.json()
+    assert {hit["title"] for hit in hits} == {"Quarterly planning", "Retro"}
+    assert all("<mark>budget</mark>" in hit["snippet"].lower() for hit in hits)
+    assert hits[0]["rank"] >= hits[1]["rank"]
+
+    # Edits are reflected in the index; other organizations are never searched
+    note_id = hits[0]["id"]
+    client.put(f"/notes/{note_id}", json={"content": "Nothing to see"}, headers=auth_headers)
+    response = client.get("/notes/search", params={"q": "budget"}, headers=auth_headers)
+    assert [hit["id"] for hit in response.json()] == [hits[1]["id"]]
+    response = client.get("/notes/search", params={"q": "other"}, headers=auth_headers)
+    assert response.json() == []
+    response = client.get("/notes/search", params={"q": 'budget" OR "milk'}, headers=auth_headers)
+    assert response.status_code == 200
+
+def test_search_notes_fallback_without_full_text_index(client, auth_headers):
+    client.post(
+        "/notes/bulk",
+        json={"items": [
+            {"title": "Budget", "content": "Hiring plan, 100% approved"},
+            {"title": "Retro", "content": "The budget_v2 sheet"},
+        ]},
+        headers=auth_headers,
+    )
+    organization_id = client.get("/auth/me", headers=auth_headers).json()["organization_id"]
+    db = TestingSessionLocal()
+
+    def titles(q):
+        return [hit["title"] for hit in db.execute(crud_note.ilike_search_statement(organization_id, q, 20)).mappings()]
+
+    try:
+        assert titles("BUDGET") == ["Retro", "Budget"]
+        assert titles("budget hiring") == ["Budget"]
+        # LIKE wildcards in the query are matched literally
+        assert titles("100%") == ["Budget"]
+        assert titles("budget%v2") == []
+        assert crud_note.ilike_search_statement(organization_id, "   ", 20) is None
+    finally:
+        db.close()
+
+def test_read_notes_etag(client, auth_headers):
+    client.post("/notes/", json={"title": "Polled", "content": "c"}, headers=auth_headers)
+
+    response = client.get("/notes/", headers=auth_headers)
+    etag = response.headers["ETag"]
+    response = client.get("/notes/", headers={**auth_headers, "If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+
+    # Query parameters are part of the tag
+    response = client.get("/notes/", params={"limit": 1}, headers={**auth_headers, "If-None-Match": etag})
+    assert response.status_code == 200
+
+    # Any write to the organization's notes changes it
+    client.post("/notes/", json={"title": "Another", "content": "c"}, headers=auth_headers)
+    response = client.get("/notes/", headers={**auth_headers, "If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert len(response.json()) == 2
+
+def test_read_note_etag(client, auth_headers):
+    note_id = client.post("/notes/", json={"title": "Polled", "content": "c"}, headers=auth_headers).json()["id"]
+
+    etag = client.get(f"/notes/{note_id}", headers=auth_headers).headers["ETag"]
+    response = client.get(f"/notes/{note_id}", headers={**auth_headers, "If-None-Match": f"W/{etag}"})
+    assert response.status_code == 304
+
+    client.put(f"/notes/{note_id}", json={"content": "changed"}, headers=auth_headers)
+    response = client.get(f"/notes/{note_id}", headers={**auth_headers, "If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["content"] == "changed"
+
+def test_export_notes(client, auth_headers):
+    client.post(
+        "/notes/bulk",
+        json={"items": [{"title": f"Export {i}", "content": "line one\nline, two"} for i in range(3)]},
+        headers=auth_headers,
+    )
+    other_org_note_id(client)
+
+    response = client.get("/notes/export", headers=auth_headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [row["title"] for row in rows] == ["Export 0", "Export 1", "Export 2"]
+    assert rows[0]["content"] == "line one\nline, two"
+
+    response = client.get("/notes/export", params={"format": "csv"}, headers=auth_headers)
+    assert response.status_code == 200
+    assert 'filename="notes.csv"' in response.headers["content-disposition"]
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert [row["title"] for row in rows] == ["Export 0", "Export 1", "Export 2"]
+    assert rows[2]["content"] == "line one\nline, two"
+
+def test_import_notes(client, auth_headers, monkeypatch):
+    monkeypatch.setattr(settings, "import_batch_size", 2)
+    lines = [json.dumps({"title": f"Imported {i}", "content": "body"}) for i in range(5)]
+    lines.insert(2, json.dumps({"title": "No content"}))
+    lines.insert(4, "{not json")
+    upload = ("\n".join(lines) + "\n").encode()
+
+    response = client.post(
+        "/notes/import",
+        files={"file": ("notes.ndjson", upload, "application/x-ndjson")},
+        headers=auth_headers,
+    )
+    assert response.status_code == 200
+    report = response.json()
+    assert (report["processed"], report["inserted"], report["failed"]) == (7, 5, 2)
+    assert [error["line"] for error in report["errors"]] == [3, 5]
+
+    response = client.get("/notes/", headers=auth_headers)
+    assert [note["title"] for note in response.json()] == [f"Imported {i}" for i in range(5)]
+
+def test_import_notes_csv(client, auth_headers):
+    upload = 'title,content\nFirst,"multi\nline"\nSecond,plain\n'.encode()
+    response = client.post(
+        "/notes/import",
+        files={"file": ("notes.csv", upload, "text/csv")},
+        headers=auth_headers,
+    )
+    assert response.json()["inserted"] == 2
+
+    response = client.get("/notes/", params={"fields": "title,content"}, headers=auth_headers)
+    assert [(note["title"], note["content"]) for note in response.json()] == [("First", "multi\nline"), ("Second", "plain")]
+
+def test_import_reports_rows_that_do_not_fit(client, auth_headers):
+    upload = f'title,content\nOk,fine\nExtra,b,c\n{"x" * 201},too long\nLast,one\n'.encode()
+    response = client.post("/notes/import", files={"file": ("notes.csv", upload, "text/csv")}, headers=auth_headers)
+    assert response.status_code == 200
+    report = response.json()
+    assert (report["processed"], report["inserted"], report["failed"]) == (4, 2, 2)
+    assert report["errors"] == [
+        {"line": 3, "error": "Too many fields"},
+        {"line": 4, "error": "title: longer than 200 characters"},
+    ]
+
+def test_import_keeps_unicode_line_separators(client, auth_headers):
+    upload = 'title,content\r\nA,x\u2028y\r\nB,"z\u2029"\r\n'.encode()
+    response = client.post("/notes/import", files={"file": ("notes.csv", upload, "text/csv")}, headers=auth_headers)
+    assert response.json()["inserted"] == 2
+    upload = (json.dumps({"title": "C", "content": "p\u2028q"}, ensure_ascii=False) + "\n").encode()
+    response = client.post("/notes/import", files={"file": ("notes.ndjson", upload)}, headers=auth_headers)
+    assert response.json()["inserted"] == 1
+
+    response = client.get("/notes/", params={"fields": "title,content"}, headers=auth_headers)
+    assert [(note["title"], note["content"]) for note in response.json()] == [("A", "x\u2028y"), ("B", "z\u2029"), ("C", "p\u2028q")]
+
+def test_copy_csv_keeps_empty_strings_apart_from_null():
+    rows = [{"title": "", "content": 'say "hi"\nbye', "created_by": 1}, {"title": "\\N", "content": None, "created_by": 2}]
+    assert copy_csv(rows, ["title", "content", "created_by"]) == (
+        '"","say ""hi""\nbye","1"\n'
+        '"\\N",\\N,"2"\n'
+    )
+
+def test_list_rows_match_response_model(client, auth_headers):
+    note_id = client.post("/notes/", json={"title": "Shape", "content": "c"}, headers=auth_headers).json()["id"]
+    client.put(f"/notes/{note_id}", json={"title": "Shape 2"}, headers=auth_headers)
+
+    listed = client.get("/notes/", params={"fields": "all"}, headers=auth_headers).json()
+    assert listed == [client.get(f"/notes/{note_id}", headers=auth_headers).json()]
+
+def test_list_sparse_fieldsets(client, auth_headers):
+    client.post("/notes/", json={"title": "Big", "content": "x" * 10000}, headers=auth_headers)
+
+    # The summary leaves the content out
+    response = client.get("/notes/", headers=auth_headers)
+    assert "content" not in response.json()[0]
+    assert response.json()[0]["title"] == "Big"
+    summary_etag = response.headers["ETag"]
+
+    # id and created_at are always there, as the page's sort key
+    response = client.get("/notes/", params={"fields": "title"}, headers=auth_headers)
+    assert set(response.json()[0]) == {"id", "created_at", "title"}
+
+    # Each field set has its own ETag and cache entry
+    response = client.get("/notes/", params={"fields": "all"}, headers={**auth_headers, "If-None-Match": summary_etag})
+    assert response.status_code == 200
+    assert response.headers["X-Cache"] == "MISS"
+    assert len(response.json()[0]["content"]) == 10000
+
+    response = client.get("/notes/", params={"fields": "title,secret"}, headers=auth_headers)
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Unknown fields: secret"
+
+def test_update_and_delete_note_errors(client, auth_headers):
+    note_id = client.post("/notes/", json={"title": "Mine", "content": "c"}, headers=auth_headers).json()["id"]
+    foreign_id = other_org_note_id(client)
+
+    assert client.put("/notes/9999", json={"title": "x"}, headers=auth_headers).status_code == 404
+    response = client.put(f"/notes/{foreign_id}", json={"title": "x"}, headers=auth_headers)
+    assert response.status_code == 403
+    assert response.json()["detail"] == "Not enough permissions"
+
+    # Members get the same 404/403 ordering as before, then the role check
+    assert client.delete("/notes/9999", headers=auth_headers).status_code == 404
+    assert client.delete(f"/notes/{foreign_id}", headers=auth_headers).json()["detail"] == "Not enough permissions"
+    assert client.delete(f"/notes/{note_id}", headers=auth_headers).json()["detail"] == "Only admin can delete notes"
+
+    auth_headers = make_admin(client, "testuser")
+    assert client.delete(f"/notes/{foreign_id}", headers=auth_headers).status_code == 403
+    assert client.delete(f"/notes/{note_id}", headers=auth_headers).status_code == 200
+    assert client.delete(f"/notes/{note_id}", headers=auth_headers).status_code == 404
+
+def test_update_note_without_changes(client, auth_headers):
+    note_id = client.post("/notes/", json={"title": "Same", "content": "c"}, headers=auth_headers).json()["id"]
+    response = client.put(f"/notes/{note_id}", json={}, headers=auth_headers)
+    assert response.status_code == 200
+    assert response.json()["title"] == "Same"
+
+def test_notes_total_count_header(client, auth_headers):
+    client.post("/notes/bulk", json={"items": [{"title": f"N{i}", "content": "c"} for i in range(3)]}, headers=auth_headers)
+    note_id = client.post("/notes/", json={"title": "Last", "content": "c"}, headers=auth_headers).json()["id"]
+    response = client.get("/notes/", params={"limit": 2}, headers=auth_headers)
+    assert response.headers["X-Total-Count"] == "4"
+
+    auth_headers = make_admin(client, "testuser")
+    client.delete(f"/notes/{note_id}", headers=auth_headers)
+    assert client.get("/notes/", headers=auth_headers).headers["X-Total-Count"] == "3"
+
+def test_note_changes(client, auth_headers, assert_max_queries):
+    other_org_note_id(client)
+    ids = [
+        client.post("/notes/", json={"title": f"Note {i}", "content": "Body"}, headers=auth_headers).json()["id"]
+        for i in range(3)
+    ]
+
+    # First sync: everything of the organization
+    response = client.get("/notes/changes", headers=auth_headers)
+    assert response.status_code == 200
+    changes = response.json()
+    assert [note["id"] for note in changes["upserts"]] == ids
+    assert changes["deletes"] == [] and changes["has_more"] is False
+    cursor = changes["cursor"]
+
+    # Nothing new: answered from the organization's version alone
+    with assert_max_queries(1):
+        changes = client.get("/notes/changes", params={"since": cursor}, headers=auth_headers).json()
+    assert changes == {"upserts": [], "deletes": [], "cursor": cursor, "has_more": False}
+
+    client.put(f"/notes/{ids[0]}", json={"title": "Edited"}, headers=auth_headers)
+    auth_headers = make_admin(client, "testuser")
+    client.delete(f"/notes/{ids[1]}", headers=auth_headers)
+    new_id = client.post("/notes/", json={"title": "New", "content": "Body"}, headers=auth_headers).json()["id"]
+
+    changes = client.get("/notes/changes", params={"since": cursor}, headers=auth_headers).json()
+    assert [(note["id"], note["title"]) for note in changes["upserts"]] == [(ids[0], "Edited"), (new_id, "New")]
+    assert changes["deletes"] == [ids[1]]
+    assert changes["cursor"] != cursor
+
+def test_note_changes_pagination(client, auth_headers):
+    response = client.post(
+        "/notes/bulk",
+        json={"items": [{"title": f"Note {i}", "content": "Body"} for i in range(5)]},
+        headers=auth_headers,
+    )
+    ids = [result["id"] for result in response.json()["results"]]
+    auth_headers = make_admin(client, "testuser")
+    client.request("DELETE", "/notes/bulk", json={"ids": ids[:2]}, headers=auth_headers)
+
+    upserts, deletes, since, pages = [], [], None, 0
+    while True:
+        params = {"limit": 2, **({"since": since} if since else {})}
+        changes = client.get("/notes/changes", params=params, headers=auth_headers).json()
+        upserts += [note["id"] for note in changes["upserts"]]
+        deletes += changes["deletes"]
+        since, pages = changes["cursor"], pages + 1
+        if not changes["has_more"]:
+            break
+    # Rows of one bulk write share a change_seq; the cursor still splits them
+    assert upserts == ids[2:]
+    assert deletes == ids[:2]
+    assert pages == 3
+
+def test_note_changes_invalid_cursor(client, auth_headers):
+    response = client.get("/notes/changes", params={"since": "not-a-cursor"}, headers=auth_headers)
+    assert response.status_code == 400
+
+def test_json_responses_write_utc_as_z():
+    stamp = datetime(2024, 5, 1, 12, 30, tzinfo=timezone.utc)
+    expected = NoteSchema(
+        id=1, title="t", content="c", created_by=1, organization_id=1, created_at=stamp, updated_at=None
+    ).model_dump_json()
+    assert json.loads(json_response({"created_at": stamp}).body)["created_at"] == json.loads(expected)["created_at"]
+
+def test_failed_update_does_not_bump_the_version(client, auth_headers):
+    note_id = client.post("/notes/", json={"title": "Kept", "content": "c"}, headers=auth_headers).json()["id"]
+    etag = client.get("/notes/", headers=auth_headers).headers["ETag"]
+    assert client.put("/notes/9999", json={"title": "Missing"}, headers=auth_headers).status_code == 404
+    assert client.get("/notes/", headers={**auth_headers, "If-None-Match": etag}).status_code == 304
+
+    client.put(f"/notes/{note_id}", json={"title": "Changed"}, headers=auth_headers)
+    changes = client.get("/notes/changes", headers=auth_headers).json()
+    assert [(note["id"], note["title"]) for note in changes["upserts"]] == [(note_id, "Changed")]
@@ -0,0 +1,201 @@
+import json
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from ..main import app
+from ..core.database import get_db, Base
+from ..core.principal import principal_cache
+from ..core.response_cache import response_cache
+from ..core.revocation import token_revocations
+from ..crud import crud_user
+from ..models.models import UserRole
+from ..routers import auth, notes, todos
+from ..schemas.schemas import UserUpdate
+
+# Test database
+SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
+engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+def override_get_db():
+    try:
+        db = TestingSessionLocal()
+        yield db
+    finally:
+        db.close()
+
+app.dependency_overrides[get_db] = override_get_db
+
+@pytest.fixture
+def setup_database():
+    Base.metadata.create_all(bind=engine)
+    principal_cache.clear()
+    response_cache.clear()
+    token_revocations.clear()
+    yield
+    Base.metadata.drop_all(bind=engine)
+
+@pytest.fixture
+def client(setup_database):
+    return TestClient(app)
+
+@pytest.fixture
+def auth_headers(client):
+    client.post(
+        "/auth/signup",
+        json={
+            "username": "testuser",
+            "email": "test@example.com",
+            "password": "testpassword",
+            "organization_name": "Test Org"
+        },
+    )
+    db = TestingSessionLocal()
+    try:
+        user = crud_user.get_user_by_username(db, username="testuser")
+        crud_user.update_user(db, user_id=user.id, user_update=UserUpdate(role=UserRole.ADMIN))
+    finally:
+        db.close()
+    response = client.post("/auth/login", data={"username": "testuser", "password": "testpassword"})
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    # Warm the decoded-token cache; budgets are for the steady state
+    client.get("/auth/me", headers=headers)
+    return headers
+
+BULK_SIZE = 20
+USER_BULK_SIZE = 5
+
+# Upper bound on SQL statements per request, for every route of the sync
+# routers, on a response cache miss. Raising a number here should be a
+# deliberate, reviewed change.
+# Bulk creates are one INSERT per row on SQLite, which can't return ids in
+# parameter order from a batched INSERT; on PostgreSQL they take 2.
+# Updates and deletes spend one statement after the version bump on the
+# change feed: stamping change_seq or inserting tombstones.
+QUERY_BUDGETS = {
+    ("POST", "/auth/signup"): 7,
+    ("POST", "/auth/login"): 1,
+    ("GET", "/auth/me"): 1,
+    ("POST", "/auth/logout"): 0,
+    ("POST", "/auth/logout-all"): 1,
+    ("POST", "/auth/users/bulk"): USER_BULK_SIZE + 1,
+    ("GET", "/notes/"): 2,
+    ("POST", "/notes/"): 3,
+    ("POST", "/notes/bulk"): BULK_SIZE + 1,
+    ("DELETE", "/notes/bulk"): 4,
+    ("GET", "/notes/search"): 1,
+    ("GET", "/notes/export"): 1,
+    ("GET", "/notes/changes"): 3,
+    ("POST", "/notes/import"): 2,
+    ("GET", "/notes/{note_id}"): 2,
+    ("PUT", "/notes/{note_id}"): 2,
+    ("DELETE", "/notes/{note_id}"): 3,
+    ("GET", "/todos/"): 2,
+    ("POST", "/todos/"): 3,
+    ("POST", "/todos/bulk"): BULK_SIZE + 1,
+    ("PATCH", "/todos/bulk"): 4,
+    ("GET", "/todos/export"): 1,
+    ("GET", "/todos/changes"): 3,
+    ("GET", "/todos/stats"): 1,
+    ("POST", "/todos/import"): 2,
+    ("GET", "/todos/{todo_id}"): 2,
+    ("PUT", "/todos/{todo_id}"): 2,
+    ("DELETE", "/todos/{todo_id}"): 3,
+}
+
+@pytest.fixture
+def query_budget(assert_max_queries):
+    def budget_for(method: str, route: str):
+        return assert_max_queries(QUERY_BUDGETS[(method, route)])
+    return budget_for
+
+def test_every_route_has_a_budget():
+    routes = {
+        (method, prefix + route.path)
+        for prefix, router in (("/auth", auth.router), ("/notes", notes.router), ("/todos", todos.router))
+        for route in router.routes
+        for method in route.methods
+    }
+    assert routes == set(QUERY_BUDGETS)
+
+def test_auth_budgets(client, auth_headers, query_budget):
+    signup = {
+        "username": "newuser",
+        "email": "new@example.com",
+        "password": "testpassword",
+        "organization_name": "New Org"
+    }
+    with query_budget("POST", "/auth/signup"):
+        assert client.post("/auth/signup", json=signup).status_code == 200
+    with query_budget("POST", "/auth/login"):
+        assert client.post("/auth/login", data={"username": "newuser", "password": "testpassword"}).status_code == 200
+    with query_budget("GET", "/auth/me"):
+        assert client.get("/auth/me", headers=auth_headers).status_code == 200
+    # One query checks the whole batch for taken names
+    users = [
+        {"username": f"bulkuser{index}", "email": f"bulk{index}@example.com", "password": "testpassword"}
+        for index in range(USER_BULK_SIZE)
+    ]
+    with query_budget("POST", "/auth/users/bulk"):
+        assert client.post("/auth/users/bulk", json={"items": users}, headers=auth_headers).status_code == 200
+
+    response = client.post("/auth/login", data={"username": "newuser", "password": "testpassword"})
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    with query_budget("POST", "/auth/logout"):
+        assert client.post("/auth/logout", headers=headers).status_code == 200
+    with query_budget("POST", "/auth/logout-all"):
+        assert client.post("/auth/logout-all", headers=auth_headers).status_code == 200
+
+@pytest.mark.parametrize("resource", ["notes", "todos"])
+def test_resource_budgets(client, auth_headers, query_budget, assert_max_queries, resource):
+    item_route = f"/{resource}/{{{resource[:-1]}_id}}"
+    payload = {"title": "Budgeted", "content": "Body text"} if resource == "notes" else {"title": "Budgeted"}
+    import_line = json.dumps(payload).encode() + b"\n"
+
+    with query_budget("POST", f"/{resource}/"):
+        item_id = client.post(f"/{resource}/", json=payload, headers=auth_headers).json()["id"]
+    with query_budget("POST", f"/{resource}/bulk"):
+        response = client.post(f"/{resource}/bulk", json={"items": [payload] * BULK_SIZE}, headers=auth_headers)
+        assert response.status_code == 200
+    # List pages must not grow with the number of rows (no per-row loads)
+    with query_budget("GET", f"/{resource}/"):
+        assert len(client.get(f"/{resource}/", headers=auth_headers).json()) == 21
+    with query_budget("GET", item_route):
+        assert client.get(f"/{resource}/{item_id}", headers=auth_headers).status_code == 200
+    # Cached responses only need the organization's version
+    for url in (f"/{resource}/", f"/{resource}/{item_id}"):
+        with assert_max_queries(1):
+            assert client.get(url, headers=auth_headers).headers["X-Cache"] == "HIT"
+    with query_budget("PUT", item_route):
+        assert client.put(f"/{resource}/{item_id}", json={"title": "Renamed"}, headers=auth_headers).status_code == 200
+    with query_budget("GET", f"/{resource}/export"):
+        assert client.get(f"/{resource}/export", headers=auth_headers).status_code == 200
+    with query_budget("POST", f"/{resource}/import"):
+        response = client.post(
+            f"/{resource}/import",
+            files={"file": ("rows.ndjson", import_line * 50)},
+            headers=auth_headers,
+        )
+        assert response.json()["inserted"] == 50
+    with query_budget("DELETE", item_route):
+        assert client.delete(f"/{resource}/{item_id}", headers=auth_headers).status_code == 200
+    with query_budget("GET", f"/{resource}/changes"):
+        assert client.get(f"/{resource}/changes", params={"limit": 10}, headers=auth_headers).json()["has_more"]
+
+    ids = [item["id"] for item in client.get(f"/{resource}/", headers=auth_headers).json()]
+    if resource == "notes":
+        with query_budget("GET", "/notes/search"):
+            assert client.get("/notes/search", params={"q": "body"}, headers=auth_headers).status_code == 200
+        with query_budget("DELETE", "/notes/bulk"):
+            assert client.request("DELETE", "/notes/bulk", json={"ids": ids}, headers=auth_headers).status_code == 200
+    else:
+        with query_budget("GET", "/todos/stats"):
+            assert client.get("/todos/stats", headers=auth_headers).json()["total"] == 70
+        with query_budget("PATCH", "/todos/bulk"):
+            response = client.patch(
+                "/todos/bulk",
+                json={"items": [{"id": id, "completed": True} for id in ids]},
+                headers=auth_headers,
+            )
+            assert response.status_code == 200
@@ -0,0 +1,97 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from ..main import app
+from ..core import database
+from ..core.database import get_db, Base, READ_PRIMARY_COOKIE, split_database_urls
+from ..core.principal import principal_cache
+from ..core.response_cache import response_cache
+from ..core.revocation import token_revocations
+
+# Test databases: two SQLite files stand in for the primary and a replica
+# that hasn't replicated anything yet
+SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
+REPLICA_DATABASE_URL = "sqlite:///./test_replica.db"
+engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+replica_engine = create_engine(REPLICA_DATABASE_URL, connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReplicaSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=replica_engine)
+
+def override_get_db():
+    try:
+        db = TestingSessionLocal()
+        yield db
+    finally:
+        db.close()
+
+app.dependency_overrides[get_db] = override_get_db
+
+@pytest.fixture
+def setup_database(monkeypatch):
+    Base.metadata.create_all(bind=engine)
+    Base.metadata.create_all(bind=replica_engine)
+    principal_cache.clear()
+    response_cache.clear()
+    token_revocations.clear()
+    monkeypatch.setattr(database, "ReadSessionLocals", [ReplicaSessionLocal])
+    yield
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.drop_all(bind=replica_engine)
+
+@pytest.fixture
+def client(setup_database):
+    return TestClient(app)
+
+@pytest.fixture
+def auth_headers(client):
+    client.post(
+        "/auth/signup",
+        json={
+            "username": "testuser",
+            "email": "test@example.com",
+            "password": "testpassword",
+            "organization_name": "Test Org"
+        },
+    )
+    response = client.post("/auth/login", data={"username": "testuser", "password": "testpassword"})
+    client.cookies.clear()
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+def test_split_database_urls():
+    assert split_database_urls(None) == []
+    assert split_database_urls("sqlite:///a.db, sqlite:///b.db") == ["sqlite:///a.db", "sqlite:///b.db"]
+
+def test_reads_go_to_replica(client, auth_headers):
+    response = client.get("/notes/", headers=auth_headers)
+    assert response.status_code == 200
+    assert response.headers["X-Total-Count"] == "0"
+
+def test_writer_reads_its_writes_from_primary(client, auth_headers):
+    response = client.post("/notes/", json={"title": "Fresh", "content": "c"}, headers=auth_headers)
+    assert READ_PRIMARY_COOKIE in response.cookies
+    note_id = response.json()["id"]
+
+    # Sticky: the write is visible even though the replica doesn't have it
+    assert [note["title"] for note in client.get("/notes/", headers=auth_headers).json()] == ["Fresh"]
+    assert client.get(f"/notes/{note_id}", headers=auth_headers).status_code == 200
+
+    # Another client (no cookie) is served by the lagging replica
+    client.cookies.clear()
+    assert client.get("/notes/", headers=auth_headers).json() == []
+    assert client.get(f"/notes/{note_id}", headers=auth_headers).status_code == 404
+
+    # An expired window also falls back to the replica
+    client.cookies.set(READ_PRIMARY_COOKIE, "1")
+    assert client.get("/notes/", headers=auth_headers).json() == []
+
+def test_failed_writes_dont_pin_to_primary(client, auth_headers):
+    response = client.put("/todos/9999", json={"title": "Nope"}, headers=auth_headers)
+    assert response.status_code == 404
+    assert READ_PRIMARY_COOKIE not in response.cookies
+
+def test_no_replicas_no_cookie(client, auth_headers, monkeypatch):
+    monkeypatch.setattr(database, "ReadSessionLocals", [])
+    response = client.post("/todos/", json={"title": "Primary only"}, headers=auth_headers)
+    assert READ_PRIMARY_COOKIE not in response.cookies
+    assert len(client.get("/todos/", headers=auth_headers).json()) == 1
@@ -0,0 +1,153 @@
+import fnmatch
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from ..main import app
+from ..core.config import settings
+from ..core.database import get_db, Base
+from ..core.principal import principal_cache
+from ..core.response_cache import RedisBackend, response_cache
+from ..core.revocation import token_revocations
+
+# Test database
+SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
+engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+def override_get_db():
+    try:
+        db = TestingSessionLocal()
+        yield db
+    finally:
+        db.close()
+
+app.dependency_overrides[get_db] = override_get_db
+
+@pytest.fixture
+def setup_database():
+    Base.metadata.create_all(bind=engine)
+    principal_cache.clear()
+    response_cache.clear()
+    token_revocations.clear()
+    yield
+    Base.metadata.drop_all(bind=engine)
+
+@pytest.fixture
+def client(setup_database):
+    return TestClient(app)
+
+def signup_and_login(client, username, organization_name):
+    client.post(
+        "/auth/signup",
+        json={
+            "username": username,
+            "email": f"{username}@example.com",
+            "password": "testpassword",
+            "organization_name": organization_name
+        },
+    )
+    response = client.post("/auth/login", data={"username": username, "password": "testpassword"})
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+class FakeRedis:
+    """The subset of redis-py the RedisBackend uses, with bytes values."""
+
+    def __init__(self):
+        self.data = {}
+        self.ttls = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None):
+        self.data[key] = bytes(value)
+        self.ttls[key] = ex
+
+    def scan_iter(self, match="*"):
+        return [key for key in list(self.data) if fnmatch.fnmatch(key, match)]
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+class BrokenRedis:
+    def get(self, key):
+        raise ConnectionError("redis is down")
+
+    def set(self, key, value, ex=None):
+        raise ConnectionError("redis is down")
+
+def test_members_share_cached_pages_until_a_write(client):
+    alice = signup_and_login(client, "alice", "Shared Org")
+    bob = signup_and_login(client, "bob", "Shared Org")
+    note_id = client.post("/notes/", json={"title": "First", "content": "c"}, headers=alice).json()["id"]
+
+    first = client.get("/notes/", headers=alice)
+    assert first.headers["X-Cache"] == "MISS"
+    second = client.get("/notes/", headers=bob)
+    assert second.headers["X-Cache"] == "HIT"
+    assert second.json() == first.json()
+    assert second.headers["ETag"] == first.headers["ETag"]
+    assert second.headers["X-Total-Count"] == "1"
+
+    assert client.get(f"/notes/{note_id}", headers=alice).headers["X-Cache"] == "MISS"
+    assert client.get(f"/notes/{note_id}", headers=bob).headers["X-Cache"] == "HIT"
+    response = client.get(f"/notes/{note_id}", headers={**bob, "If-None-Match": first.headers["ETag"]})
+    assert response.status_code == 200
+
+    # A write bumps the version, so both pages are rebuilt
+    client.put(f"/notes/{note_id}", json={"title": "Edited"}, headers=bob)
+    response = client.get("/notes/", headers=alice)
+    assert response.headers["X-Cache"] == "MISS"
+    assert response.json()[0]["title"] == "Edited"
+    assert client.get(f"/notes/{note_id}", headers=alice).json()["title"] == "Edited"
+
+def test_stats_endpoint(client, monkeypatch):
+    monkeypatch.setattr(settings, "internal_api_token", "s3cret")
+    alice = signup_and_login(client, "alice", "Org A")
+    client.get("/todos/", headers=alice)
+    client.get("/todos/", headers=alice)
+    response = client.get("/internal/response-cache", headers={"X-Internal-Token": "s3cret"})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["backend"] == "InProcessBackend"
+    assert (body["hits"], body["misses"]) == (1, 1)
+
+def test_cached_detail_is_not_served_to_other_organizations(client):
+    alice = signup_and_login(client, "alice", "Org A")
+    mallory = signup_and_login(client, "mallory", "Org B")
+    todo_id = client.post("/todos/", json={"title": "Private"}, headers=alice).json()["id"]
+    assert client.get(f"/todos/{todo_id}", headers=alice).status_code == 200
+    assert client.get(f"/todos/{todo_id}", headers=mallory).status_code == 403
+
+def test_cached_detail_answers_conditional_requests(client):
+    alice = signup_and_login(client, "alice", "Org A")
+    todo_id = client.post("/todos/", json={"title": "Todo"}, headers=alice).json()["id"]
+    etag = client.get(f"/todos/{todo_id}", headers=alice).headers["ETag"]
+    response = client.get(f"/todos/{todo_id}", headers={**alice, "If-None-Match": etag})
+    assert response.status_code == 304
+
+def test_redis_backend(client, monkeypatch):
+    fake = FakeRedis()
+    monkeypatch.setattr(response_cache, "backend", RedisBackend(fake))
+    alice = signup_and_login(client, "alice", "Org A")
+    client.post("/todos/", json={"title": "In redis"}, headers=alice)
+
+    assert client.get("/todos/", headers=alice).headers["X-Cache"] == "MISS"
+    assert [key.startswith("resp:") for key in fake.data] == [True]
+    assert list(fake.ttls.values()) == [response_cache.ttl]
+    response = client.get("/todos/", headers=alice)
+    assert response.headers["X-Cache"] == "HIT"
+    assert response.json()[0]["title"] == "In redis"
+
+    response_cache.clear()
+    token_revocations.clear()
+    assert fake.data == {}
+
+def test_redis_errors_are_misses(client, monkeypatch):
+    monkeypatch.setattr(response_cache, "backend", RedisBackend(BrokenRedis()))
+    alice = signup_and_login(client, "alice", "Org A")
+    client.post("/todos/", json={"title": "Still works"}, headers=alice)
+    response = client.get("/todos/", headers=alice)
+    assert response.status_code == 200
+    assert response.headers["X-Cache"] == "MISS"
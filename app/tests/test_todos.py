@@ -0,0 +1,246 @@
+import json
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, update
+from sqlalchemy.orm import sessionmaker
+from ..main import app
+from ..core.database import get_db, Base
+from ..core.principal import principal_cache
+from ..core.response_cache import response_cache
+from ..core.revocation import token_revocations
+from ..crud import crud_organization, crud_user
+from ..models.models import Organization, UserRole
+from ..schemas.schemas import UserUpdate
+
+# Test database
+SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
+engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+def override_get_db():
+    try:
+        db = TestingSessionLocal()
+        yield db
+    finally:
+        db.close()
+
+app.dependency_overrides[get_db] = override_get_db
+
+@pytest.fixture
+def setup_database():
+    Base.metadata.create_all(bind=engine)
+    principal_cache.clear()
+    response_cache.clear()
+    token_revocations.clear()
+    yield
+    Base.metadata.drop_all(bind=engine)
+
+@pytest.fixture
+def client(setup_database):
+    return TestClient(app)
+
+def signup_and_login(client, username, organization_name):
+    client.post(
+        "/auth/signup",
+        json={
+            "username": username,
+            "email": f"{username}@example.com",
+            "password": "testpassword",
+            "organization_name": organization_name
+        },
+    )
+    response = client.post(
+        "/auth/login",
+        data={"username": username, "password": "testpassword"},
+    )
+    token = response.json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+def make_admin(client, username):
+    """Promote the user and return headers for a new token; the promotion
+    revokes the tokens issued before it."""
+    db = TestingSessionLocal()
+    try:
+        user = crud_user.get_user_by_username(db, username=username)
+        crud_user.update_user(db, user_id=user.id, user_update=UserUpdate(role=UserRole.ADMIN))
+    finally:
+        db.close()
+    response = client.post("/auth/login", data={"username": username, "password": "testpassword"})
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+@pytest.fixture
+def auth_headers(client):
+    return signup_and_login(client, "testuser", "Test Org")
+
+def test_create_todo(client, auth_headers):
+    response = client.post("/todos/", json={"title": "Test Todo"}, headers=auth_headers)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["title"] == "Test Todo"
+    assert data["completed"] is False
+
+def test_bulk_create_and_update_todos(client, auth_headers):
+    response = client.post(
+        "/todos/bulk",
+        json={"items": [{"title": "One"}, {"title": "Two", "description": "second"}]},
+        headers=auth_headers,
+    )
+    assert response.status_code == 200
+    first_id, second_id = [result["id"] for result in response.json()["results"]]
+
+    other_headers = signup_and_login(client, "otheruser", "Other Org")
+    foreign_id = client.post("/todos/", json={"title": "Other"}, headers=other_headers).json()["id"]
+
+    response = client.patch(
+        "/todos/bulk",
+        json={"items": [
+            {"id": first_id, "completed": True},
+            {"id": second_id, "title": "Two (renamed)"},
+            {"id": foreign_id, "completed": True},
+            {"id": 9999, "completed": True},
+        ]},
+        headers=auth_headers,
+    )
+    assert response.status_code == 200
+    assert [result["status"] for result in response.json()["results"]] == ["updated", "updated", "forbidden", "not_found"]
+
+    todos = {todo["id"]: todo for todo in client.get("/todos/", params={"fields": "all"}, headers=auth_headers).json()}
+    assert todos[first_id]["completed"] is True
+    assert todos[first_id]["updated_at"] is not None
+    assert todos[second_id]["title"] == "Two (renamed)"
+    assert todos[second_id]["description"] == "second"
+    assert client.get(f"/todos/{foreign_id}", headers=other_headers).json()["completed"] is False
+
+def test_read_todos_etag(client, auth_headers):
+    todo_id = client.post("/todos/", json={"title": "Polled"}, headers=auth_headers).json()["id"]
+
+    etag = client.get("/todos/", headers=auth_headers).headers["ETag"]
+    response = client.get("/todos/", headers={**auth_headers, "If-None-Match": etag})
+    assert response.status_code == 304
+
+    client.patch("/todos/bulk", json={"items": [{"id": todo_id, "completed": True}]}, headers=auth_headers)
+    response = client.get("/todos/", headers={**auth_headers, "If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()[0]["completed"] is True
+
+def test_export_todos(client, auth_headers):
+    todo_id = client.post("/todos/", json={"title": "Done"}, headers=auth_headers).json()["id"]
+    client.put(f"/todos/{todo_id}", json={"completed": True}, headers=auth_headers)
+    client.post("/todos/", json={"title": "Open"}, headers=auth_headers)
+
+    response = client.get("/todos/export", headers=auth_headers)
+    assert response.status_code == 200
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [(row["title"], row["completed"]) for row in rows] == [("Done", True), ("Open", False)]
+
+def test_import_todos(client, auth_headers):
+    upload = b'{"title": "Imported", "description": "from a file"}\n{"title": "Second"}\n'
+    response = client.post(
+        "/todos/import",
+        files={"file": ("todos.ndjson", upload)},
+        headers=auth_headers,
+    )
+    assert response.json()["inserted"] == 2
+
+    todos = client.get("/todos/", headers=auth_headers).json()
+    assert [(todo["title"], todo["completed"]) for todo in todos] == [("Imported", False), ("Second", False)]
+
+def test_list_rows_match_response_model(client, auth_headers):
+    todo_id = client.post("/todos/", json={"title": "Shape", "description": None}, headers=auth_headers).json()["id"]
+    client.put(f"/todos/{todo_id}", json={"completed": True}, headers=auth_headers)
+
+    listed = client.get("/todos/", params={"fields": "all"}, headers=auth_headers).json()
+    assert listed == [client.get(f"/todos/{todo_id}", headers=auth_headers).json()]
+
+def test_list_sparse_fieldsets(client, auth_headers):
+    client.post("/todos/", json={"title": "Task", "description": "Long description"}, headers=auth_headers)
+    todo = client.get("/todos/", headers=auth_headers).json()[0]
+    assert "description" not in todo and todo["completed"] is False
+
+    todo = client.get("/todos/", params={"fields": "description,completed"}, headers=auth_headers).json()[0]
+    assert set(todo) == {"id", "created_at", "description", "completed"}
+    assert client.get("/todos/", params={"fields": "owner"}, headers=auth_headers).status_code == 400
+
+def test_update_and_delete_todo_errors(client, auth_headers):
+    todo_id = client.post("/todos/", json={"title": "Mine"}, headers=auth_headers).json()["id"]
+    other_headers = signup_and_login(client, "otheruser", "Other Org")
+    foreign_id = client.post("/todos/", json={"title": "Theirs"}, headers=other_headers).json()["id"]
+
+    assert client.put("/todos/9999", json={"completed": True}, headers=auth_headers).status_code == 404
+    assert client.put(f"/todos/{foreign_id}", json={"completed": True}, headers=auth_headers).status_code == 403
+    assert client.delete(f"/todos/{todo_id}", headers=auth_headers).json()["detail"] == "Only admin can delete todos"
+
+    response = client.put(f"/todos/{todo_id}", json={"completed": True}, headers=auth_headers)
+    assert response.status_code == 200
+    assert response.json()["completed"] is True
+
+def test_todo_stats_follow_every_write(client, auth_headers):
+    def stats():
+        return client.get("/todos/stats", headers=auth_headers).json()
+
+    assert stats() == {"open": 0, "done": 0, "total": 0}
+    first = client.post("/todos/", json={"title": "One"}, headers=auth_headers).json()["id"]
+    ids = [first] + [result["id"] for result in client.post(
+        "/todos/bulk", json={"items": [{"title": "Two"}, {"title": "Three"}]}, headers=auth_headers
+    ).json()["results"]]
+    assert stats() == {"open": 3, "done": 0, "total": 3}
+
+    client.put(f"/todos/{first}", json={"completed": True}, headers=auth_headers)
+    # Setting the same state again must not move the counters
+    client.put(f"/todos/{first}", json={"completed": True, "title": "Still one"}, headers=auth_headers)
+    assert stats() == {"open": 2, "done": 1, "total": 3}
+
+    client.patch(
+        "/todos/bulk",
+        json={"items": [{"id": ids[0], "completed": False}, {"id": ids[1], "completed": True}, {"id": ids[2], "completed": True}]},
+        headers=auth_headers,
+    )
+    assert stats() == {"open": 1, "done": 2, "total": 3}
+
+    client.post("/todos/import", files={"file": ("todos.ndjson", b'{"title": "Imported"}\n')}, headers=auth_headers)
+    assert stats() == {"open": 2, "done": 2, "total": 4}
+
+    auth_headers = make_admin(client, "testuser")
+    client.delete(f"/todos/{ids[1]}", headers=auth_headers)
+    assert stats() == {"open": 2, "done": 1, "total": 3}
+
+    response = client.get("/todos/", headers=auth_headers)
+    assert response.headers["X-Total-Count"] == "3"
+
+    # Other organizations have their own counters
+    other_headers = signup_and_login(client, "otheruser", "Other Org")
+    assert client.get("/todos/stats", headers=other_headers).json()["total"] == 0
+
+def test_reconcile_stats(client, auth_headers):
+    client.post("/todos/bulk", json={"items": [{"title": "A"}, {"title": "B"}]}, headers=auth_headers)
+    db = TestingSessionLocal()
+    try:
+        # Simulate drift, e.g. rows changed by hand in SQL
+        db.execute(update(Organization).values(todos_open=10, notes_count=3))
+        db.commit()
+        drifted = crud_organization.reconcile_stats(db)
+        assert [item["actual"] for item in drifted] == [{"notes_count": 0, "todos_open": 2, "todos_done": 0}]
+        assert crud_organization.reconcile_stats(db) == []
+    finally:
+        db.close()
+    assert client.get("/todos/stats", headers=auth_headers).json() == {"open": 2, "done": 0, "total": 2}
+
+def test_todo_changes(client, auth_headers):
+    response = client.post("/todos/bulk", json={"items": [{"title": f"Todo {i}"} for i in range(3)]}, headers=auth_headers)
+    ids = [result["id"] for result in response.json()["results"]]
+    changes = client.get("/todos/changes", headers=auth_headers).json()
+    assert [todo["id"] for todo in changes["upserts"]] == ids
+    assert changes["upserts"][0]["completed"] is False
+
+    client.patch("/todos/bulk", json={"items": [{"id": ids[2], "completed": True}]}, headers=auth_headers)
+    auth_headers = make_admin(client, "testuser")
+    client.delete(f"/todos/{ids[0]}", headers=auth_headers)
+
+    changes = client.get("/todos/changes", params={"since": changes["cursor"]}, headers=auth_headers).json()
+    assert [(todo["id"], todo["completed"]) for todo in changes["upserts"]] == [(ids[2], True)]
+    assert changes["deletes"] == [ids[0]]
+
+    # Another organization sees none of it
+    other_headers = signup_and_login(client, "otheruser", "Other Org")
+    changes = client.get("/todos/changes", headers=other_headers).json()
+    assert changes["upserts"] == [] and changes["deletes"] == []
@@ -0,0 +1,101 @@
+"""Per-page CPU cost of the list endpoints' read path.
+
+Compares the old path (ORM instances re-validated through the response model,
+as FastAPI does for response_model=List[Note]) with the Core-rows + orjson path
+used by read_notes/read_todos. Runs against an in-memory SQLite database:
+
+    python -m benchmarks.bench_list_serialization --rows 100 --pages 500
+"""
+import argparse
+import json
+import os
+import time
+from typing import List
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("SECRET_KEY", "benchmark")
+
+from pydantic import TypeAdapter
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.core.database import Base
+from app.core.serialization import rows_to_json
+from app.crud import crud_note, crud_todo
+from app.models.models import Note, Organization, Todo, User, UserRole
+from app.schemas import schemas
+
+
+def seed(db, rows: int, content_size: int):
+    db.add(Organization(id=1, name="Bench"))
+    db.add(User(id=1, username="bench", email="bench@example.com", hashed_password="x", role=UserRole.ADMIN, organization_id=1))
+    db.flush()
+    db.execute(insert(Note), [
+        {"title": f"Note {i}", "content": "x" * content_size, "created_by": 1, "organization_id": 1}
+        for i in range(rows)
+    ])
+    db.execute(insert(Todo), [
+        {"title": f"Todo {i}", "description": "y" * 64, "completed": i % 2, "created_by": 1, "organization_id": 1}
+        for i in range(rows)
+    ])
+    db.commit()
+
+
+def orm_page(db, get_page, adapter: TypeAdapter, limit: int) -> bytes:
+    # What FastAPI 0.104 does for response_model=List[...]: validate from
+    # attributes, dump to JSON-compatible python, then json.dumps
+    items, _ = get_page(db, organization_id=1, limit=limit)
+    value = adapter.validate_python(items, from_attributes=True)
+    content = adapter.dump_python(value, mode="json")
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode()
+
+
+def core_page(db, get_rows_page, limit: int) -> bytes:
+    rows, _ = get_rows_page(db, organization_id=1, limit=limit)
+    return rows_to_json(rows)
+
+
+def measure(fn, pages: int) -> float:
+    fn()  # warm up
+    start = time.process_time()
+    for _ in range(pages):
+        fn()
+    return (time.process_time() - start) / pages
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100, help="rows per page")
+    parser.add_argument("--pages", type=int, default=500, help="pages to time per path")
+    parser.add_argument("--content-size", type=int, default=500, help="bytes of note content")
+    args = parser.parse_args(argv)
+
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine, autoflush=False)
+    with Session() as db:
+        seed(db, args.rows, args.content_size)
+
+    cases = [
+        ("notes", crud_note.get_notes_page, crud_note.get_note_rows_page, TypeAdapter(List[schemas.Note])),
+        ("todos", crud_todo.get_todos_page, crud_todo.get_todo_rows_page, TypeAdapter(List[schemas.Todo])),
+    ]
+    print(f"{'resource':<10}{'ORM + response_model':>24}{'Core rows + orjson':>22}{'speedup':>10}")
+    for name, get_page, get_rows_page, adapter in cases:
+        # A fresh session per page, like a request
+        def before():
+            with Session() as db:
+                return orm_page(db, get_page, adapter, args.rows)
+
+        def after():
+            with Session() as db:
+                return core_page(db, get_rows_page, args.rows)
+
+        assert json.loads(before()) == json.loads(after())
+        orm_cpu, core_cpu = measure(before, args.pages), measure(after, args.pages)
+        print(f"{name:<10}{orm_cpu * 1000:>21.3f} ms{core_cpu * 1000:>19.3f} ms{orm_cpu / core_cpu:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Compare two benchmarks.load_test result files.
+
+A route regresses when its p95 or p99 latency grows, or its throughput
+drops, by more than --tolerance relative to the baseline. Routes with too
+few requests in either run are shown but not judged. Exits 1 if any route
+regressed:
+
+    python -m benchmarks.compare benchmarks/baseline.json results.json --tolerance 0.15
+"""
+import argparse
+import json
+import sys
+
+LATENCY_KEYS = ("p95_ms", "p99_ms")
+# Sub-millisecond differences are timer noise, not regressions
+MIN_LATENCY_DELTA_MS = 1.0
+# Percentiles over fewer requests than this are too noisy to judge
+MIN_REQUESTS = 30
+
+
+def compare(baseline: dict, current: dict, tolerance: float = 0.10) -> dict:
+    rows, regressions = [], []
+    for route, before in sorted(baseline["routes"].items()):
+        after = current["routes"].get(route)
+        if after is None:
+            continue
+        judged = min(before["requests"], after["requests"]) >= MIN_REQUESTS
+        changes = {}
+        for key in LATENCY_KEYS:
+            changes[key] = (after[key] - before[key]) / before[key] if before[key] else 0.0
+            if judged and changes[key] > tolerance and after[key] - before[key] >= MIN_LATENCY_DELTA_MS:
+                regressions.append(f"{route}: {key} {before[key]} -> {after[key]}")
+        changes["rps"] = (after["rps"] - before["rps"]) / before["rps"] if before["rps"] else 0.0
+        if judged and changes["rps"] < -tolerance:
+            regressions.append(f"{route}: rps {before['rps']} -> {after['rps']}")
+        rows.append({"route": route, "before": before, "after": after, "change": changes, "judged": judged})
+    return {"tolerance": tolerance, "routes": rows, "regressions": regressions}
+
+
+def print_comparison(comparison: dict):
+    print(f"\n{'route':<28}{'p95 ms':>18}{'p99 ms':>18}{'rps':>18}")
+    for row in comparison["routes"]:
+        cells = []
+        for key in (*LATENCY_KEYS, "rps"):
+            cells.append(f"{row['after'][key]:>9.1f} ({row['change'][key]:+.0%})")
+        note = "" if row["judged"] else "  (too few requests, not judged)"
+        print(f"{row['route']:<28}" + "".join(f"{cell:>18}" for cell in cells) + note)
+    if comparison["regressions"]:
+        print(f"\nRegressions (tolerance {comparison['tolerance']:.0%}):")
+        for regression in comparison["regressions"]:
+            print(f"  {regression}")
+    else:
+        print(f"\nNo regressions (tolerance {comparison['tolerance']:.0%})")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--tolerance", type=float, default=0.10)
+    args = parser.parse_args(argv)
+
+    with open(args.baseline) as fileobj:
+        baseline = json.load(fileobj)
+    with open(args.current) as fileobj:
+        current = json.load(fileobj)
+    comparison = compare(baseline, current, args.tolerance)
+    print_comparison(comparison)
+    return 1 if comparison["regressions"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
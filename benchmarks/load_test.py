@@ -0,0 +1,253 @@
+"""Drive a running API with concurrent clients and report per-route latency.
+
+Each virtual user logs in as one of the seeded benchmark users (see
+benchmarks.seed), then runs a weighted mix of list/read/create/update/delete
+operations on notes and todos until --duration runs out. Results (throughput,
+p50/p95/p99 per route) are printed, optionally saved as JSON and compared with
+a baseline run:
+
+    uvicorn app.main:app --port 8000 &
+    python -m benchmarks.load_test --base-url http://127.0.0.1:8000 --orgs 5 --users 4 \\
+        --concurrency 20 --duration 30 --output results.json --baseline benchmarks/baseline.json
+
+Use the same --orgs/--users as the seeder. Deletes are only issued by the
+organization admins (user 0), on items the virtual user created itself.
+"""
+import argparse
+import asyncio
+import json
+import math
+import platform
+import random
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import httpx
+
+from .compare import compare, print_comparison
+from .seed import DEFAULT_PASSWORD, username_for
+
+DEFAULT_MIX = "list=40,read=25,create=15,update=15,delete=5"
+OPERATIONS = ("list", "read", "create", "update", "delete")
+RESOURCES = ("notes", "todos")
+
+
+def parse_mix(spec: str) -> Dict[str, int]:
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        if name not in OPERATIONS:
+            raise argparse.ArgumentTypeError(f"unknown operation {name!r}; expected one of {', '.join(OPERATIONS)}")
+        mix[name] = int(weight)
+    return mix
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    # Nearest-rank, which needs no interpolation and matches what we report
+    if not sorted_values:
+        return 0.0
+    rank = math.ceil(pct / 100 * len(sorted_values)) - 1
+    return sorted_values[min(max(rank, 0), len(sorted_values) - 1)]
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.recording = False
+
+    def record(self, route: str, seconds: float, ok: bool):
+        if not self.recording:
+            return
+        self.latencies[route].append(seconds * 1000)
+        if not ok:
+            self.errors[route] += 1
+
+    def summary(self, elapsed: float) -> dict:
+        routes = {}
+        for route, values in sorted(self.latencies.items()):
+            values.sort()
+            routes[route] = {
+                "requests": len(values),
+                "errors": self.errors[route],
+                "rps": round(len(values) / elapsed, 2),
+                "p50_ms": round(percentile(values, 50), 2),
+                "p95_ms": round(percentile(values, 95), 2),
+                "p99_ms": round(percentile(values, 99), 2),
+            }
+        total = sum(route["requests"] for route in routes.values())
+        return {
+            "requests": total,
+            "errors": sum(route["errors"] for route in routes.values()),
+            "rps": round(total / elapsed, 2),
+            "routes": routes,
+        }
+
+
+class VirtualUser:
+    def __init__(self, client: httpx.AsyncClient, recorder: Recorder, username: str, password: str, is_admin: bool, rng: random.Random):
+        self.client = client
+        self.recorder = recorder
+        self.username = username
+        self.password = password
+        self.is_admin = is_admin
+        self.rng = rng
+        self.headers = {}
+        self.known_ids: Dict[str, List[int]] = {resource: [] for resource in RESOURCES}
+        self.own_ids: Dict[str, List[int]] = {resource: [] for resource in RESOURCES}
+
+    async def request(self, route: str, method: str, url: str, **kwargs) -> Optional[httpx.Response]:
+        start = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, headers=self.headers, **kwargs)
+        except httpx.HTTPError:
+            self.recorder.record(route, time.perf_counter() - start, ok=False)
+            return None
+        self.recorder.record(route, time.perf_counter() - start, ok=response.status_code < 400)
+        return response
+
+    async def login(self):
+        response = await self.request(
+            "POST /auth/login", "POST", "/auth/login",
+            data={"username": self.username, "password": self.password},
+        )
+        if response is None or response.status_code != 200:
+            raise RuntimeError(f"Login failed for {self.username}; did you run benchmarks.seed with the same --orgs/--users?")
+        self.headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    def payload(self, resource: str) -> dict:
+        title = f"Load test {self.rng.randrange(10 ** 6)}"
+        if resource == "notes":
+            return {"title": title, "content": "lorem ipsum " * self.rng.randint(5, 80)}
+        return {"title": title, "description": "dolor sit amet " * self.rng.randint(0, 10)}
+
+    async def step(self, operation: str, resource: str):
+        ids = self.known_ids[resource]
+        item_route = f"/{resource}/{{{resource[:-1]}_id}}"
+        if operation == "list" or not ids:
+            response = await self.request(f"GET /{resource}/", "GET", f"/{resource}/", params={"limit": 50})
+            if response is not None and response.status_code == 200:
+                self.known_ids[resource] = [item["id"] for item in response.json()]
+        elif operation == "read":
+            await self.request(f"GET {item_route}", "GET", f"/{resource}/{self.rng.choice(ids)}")
+        elif operation == "create":
+            response = await self.request(f"POST /{resource}/", "POST", f"/{resource}/", json=self.payload(resource))
+            if response is not None and response.status_code == 200:
+                self.own_ids[resource].append(response.json()["id"])
+                ids.append(response.json()["id"])
+        elif operation == "update":
+            body = {"title": f"Updated {self.rng.randrange(10 ** 6)}"}
+            if resource == "todos":
+                body["completed"] = self.rng.random() < 0.5
+            await self.request(f"PUT {item_route}", "PUT", f"/{resource}/{self.rng.choice(ids)}", json=body)
+        elif operation == "delete" and self.own_ids[resource]:
+            item_id = self.own_ids[resource].pop()
+            await self.request(f"DELETE {item_route}", "DELETE", f"/{resource}/{item_id}")
+            if item_id in ids:
+                ids.remove(item_id)
+
+    async def run(self, mix: Dict[str, int], deadline: float):
+        operations = [name for name in mix if name != "delete" or self.is_admin]
+        weights = [mix[name] for name in operations]
+        while time.perf_counter() < deadline:
+            operation = self.rng.choices(operations, weights)[0]
+            await self.step(operation, self.rng.choice(RESOURCES))
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run_load(args) -> dict:
+    recorder = Recorder()
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=args.timeout) as client:
+        users = []
+        for index in range(args.concurrency):
+            org, user = index % args.orgs, (index // args.orgs) % args.users
+            users.append(VirtualUser(
+                client, recorder, username_for(org, user), args.password,
+                is_admin=user == 0, rng=random.Random(args.seed + index),
+            ))
+
+        # Logins are timed too, but only once the warm-up is over
+        await asyncio.gather(*(user.login() for user in users))
+        warmup_end = time.perf_counter() + args.warmup
+        await asyncio.gather(*(user.run(args.mix, warmup_end) for user in users))
+
+        recorder.recording = True
+        await asyncio.gather(*(user.login() for user in users))
+        start = time.perf_counter()
+        await asyncio.gather(*(user.run(args.mix, start + args.duration) for user in users))
+        elapsed = time.perf_counter() - start
+
+    return {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "base_url": args.base_url,
+            "label": args.label,
+            "concurrency": args.concurrency,
+            "duration": args.duration,
+            "mix": args.mix,
+            "seed": args.seed,
+        },
+        **recorder.summary(elapsed),
+    }
+
+
+def print_results(results: dict):
+    print(f"{'route':<28}{'requests':>10}{'errors':>8}{'rps':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for route, stats in results["routes"].items():
+        print(
+            f"{route:<28}{stats['requests']:>10}{stats['errors']:>8}{stats['rps']:>9.1f}"
+            f"{stats['p50_ms']:>9.1f}{stats['p95_ms']:>9.1f}{stats['p99_ms']:>9.1f}"
+        )
+    print(f"{'total':<28}{results['requests']:>10}{results['errors']:>8}{results['rps']:>9.1f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--orgs", type=int, default=5, help="as passed to benchmarks.seed")
+    parser.add_argument("--users", type=int, default=4, help="as passed to benchmarks.seed")
+    parser.add_argument("--password", default=DEFAULT_PASSWORD)
+    parser.add_argument("--concurrency", type=int, default=20, help="virtual users")
+    parser.add_argument("--duration", type=float, default=30, help="seconds to measure")
+    parser.add_argument("--warmup", type=float, default=3, help="seconds to run before measuring")
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX), help=f"operation weights (default {DEFAULT_MIX})")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--label", help="free-form name stored with the results, e.g. 'sqlite-local'")
+    parser.add_argument("--output", help="write results as JSON to this path")
+    parser.add_argument("--baseline", help="compare against this results file; exit 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed relative slowdown (default 10%%)")
+    args = parser.parse_args(argv)
+
+    results = asyncio.run(run_load(args))
+    print_results(results)
+
+    if args.output:
+        with open(args.output, "w") as fileobj:
+            json.dump(results, fileobj, indent=2)
+            fileobj.write("\n")
+
+    if args.baseline:
+        with open(args.baseline) as fileobj:
+            baseline = json.load(fileobj)
+        comparison = compare(baseline, results, args.tolerance)
+        print_comparison(comparison)
+        return 1 if comparison["regressions"] else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
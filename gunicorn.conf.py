@@ -0,0 +1,47 @@
+"""Production server: gunicorn -c gunicorn.conf.py app.main:app
+
+Settings come from the environment:
+
+    BIND               address to listen on (default 0.0.0.0:8000)
+    WEB_CONCURRENCY    worker processes (default: one per CPU core)
+    GRACEFUL_TIMEOUT   seconds a worker gets to drain after SIGTERM (default 30)
+    TIMEOUT            seconds before a silent worker is killed and replaced (default 60)
+    KEEPALIVE          seconds to keep idle HTTP connections open (default 5)
+    LOG_LEVEL          default info
+
+Every worker has its own connection pools (DB_POOL_SIZE etc. are per worker),
+hashing pool and events listener.
+"""
+import multiprocessing
+import os
+
+bind = os.environ.get("BIND", "0.0.0.0:8000")
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "app.core.workers.UvicornWorker"
+
+# Import app.main once in the master so workers start fast and share its
+# memory copy-on-write; see post_fork for what must not be shared
+preload_app = True
+
+# SIGTERM: stop accepting, let in-flight requests finish, then exit
+graceful_timeout = int(os.environ.get("GRACEFUL_TIMEOUT", 30))
+timeout = int(os.environ.get("TIMEOUT", 60))
+keepalive = int(os.environ.get("KEEPALIVE", 5))
+
+loglevel = os.environ.get("LOG_LEVEL", "info")
+accesslog = "-"
+errorlog = "-"
+
+
+def on_starting(server):
+    # Logouts must reach every worker
+    from app.core.revocation import require_shared_backend
+
+    require_shared_backend(server.cfg.workers)
+
+
+def post_fork(server, worker):
+    # Connections pooled in the master would be shared by every worker
+    from app.core.database import dispose_engines_after_fork
+
+    dispose_engines_after_fork()
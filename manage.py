@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+
+import argparse
+import sys
+
+from app.core.database import SessionLocal
+from app.core.importer import import_format_for
+from app.crud import crud_note, crud_organization, crud_todo, crud_user
+
+IMPORTERS = {
+    "notes": crud_note.import_notes,
+    "todos": crud_todo.import_todos,
+}
+
+
+def import_command(args):
+    db = SessionLocal()
+    try:
+        user = crud_user.get_user_by_username(db, username=args.username)
+        if user is None:
+            sys.exit(f"No such user: {args.username}")
+
+        def on_progress(report):
+            print(f"{report.inserted} inserted, {report.failed} failed", file=sys.stderr)
+
+        with open(args.path, "rb") as fileobj:
+            report = IMPORTERS[args.resource](
+                db,
+                fileobj=fileobj,
+                format=args.format or import_format_for(args.path),
+                user_id=user.id,
+                organization_id=user.organization_id,
+                batch_size=args.batch_size,
+                on_progress=on_progress,
+            )
+    finally:
+        db.close()
+
+    print(f"Processed {report.processed} rows: {report.inserted} inserted, {report.failed} failed")
+    for error in report.errors:
+        print(f"  line {error['line']}: {error['error']}")
+    return 1 if report.failed else 0
+
+
+def reconcile_stats_command(args):
+    db = SessionLocal()
+    try:
+        drifted = crud_organization.reconcile_stats(db, organization_id=args.organization_id)
+    finally:
+        db.close()
+
+    for item in drifted:
+        changes = ", ".join(
+            f"{name} {item['stored'][name]} -> {item['actual'][name]}"
+            for name in item["stored"] if item["stored"][name] != item["actual"][name]
+        )
+        print(f"organization {item['organization_id']}: {changes}")
+    print(f"{len(drifted)} organization(s) corrected")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Notes & Todos API management commands")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    importer = commands.add_parser("import", help="Bulk load notes or todos from an NDJSON or CSV file")
+    importer.add_argument("resource", choices=sorted(IMPORTERS))
+    importer.add_argument("path")
+    importer.add_argument("--username", required=True, help="Rows are created by this user, in their organization")
+    importer.add_argument("--format", choices=["ndjson", "csv"], help="Defaults to the file extension")
+    importer.add_argument("--batch-size", type=int, default=1000)
+    importer.set_defaults(handler=import_command)
+
+    reconciler = commands.add_parser("reconcile-stats", help="Recount notes/todos per organization and fix drifted counters")
+    reconciler.add_argument("--organization-id", type=int, help="Only this organization (default: all)")
+    reconciler.set_defaults(handler=reconcile_stats_command)
+
+    args = parser.parse_args(argv)
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,7 @@
 #!/usr/bin/env python3
 
+# Development server with auto-reload. Production runs gunicorn with
+# gunicorn.conf.py (see start.sh).
 import uvicorn
 from app.main import app
 
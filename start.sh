@@ -1,7 +1,9 @@
 #!/bin/bash
+set -e
 
 echo "Running database migrations..."
 alembic upgrade head
 
 echo "Starting FastAPI server..."
-uvicorn app.main:app --host 0.0.0.0 --port 8000 --reload
\ No newline at end of file
+# exec, so gunicorn gets the container's SIGTERM and drains its workers
+exec gunicorn -c gunicorn.conf.py app.main:app